@@ -18,6 +18,8 @@ class BigBenchHardDataset(DatasetHandler):
     HF_DATASET_NAME = "maveriq/bigbenchhard"
     SF_DATASET_NAME = "BigBenchHard"
     REQUIRED_DATA_KEYS = frozenset({"input", "target"})
+    EXTRACT_INPUT_KEYS = frozenset({"input"})
+    INPUT_PATTERN = re.compile(r'(.*?)\s*Options:\s*(.*)', re.DOTALL)
 
     @classmethod
     def is_multimodal(cls):
@@ -34,15 +36,15 @@ class BigBenchHardDataset(DatasetHandler):
     def process_dataset_row(self, row):
         return execute_task(self, row)
 
-    def extract_data(self, row):
-            
-        input_text = row.get('input',"")     
-        if input_text == "":
+    @classmethod
+    def parse_input(cls, input_text):
+        """Split an input text into (question, options), or return None if it cannot be parsed."""
+        if not input_text:
             logging.error("Missing input text")
             return None
-            
+
         # Process input text to extract question and options
-        match = re.search(r'(.*?)\s*Options:\s*(.*)', input_text, re.DOTALL)
+        match = cls.INPUT_PATTERN.search(input_text)
         if not match:
             logging.error("Could not parse question and options from input text")
             return None
@@ -55,6 +57,18 @@ class BigBenchHardDataset(DatasetHandler):
         if not options:
             logging.error("No options found in input text")
             return None
+
+        return question, options
+
+    @classmethod
+    def extract_batch(cls, batch):
+        return cls.batch_columns(cls.parse_input(text) for text in batch['input'])
+
+    def extract_data(self, row):
+        parsed = self.parse_input(row.get('input', ""))
+        if parsed is None:
+            return None
+        question, options = parsed
             
         return {
             'question': question,
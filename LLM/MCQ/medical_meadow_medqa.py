@@ -25,6 +25,7 @@ class MedicalMeadowMedQADataset(DatasetHandler):
     HF_DATASET_NAME = "medalpaca/medical_meadow_medqa"
     SF_DATASET_NAME = "MedMeadowQA"  #Short form 
     REQUIRED_DATA_KEYS = frozenset({"input", "output"})
+    EXTRACT_INPUT_KEYS = frozenset({"input"})
     
     @classmethod
     def is_multimodal(cls):
@@ -41,9 +42,10 @@ class MedicalMeadowMedQADataset(DatasetHandler):
     def process_dataset_row(self, row):
         return execute_task(self, row)
 
-    def extract_data(self, row):
-        input_text = row.get('input', "")
-        if input_text == "":
+    @staticmethod
+    def parse_input(input_text):
+        """Split an input text into (question, options), or return None if it cannot be parsed."""
+        if not input_text:
             logging.warning("Missing input text")
             return None
         
@@ -75,6 +77,18 @@ class MedicalMeadowMedQADataset(DatasetHandler):
         except Exception as e:
             logging.error(f"Error parsing options: {str(e)}")
             return None
+
+        return question, options
+
+    @classmethod
+    def extract_batch(cls, batch):
+        return cls.batch_columns(cls.parse_input(text) for text in batch['input'])
+
+    def extract_data(self, row):
+        parsed = self.parse_input(row.get('input', ""))
+        if parsed is None:
+            return None
+        question, options = parsed
         
         return {
             'question': question,
@@ -9,6 +9,11 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import argparse
 
+from global_setting import add_project_root_to_path
+add_project_root_to_path()
+
+from orchestrator import CATEGORIES, run_scripts
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,22 +21,12 @@ logging.basicConfig(
     handlers=[
         logging.FileHandler('query_all_mcq.log'),
         logging.StreamHandler(sys.stdout)
-    ]
+    ],
+    force=True
 )
 
 # List of all MCQ scripts to run
-SCRIPTS = [
-    "ai2arc.py",
-    "bigbenchhard.py",
-    "medical_meadow_medqa.py",
-    "medmcqa.py",
-    "medqa.py",
-    "medqa_usmle_4_options.py",
-    "mmlu_pro.py",
-    "mmlu.py",
-    "sciq.py",
-    "winogrande.py"
-]
+SCRIPTS = CATEGORIES["L-MCQ"][1]
 
 def run_script(script: str, sample_size: int = None) -> bool:
     """
@@ -76,14 +71,28 @@ def run_script(script: str, sample_size: int = None) -> bool:
         logging.error(f"✗ Unexpected error running {script}: {str(e)}")
         return False
 
-def run_all_scripts(parallel: bool = False, sample_size: int = None):
+def run_all_scripts(parallel: bool = False, sample_size: int = None, in_process: bool = True,
+                    max_inflight_requests: int = None):
     """
     Run all MCQ scripts either sequentially or in parallel.
     
     Args:
         parallel: If True, runs scripts in parallel
         sample_size: Optional sample size for each script (-n parameter)
+        in_process: If True, runs the dataset handlers in this process, sharing one
+            model client and one in-flight request budget
+        max_inflight_requests: Global limit on model requests in flight (in-process only)
     """
+    if in_process:
+        script_dir = Path(__file__).resolve().parent
+        run_scripts(
+            [str(script_dir / script) for script in SCRIPTS],
+            nsamples=sample_size,
+            parallel=parallel,
+            max_inflight_requests=max_inflight_requests
+        )
+        return
+
     start_time = time.time()
     total_scripts = len(SCRIPTS)
     successful = 0
@@ -126,10 +135,15 @@ def main():
                       help='Run scripts in parallel')
     parser.add_argument('-n', '--sample-size', type=int,
                       help='Sample size for each dataset')
+    parser.add_argument('--subprocess', action='store_true',
+                      help='Run each script in its own Python interpreter instead of in-process')
+    parser.add_argument('--max_inflight_requests', type=int, default=None,
+                      help='Global limit on model requests in flight across all datasets')
     args = parser.parse_args()
 
     logging.info(f"Starting MCQ queries at {datetime.now()}")
-    run_all_scripts(parallel=args.parallel, sample_size=args.sample_size)
+    run_all_scripts(parallel=args.parallel, sample_size=args.sample_size,
+                    in_process=not args.subprocess, max_inflight_requests=args.max_inflight_requests)
     logging.info(f"Completed all MCQ queries at {datetime.now()}")
 
 if __name__ == "__main__":
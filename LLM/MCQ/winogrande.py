@@ -19,6 +19,7 @@ class WinoGrandeDataset(DatasetHandler):
     HF_DATASET_NAME  = "automated-research-group/winogrande"
     SF_DATASET_NAME  = "WinoGrande"
     REQUIRED_DATA_KEYS = frozenset({'request', 'response'})
+    EXTRACT_INPUT_KEYS = frozenset({'request'})
 
     @classmethod
     def is_multimodal(cls):
@@ -35,8 +36,9 @@ class WinoGrandeDataset(DatasetHandler):
     def process_dataset_row(self, row):
         return execute_task(self, row)
 
-    def extract_data(self, row):
-        text = row.get("request", "")
+    @staticmethod
+    def parse_request(text):
+        """Split a request text into (question, options), or return None if it cannot be parsed."""
         if not text:
             logging.warning("WinoGrande: Empty text in row")
             return None
@@ -62,6 +64,18 @@ class WinoGrandeDataset(DatasetHandler):
         if not options:
             logging.warning("WinoGrande: No options found in text")
             return None
+
+        return question, options
+
+    @classmethod
+    def extract_batch(cls, batch):
+        return cls.batch_columns(cls.parse_request(text) for text in batch['request'])
+
+    def extract_data(self, row):
+        parsed = self.parse_request(row.get("request", ""))
+        if parsed is None:
+            return None
+        question, options = parsed
             
         return {
             'question': question,
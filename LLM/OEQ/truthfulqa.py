@@ -23,7 +23,7 @@ class TruthfulQADataset(DatasetHandler):
     """
     HF_DATASET_NAME = "truthfulqa/truthful_qa"
     SF_DATASET_NAME = "TruthfulQA"
-    REQUIRED_DATA_KEYS = frozenset({'question', 'mc1_targets'})
+    REQUIRED_DATA_KEYS = frozenset({'question', 'best_answer'})
 
     def __init__(self, task, models, sys_config=None):
         logging.info("TruthfulQA dataset initializing")
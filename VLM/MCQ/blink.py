@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="blink_status.log")
+initialize_logging(log_file="blink_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -47,7 +47,7 @@ class BLINKDataset(DatasetHandler):
             logging.warning("BLINK: Empty question in row")
             return None
             
-        options  = row.get('options', [])
+        options  = row.get('choices', [])
         if not options:
             logging.warning("BLINK: Empty options in row")
             return None
@@ -5,12 +5,12 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="cauldron_status.log")
+initialize_logging(log_file="cauldron_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
 from dataset_run_util import run_dataset
-from task_list import execute_list
+from task_list import execute_task
 
 class CauldronDataset(DatasetHandler):
     """The Cauldron Dataset handler.
@@ -24,6 +24,7 @@ class CauldronDataset(DatasetHandler):
     HF_DATASET_NAME = "HuggingFaceM4/the_cauldron"
     SF_DATASET_NAME = "Cauldron"
     REQUIRED_DATA_KEYS = frozenset({"question", "options", "image", "answer"})
+    ROW_FILTERS = (("image", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
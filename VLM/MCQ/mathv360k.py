@@ -5,12 +5,12 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="mathv360k_status.log")
+initialize_logging(log_file="mathv360k_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
 from dataset_run_util import run_dataset
-from task_list import execute_list
+from task_list import execute_task
 
 class MathV360KDataset(DatasetHandler):
     """MathV360K Dataset handler.
@@ -25,6 +25,8 @@ class MathV360KDataset(DatasetHandler):
     HF_DATASET_NAME = "Zhiqiang007/MathV360K"
     SF_DATASET_NAME = "MathV360K"
     REQUIRED_DATA_KEYS = frozenset({"image", "conversations"})
+    ROW_FILTERS = (("image", "not_null"),)
+    STREAMING = True
 
     @classmethod
     def is_multimodal(cls):
@@ -58,7 +60,7 @@ class MathV360KDataset(DatasetHandler):
         }
 
     def get_correct_answer(self, row):
-        data = row['conversation']
+        data = row['conversations']
         for item in data:
             if item.get("from") == "gpt":
                raw_answer = item.get("value")
@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="mmmudataset_status.log")
+initialize_logging(log_file="mmmudataset_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -23,7 +23,7 @@ class MMMUDataset(DatasetHandler):
     """
     HF_DATASET_NAME = "MMMU/MMMU"
     SF_DATASET_NAME = "MMMU"
-    REQUIRED_DATA_KEYS = frozenset({"question", "options", "image"})
+    REQUIRED_DATA_KEYS = frozenset({"question", "options", "answer", "image_1", "image_2", "image_3", "image_4", "image_5", "image_6", "image_7"})
 
     @classmethod
     def is_multimodal(cls):
@@ -43,15 +43,16 @@ class MMMUDataset(DatasetHandler):
     def extract_data(self, row):
         question = row.get('question', '')
         options = row.get('options', [])
-        image = row.get('image', None)
+        images = [row.get(f'image_{j}') for j in range(1, 8)]
+        images = [image for image in images if image is not None]
         
-        if not question or not options or image is None:
+        if not question or not options or not images:
             return None
             
         return {
             'question': question,
             'options': options,
-            'images': [image]
+            'images': images
         }
 
     def get_correct_answer(self, row):
@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="scienceqadataset_status.log")
+initialize_logging(log_file="scienceqadataset_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -24,7 +24,7 @@ class ScienceQADataset(DatasetHandler):
     """
     HF_DATASET_NAME = "derek-thomas/ScienceQA"
     SF_DATASET_NAME = "ScienceQA"
-    REQUIRED_DATA_KEYS = frozenset({"question", "options", "image", "answer"})
+    REQUIRED_DATA_KEYS = frozenset({"question", "choices", "image", "answer"})
 
     @classmethod
     def is_multimodal(cls):
@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="animalsdataset_status.log")
+initialize_logging(log_file="animalsdataset_status.log")
 
 from dataset_handler import DatasetHandler 
 from model_query import ModelQuery
@@ -40,6 +40,7 @@ class AnimalsDataset(DatasetHandler):
     HF_DATASET_NAME = "Fr0styKn1ght/Animals"
     SF_DATASET_NAME = "Animals"
     REQUIRED_DATA_KEYS = frozenset({"image", "label"})
+    ROW_FILTERS = (("image", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
@@ -6,7 +6,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="captchadataset_status.log")
+initialize_logging(log_file="captchadataset_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -25,12 +25,13 @@ class CaptchaDataset(DatasetHandler):
     HF_DATASET_NAME = "hammer888/captcha-data"
     SF_DATASET_NAME = "Captcha"
     REQUIRED_DATA_KEYS = frozenset({"image", "text"})
+    ROW_FILTERS = (("image", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
         return True
 
-    def __init__(self, task.models, sys_config=None):
+    def __init__(self, task, models, sys_config=None):
         logging.info("Captcha Dataset initializing")
         self.task = task
         self.models = models
@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="kvasirvqadataset_status.log")   
+initialize_logging(log_file="kvasirvqadataset_status.log")   
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
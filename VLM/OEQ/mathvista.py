@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="mathvistadataset_status.log")
+initialize_logging(log_file="mathvistadataset_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -25,7 +25,8 @@ class MathVistaDataset(DatasetHandler):
     """
     HF_DATASET_NAME = "AI4Math/MathVista"
     SF_DATASET_NAME = "MathVista"
-    REQUIRED_DATA_KEYS = frozenset({"question", "choices", "decoded_image", "answer"})
+    REQUIRED_DATA_KEYS = frozenset({"question", "decoded_image", "answer"})
+    ROW_FILTERS = (("decoded_image", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
@@ -65,7 +66,7 @@ class MathVistaDataset(DatasetHandler):
     def get_dataset_name(self):
         return self.SF_DATASET_NAME
 
-    def get_assigned_task(self.):
+    def get_assigned_task(self):
         return self.task
   
 if __name__ == "__main__":
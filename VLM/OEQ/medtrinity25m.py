@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="medtrinity25mdataset_status.log")
+initialize_logging(log_file="medtrinity25mdataset_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -23,6 +23,8 @@ class MedTrinity25MDataset(DatasetHandler):
     HF_DATASET_NAME = "UCSC-VLAA/MedTrinity-25M"
     SF_DATASET_NAME = "MedTrinity-25M"
     REQUIRED_DATA_KEYS = frozenset({"image", "caption"})
+    ROW_FILTERS = (("image", "not_null"),)
+    STREAMING = True
 
     @classmethod
     def is_multimodal(cls):
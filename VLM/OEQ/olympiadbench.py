@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="olympiadbenchdataset_status.log")
+initialize_logging(log_file="olympiadbenchdataset_status.log")
 
 from sympy import sympify
 from sympy.parsing.latex import parse_latex 
@@ -26,7 +26,7 @@ class OlympiadBenchDataset(DatasetHandler):
     """
     HF_DATASET_NAME = "lmms-lab/OlympiadBench"
     SF_DATASET_NAME = "OlympiadBench"
-    REQUIRED_DATA_KEYS = frozenset({"question", "images"})
+    REQUIRED_DATA_KEYS = frozenset({"question", "images", "final_answer"})
 
     @classmethod
     def is_multimodal(cls):
@@ -63,7 +63,7 @@ class OlympiadBenchDataset(DatasetHandler):
     def get_model(self):
         return ModelQuery.get_thread_model(self.local_thread, self.models)
 
-    def get_task(self):
+    def get_assigned_task(self):
         return self.task
 
     def get_dataset_name(self):
@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="olympicarenadataset_status.log")
+initialize_logging(log_file="olympicarenadataset_status.log")
 
 from dataset_handler import DatasetHandler 
 from model_query import ModelQuery
@@ -24,6 +24,8 @@ class OlympicArenaDataset(DatasetHandler):
     HF_DATASET_NAME = "GAIR/OlympicArena"
     SF_DATASET_NAME = "OlympicArena"
     REQUIRED_DATA_KEYS = frozenset({"problem", "figure_urls", "answer", "language"})
+    ROW_FILTERS = (("language", "==", "EN"),)
+    IMAGE_URL_KEYS = frozenset({"figure_urls"})
 
     @classmethod
     def is_multimodal(cls):
@@ -5,12 +5,12 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="pd12mdataset_status.log")
+initialize_logging(log_file="pd12mdataset_status.log")
 
 from dataset_handler import DatasetHandler 
 from model_query import ModelQuery
 from dataset_run_util import run_dataset
-from task_list import execute_list
+from task_list import execute_task
 
 class PD12MDataset(DatasetHandler):
     """PD12M (Public Domain 12M) Dataset handler.
@@ -23,7 +23,10 @@ class PD12MDataset(DatasetHandler):
     """
     HF_DATASET_NAME = "Spawning/PD12M"
     SF_DATASET_NAME = "PD12M"
-    REQUIRED_DATA_KEYS = frozenset({"caption", "url", "hash"})
+    REQUIRED_DATA_KEYS = frozenset({"caption", "url"})
+    ROW_FILTERS = (("url", "not_null"),)
+    IMAGE_URL_KEYS = frozenset({"url"})
+    STREAMING = True
 
     @classmethod
     def is_multimodal(cls):
@@ -62,7 +65,7 @@ class PD12MDataset(DatasetHandler):
         return ModelQuery.get_thread_model(self.local_thread, self.models)
 
     def get_dataset_name(self):
-        return selfSF_DATASET_NAME
+        return self.SF_DATASET_NAME
 
     def get_assigned_task(self):
         return self.task
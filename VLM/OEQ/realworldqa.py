@@ -1,11 +1,12 @@
 import os
+import re
 import sys
 import threading
 import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="realworldqadataset_status.log")
+initialize_logging(log_file="realworldqadataset_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -24,6 +25,8 @@ class RealWorldQADataset(DatasetHandler):
     HF_DATASET_NAME = "xai-org/RealworldQA"
     SF_DATASET_NAME = "RealworldQA"
     REQUIRED_DATA_KEYS = frozenset({"question", "image", "answer"})
+    ROW_FILTERS = (("image", "not_null"),)
+    EXTRACT_INPUT_KEYS = frozenset({"question"})
 
     @classmethod
     def is_multimodal(cls):
@@ -57,13 +60,22 @@ class RealWorldQADataset(DatasetHandler):
             'images': [image]
         }
 
+    @classmethod
+    def extract_batch(cls, batch):
+        return cls.batch_columns(None if text is None else cls.split_text(text) for text in batch['question'])
+
+    def get_images(self, row):
+        image = row.get('image')
+        return None if image is None else [image]
+
     def get_correct_answer(self, row):
         answer = row.get('answer')
         if answer is None:
             return None
         return answer
 
-    def split_text(self, text: str):
+    @staticmethod
+    def split_text(text: str):
         """Split the text into question and options."""
         if "Please" in text:
             text = text[:text.rfind("Please")].strip()
@@ -5,14 +5,14 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="rocoradiology_status.log")
+initialize_logging(log_file="rocoradiology_status.log")
 
-from model_query_base import ModelQueryBase
+from dataset_handler import DatasetHandler
 from model_query import ModelQuery
 from dataset_run_util import run_dataset
 from task_list import execute_task
 
-class RocoRadiologyDataset(ModelQueryBase):
+class RocoRadiologyDataset(DatasetHandler):
     """ROCO (Radiology Objects in COntext) Dataset handler.
     
     A large-scale dataset of radiology images with associated captions and annotations.
@@ -24,6 +24,7 @@ class RocoRadiologyDataset(ModelQueryBase):
     HF_DATASET_NAME = "mdwiratathya/ROCO-radiology"
     SF_DATASET_NAME = "ROCO-radiology"
     REQUIRED_DATA_KEYS = frozenset({"image", "caption"})
+    ROW_FILTERS = (("image", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="slakedataset_status.log")
+initialize_logging(log_file="slakedataset_status.log")
 
 from dataset_handler import DatasetHandler 
 from model_query import ModelQuery
@@ -24,6 +24,7 @@ class SlakeDataset(DatasetHandler):
     HF_DATASET_NAME = "BoKelvin/SLAKE"
     SF_DATASET_NAME = "SLAKE"
     REQUIRED_DATA_KEYS = frozenset({"question", "img_name", "answer", "q_lang"})
+    ROW_FILTERS = (("q_lang", "==", "en"), ("img_name", "not_null"))
 
     @classmethod
     def is_multimodal(cls):
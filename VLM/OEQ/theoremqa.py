@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="theoremqadataset_status.log")
+initialize_logging(log_file="theoremqadataset_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -24,6 +24,7 @@ class TheoremQADataset(DatasetHandler):
     HF_DATASET_NAME = "TIGER-Lab/TheoremQA"
     SF_DATASET_NAME = "TheoremQA"
     REQUIRED_DATA_KEYS = frozenset({"Question", "Answer", "Picture"})
+    ROW_FILTERS = (("Picture", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="visitbench_status.log")
+initialize_logging(log_file="visitbench_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -24,7 +24,8 @@ class VisitBenchDataset(DatasetHandler):
     """
     HF_DATASET_NAME = "mlfoundations/VisIT-Bench"
     SF_DATASET_NAME = "VisIT-Bench"
-    REQUIRED_DATA_KEYS = frozenset({"image", "instruction", "gpt4-prediction"})
+    REQUIRED_DATA_KEYS = frozenset({"image", "instruction", "instruction_conditioned_caption"})
+    ROW_FILTERS = (("image", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
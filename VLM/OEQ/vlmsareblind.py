@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="vlmsareblind_status.log")
+initialize_logging(log_file="vlmsareblind_status.log")
 
 from dataset_handler import DatasetHandler
 from model_query import ModelQuery
@@ -24,6 +24,7 @@ class VLMsAreBlindDataset(DatasetHandler):
     HF_DATASET_NAME = "XAI/vlmsareblind"
     SF_DATASET_NAME = "vlmsareblind"
     REQUIRED_DATA_KEYS = frozenset({"image", "prompt", "groundtruth"})
+    ROW_FILTERS = (("image", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
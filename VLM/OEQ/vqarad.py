@@ -5,7 +5,7 @@ import logging
 
 from global_setting import add_project_root_to_path, initialize_logging
 add_project_root_to_path()
-initialize_logging(logfile="vqarad_status.log")
+initialize_logging(log_file="vqarad_status.log")
 
 from dataset_handler import DatasetHandler 
 from model_query import ModelQuery
@@ -24,6 +24,7 @@ class VqaRadDataset(DatasetHandler):
     HF_DATASET_NAME = "flaviagiammarino/vqa-rad"
     SF_DATASET_NAME = "vqa-rad"
     REQUIRED_DATA_KEYS = frozenset({"image", "question", "answer"})
+    ROW_FILTERS = (("image", "not_null"),)
 
     @classmethod
     def is_multimodal(cls):
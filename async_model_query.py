@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+from model_query import ModelQuery, prompt_hash, record_generation_metrics, record_request_metric
+from ollama_client import OUTCOME_ERROR, OUTCOME_OK, OUTCOME_TIMEOUT, EndpointPool, get_endpoint_pool, get_inflight_limiter, normalize_host
+
+class AsyncModelQuery(ModelQuery):
+    """Asyncio backend for ModelQuery.
+
+    Requests go to the /api/chat endpoint of the Ollama server picked by the
+    shared endpoint pool, through one httpx.AsyncClient per server. A semaphore
+    bounds how many requests are in flight, so a large run can keep thousands
+    of questions queued on one event loop instead of holding a thread (and a
+    thread stack) per question. Passing `host` pins requests to that server.
+    """
+    DEFAULT_MAX_CONCURRENCY = 32
+
+    def __init__(self, models=ModelQuery.DEFAULT_MODELS, host=None, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        # A single pinned server has nothing to route between, so its pool runs no background prober.
+        # The pool exists before ModelQuery validates the models, so they are checked on that server.
+        self.pool = EndpointPool([normalize_host(host)], probe_interval=None) if host else get_endpoint_pool()
+        try:
+            super().__init__(models)
+        except Exception:
+            if host:
+                self.pool.close()
+            raise
+
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            logging.warning(f"Invalid max_concurrency value: {max_concurrency}. Using default {self.DEFAULT_MAX_CONCURRENCY}.")
+            max_concurrency = self.DEFAULT_MAX_CONCURRENCY
+        self.max_concurrency = max_concurrency
+
+        # The clients and semaphore are bound to the event loop they were created on,
+        # so they are built lazily and rebuilt whenever a new loop is running.
+        self._loop = None
+        self._clients = {}
+        self._semaphore = None
+
+    def endpoint_pool(self):
+        return self.pool
+
+    def _ensure_loop_state(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._clients = {}
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _get_client(self, host):
+        client = self._clients.get(host)
+        if client is None:
+            client = self._clients[host] = httpx.AsyncClient(base_url=host, timeout=None)
+        return client
+
+    async def aclose(self):
+        """Close the underlying HTTP clients. Call before the event loop shuts down."""
+        for client in self._clients.values():
+            await client.aclose()
+        self._loop = None
+        self._clients = {}
+        self._semaphore = None
+
+    async def chat(self, model, messages):
+        self._ensure_loop_state()
+        payload = {'model': model, 'messages': messages, 'stream': False}
+        try:
+            with self.pool.route(model) as endpoint:
+                response = await self._get_client(endpoint.host).post('/api/chat', json=payload)
+            response.raise_for_status()
+            reply = response.json()
+            record_generation_metrics(reply)
+            return reply['message']['content'].strip()
+        except Exception as e:
+            logging.error(f"Exception occurred while interacting with the model: {e}")
+            raise e
+
+    async def execute_with_timeout(self, coro, timeout):
+        """Run a request coroutine once a concurrency slot is free.
+
+        The timeout only starts once both the handler's slot and a global
+        in-flight slot are acquired, so time spent queued behind other requests
+        does not count against the model.
+        """
+        self._ensure_loop_state()
+        limiter = get_inflight_limiter()
+        async with self._semaphore:
+            await limiter.acquire_async()
+            record_request_metric('concurrency_limit', limiter.limit)
+            started = time.monotonic()
+            outcome = OUTCOME_ERROR
+            try:
+                # Cancelling the task aborts the in-flight HTTP request and closes its connection
+                result = await asyncio.wait_for(coro, timeout=timeout)
+                if not str(result).startswith("Error"):
+                    outcome = OUTCOME_OK
+                return result
+            except asyncio.TimeoutError:
+                outcome = OUTCOME_TIMEOUT
+                return self.TIMEOUT_ERROR
+            except Exception as e:
+                return f"Error: Exception occurred during model interaction - {str(e)}"
+            finally:
+                limiter.release(time.monotonic() - started, outcome)
+
+    async def text_mcq_ollama(self, question, options):
+        complete_question = self.format_text_mcq(question, options)
+        messages = [{'role': 'user', 'content': complete_question}]
+
+        response_content = (await self.chat(self.text_model, messages)).upper()
+        response_content = response_content.replace("(", "").replace(")", "").replace(".", "")
+        if not response_content:
+            return "Error: Received empty response from the model."
+        return response_content[0]
+
+    async def get_text_mcq_answer(self, question, options, timeout=100):
+        """Process text MCQ queries."""
+        logging.info("Processing Text MCQ")
+
+        response_content = await self.execute_with_timeout(self.text_mcq_ollama(question, options), timeout)
+        if response_content.startswith("Error"):
+            logging.error(response_content)
+            return response_content
+
+        if self.is_valid_mcq_response(response_content, len(options)):
+            return response_content[0]
+        return f"Invalid mcq response: {response_content}"
+
+    async def text_oeq_ollama(self, question):
+        messages = [{'role': 'user', 'content': question}]
+        return await self.chat(self.text_model, messages)
+
+    async def get_text_oeq_answer(self, question, timeout=100):
+        logging.info("Processing Text OEQ")
+        self.validate_inputs(question)
+        return await self.execute_with_timeout(self.text_oeq_ollama(question), timeout)
+
+    async def image_mcq_ollama(self, question, images, options):
+        images = self.ensure_list(images)
+        complete_question = self.format_image_mcq(question, images, options)
+
+        try:
+            encoded_images = await asyncio.to_thread(self.encode_images, images)
+        except ValueError as e:
+            logging.warning(f"Image validation failed: {e}. Falling back to text model.")
+            return await self.text_mcq_ollama(question, options)
+
+        messages = [{'role': 'user', 'content': complete_question, 'images': encoded_images}]
+        return await self.chat(self.vision_model, messages)
+
+    async def get_image_mcq_answer(self, question, images, options, timeout=100):
+        """Process image MCQ queries."""
+        logging.info("Processing Image MCQ")
+
+        response_content = await self.execute_with_timeout(self.image_mcq_ollama(question, images, options), timeout)
+        if isinstance(response_content, str) and response_content.startswith("Error"):
+            logging.error(response_content)
+            return response_content
+
+        response_content = response_content.upper().replace("(", "").replace(")", "").replace(".", "")
+        if not response_content:
+            return "Error: Empty response from the model."
+
+        if self.is_valid_mcq_response(response_content, len(options)):
+            return response_content[0]
+        return f"Invalid mcq response: {response_content}"
+
+    async def image_oeq_llama(self, question, images):
+        images = self.ensure_list(images)
+        try:
+            encoded_images = await asyncio.to_thread(self.encode_images, images)
+        except ValueError as e:
+            logging.warning(f"Image validation failed: {e}. Falling back to text model.")
+            return await self.text_oeq_ollama(question)
+
+        messages = [{'role': 'user', 'content': question, 'images': encoded_images}]
+        return await self.chat(self.vision_model, messages)
+
+    async def get_image_oeq_answer(self, question, images, timeout=100):
+        logging.info("Processing Image OEQ")
+        self.validate_inputs(question)
+
+        if not self.validate_image_files(images):
+            logging.warning("Image validation failed. Falling back to text model.")
+            return await self.get_text_oeq_answer(question, timeout)
+
+        return await self.execute_with_timeout(self.image_oeq_llama(question, images), timeout)
+
+    async def get_text_response(self, model_input, timeout=ModelQuery.DEFAULT_TIMEOUT):
+        """Process text-based queries."""
+        question = model_input['question'].strip()
+        options = model_input.get('options', [])
+
+        if options:
+            return await self.get_text_mcq_answer(question, options, timeout)
+        return await self.get_text_oeq_answer(question, timeout)
+
+    async def get_image_response(self, model_input, timeout=ModelQuery.DEFAULT_TIMEOUT):
+        """Process image-based queries."""
+        question = model_input['question'].strip()
+        images = model_input['images']
+        options = model_input.get('options', [])
+
+        if options:
+            return await self.get_image_mcq_answer(question, images, options, timeout)
+        return await self.get_image_oeq_answer(question, images, timeout)
+
+    async def get_response(self, model_input, timeout=ModelQuery.DEFAULT_TIMEOUT):
+        """Process queries with either text or image model."""
+        is_valid, error = self._validate_arguments(model_input, timeout)
+        if not is_valid:
+            return error
+        record_request_metric('prompt_hash', prompt_hash(model_input))
+
+        cache_entry = await asyncio.to_thread(self.get_response_cache_key, model_input)
+        if cache_entry is not None:
+            cached = await asyncio.to_thread(self.response_cache.get, cache_entry[1])
+            if cached is not None:
+                record_request_metric('cache_hit', True)
+                return cached
+
+        if not model_input.get('images') or len(model_input.get('images', [])) == 0:
+            response = await self.get_text_response(model_input, timeout)
+        else:
+            response = await self.get_image_response(model_input, timeout)
+
+        if cache_entry is not None:
+            await asyncio.to_thread(self.store_cached_response, cache_entry, response)
+        return response
@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class CheckpointLog:
+    """Append-only JSONL log of answered questions, used to resume interrupted runs.
+
+    The first line is a header holding the sampling seed, so a resumed run draws
+    the same sample. Every following line records one answer, marked when it is
+    a failure such as an error or a timeout. Lines are flushed as they are
+    written, while fsyncs are batched by count and by time.
+    """
+    def __init__(self, path, fsync_every=64, fsync_interval=5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read an existing log.
+
+        Failed answers are left out, so a resumed run asks those questions
+        again; a later record of the same question replaces an earlier one.
+
+        Returns:
+            tuple: (header dict, {(subject, split, qid): answer})
+        """
+        header = {}
+        completed = {}
+        failed = set()
+        if not os.path.exists(self.path):
+            return header, completed
+
+        with open(self.path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partially written last line
+                    logger.warning(f"Skipping unreadable checkpoint line {line_number} in {self.path}")
+                    continue
+                if record.get('type') == 'header':
+                    header = record
+                    continue
+                key = (record['subject'], record['split'], record['qid'])
+                if record.get('failed'):
+                    completed.pop(key, None)
+                    failed.add(key)
+                else:
+                    completed[key] = record['answer']
+                    failed.discard(key)
+        logger.info(f"Loaded {len(completed)} completed questions from {self.path}"
+                    + (f"; {len(failed)} failed questions will be asked again" if failed else ""))
+        return header, completed
+
+    def open(self, header=None, resume=False):
+        """Open the log for appending. Without `resume`, any previous log is replaced.
+
+        The header is written whenever the log starts out empty, so a resumed run
+        that found no log still records its seed for the next resume.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if resume:
+            self._truncate_partial_line()
+        self._file = open(self.path, 'a' if resume else 'w')
+        if header is not None and os.path.getsize(self.path) == 0:
+            self._write({'type': 'header', **header})
+            self.sync()
+
+    def _truncate_partial_line(self, chunk_size=4096):
+        """Cut a partially written last line left by a crash, so appended records start on a fresh line."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            keep = 0
+            position = end
+            while position > 0:
+                start = max(0, position - chunk_size)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b'\n')
+                if newline != -1:
+                    keep = start + newline + 1
+                    break
+                position = start
+            if keep < end:
+                logger.warning(f"Truncating {end - keep} bytes of a partially written line at the end of {self.path}")
+                f.truncate(keep)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, default=str) + '\n')
+        self._file.flush()
+
+    def append(self, subject, split, qid, answer, failed=False):
+        record = {'subject': subject, 'split': split, 'qid': qid, 'answer': answer}
+        if failed:
+            record['failed'] = True
+        with self._lock:
+            self._write(record)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        if self._file is None:
+            return
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
+            self._file = None
@@ -1,15 +1,35 @@
 import argparse
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import pickle
 import random
+import threading
 import time
 
 from abc import ABC, abstractmethod
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datasets import get_dataset_config_names, get_dataset_split_names
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datasets import Image as ImageFeature, Sequence, concatenate_datasets
 from tqdm import tqdm
-from utils import gen_question_id, get_sample_indices, load_data, save_results
+from async_model_query import AsyncModelQuery
+from checkpoint import CheckpointLog
+from dataset_manifest import get_manifest
+from eval_pack import EvalPack, EvalPackWriter, get_eval_pack_path
+from image_encoding import ImageBudget, get_image_cache, set_image_budget
+from image_prefetch import configure_image_prefetcher, get_image_prefetcher
+from image_workers import configure_image_workers
+from model_query import ModelQuery, request_metrics
+from ollama_client import configure_ollama_hosts, get_endpoint_stats, get_inflight_limiter, set_adaptive_inflight_limit
+from response_cache import ResponseCache
+from results_store import ResultsWriter, get_results_store_path, is_failed_answer
+from row_filters import eligible_indices, row_matches
+from sharding import in_shard, shard_tag
+from stream_sampling import DEFAULT_BUFFER_SIZE, SAMPLE_METHODS, SHUFFLE_BUFFER, StreamSample
+from task_list import Tasks, execute_task_async
+from utils import gen_question_id, get_checkpoint_path, get_sample_indices, load_data, load_streaming_data, save_results
+from work_queue import LeaseHeartbeat, WorkQueue, default_worker_id, export_results
 
 # Set up logging
 log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
@@ -18,7 +38,56 @@ logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(mes
 
 logger = logging.getLogger(__name__)
 
+class SubsetWork:
+    """Work for one (subject, split) pair: its dataset, the questions left to run and their answers."""
+    def __init__(self, subject, split, dataset, indices, answers, sampled=None):
+        self.subject = subject
+        self.split = split
+        self.dataset = dataset
+        self.indices = indices
+        self.answers = answers
+        # Size of the subset's sample before it was cut down to this shard
+        self.sampled = len(indices) + len(answers) if sampled is None else sampled
+        # Answers recovered from a checkpoint, as opposed to answered in this run
+        self.recovered = set(answers)
+        self.planned = len(indices)
+        self.remaining = len(indices)
+
+    @property
+    def progress(self):
+        return f"{self.desc} {self.planned - self.remaining}/{self.planned}"
+
+    @property
+    def desc(self):
+        return f"{self.split}" if self.subject is None else f"{self.subject}:{self.split}"
+
+def _extract_batch_columns(*columns, keys, extract):
+    """Dataset.map function: parse one batch with a handler's extract_batch into the precomputed columns."""
+    parsed = extract(dict(zip(keys, columns)))
+    return {
+        DatasetHandler.QUESTION_COLUMN: parsed['question'],
+        DatasetHandler.OPTIONS_COLUMN: parsed['options']
+    }
+
 class DatasetHandler(ABC):
+    VALID_BACKENDS = frozenset({'thread', 'async'})
+    # Columns holding image URLs; their images are downloaded ahead of the model calls
+    IMAGE_URL_KEYS = frozenset()
+    # Datasets too large to download for a sample are streamed by default
+    STREAMING = False
+    # Rows to keep, as (column, op) or (column, op, value) with op one of '==', '!=', 'in', 'not_null'.
+    # They are applied to whole columns before sampling, so -n draws only from eligible rows.
+    ROW_FILTERS = ()
+    # Handlers that parse prompts out of raw text can declare the columns they read and implement
+    # the classmethod extract_batch(batch), which maps {column: values} to batch_columns() output;
+    # questions and options are then parsed once per dataset version
+    EXTRACT_INPUT_KEYS = frozenset()
+    EXTRACT_VERSION = 1
+    QUESTION_COLUMN = "sopho_question"
+    OPTIONS_COLUMN = "sopho_options"
+    # Seconds between the per-subset progress lines logged while questions run
+    PROGRESS_LOG_INTERVAL = 30.0
+
     def __init__(self, dataset_name, save_suffix_name, sys_config=None):
         self.dataset_name = dataset_name
         self.save_suffix_name = save_suffix_name
@@ -38,6 +107,121 @@ class DatasetHandler(ABC):
         if not isinstance(self.response_timeout, (int, float)) or self.response_timeout <= 0:
             logger.warning(f"Invalid response_timeout value: {self.response_timeout}. Using default 30 seconds.")
             self.response_timeout = 30
+
+        # Select the execution backend: one thread per in-flight question, or a single event loop
+        self.backend = sys_config.get('backend') or 'thread'
+        if self.backend not in self.VALID_BACKENDS:
+            logger.warning(f"Invalid backend value: {self.backend}. Using thread backend.")
+            self.backend = 'thread'
+
+        self.max_concurrency = sys_config.get('max_concurrency') or AsyncModelQuery.DEFAULT_MAX_CONCURRENCY
+        if not isinstance(self.max_concurrency, int) or self.max_concurrency < 1:
+            logger.warning(f"Invalid max_concurrency value: {self.max_concurrency}. Using default {AsyncModelQuery.DEFAULT_MAX_CONCURRENCY}.")
+            self.max_concurrency = AsyncModelQuery.DEFAULT_MAX_CONCURRENCY
+        self._async_model = None
+
+        # Cap on questions materialized at once; defaults to twice the worker/concurrency count
+        self.max_inflight = sys_config.get('max_inflight')
+        if self.max_inflight is not None and (not isinstance(self.max_inflight, int) or self.max_inflight < 1):
+            logger.warning(f"Invalid max_inflight value: {self.max_inflight}. Using default.")
+            self.max_inflight = None
+
+        # Processes for image decode/resize/encode, sized apart from the request threads.
+        # They are started from a forkserver, before this handler opens any Ollama client.
+        image_workers = sys_config.get('image_workers')
+        if image_workers and self.is_multimodal():
+            configure_image_workers(image_workers)
+
+        # Spread model requests across several Ollama servers; by default OLLAMA_HOSTS or OLLAMA_HOST
+        ollama_hosts = sys_config.get('ollama_hosts')
+        if ollama_hosts:
+            configure_ollama_hosts(ollama_hosts)
+
+        # Let an adaptive limit, up to this many requests, decide what is in flight instead of the worker count
+        self.adaptive_inflight = sys_config.get('adaptive_inflight')
+        if self.adaptive_inflight:
+            set_adaptive_inflight_limit(self.adaptive_inflight)
+            self.max_concurrency = max(self.max_concurrency, self.adaptive_inflight)
+
+        # Load image columns undecoded and send the stored JPEG/PNG bytes as they are
+        self.raw_images = bool(sys_config.get('raw_images', False))
+
+        # Drop the columns a handler does not declare before any row is read
+        self.project_columns = not sys_config.get('all_columns', False)
+
+        # Processes used for batched prompt extraction; None parses in the main process
+        self.extract_workers = sys_config.get('extract_workers')
+
+        # Optional resolution budget for images sent to this handler's vision model
+        image_max_pixels = sys_config.get('image_max_pixels')
+        vision_model = getattr(self, 'models', {}).get('vision')
+        if image_max_pixels and vision_model:
+            set_image_budget(vision_model, ImageBudget(
+                max_pixels=image_max_pixels,
+                format=sys_config.get('image_format') or "JPEG",
+                quality=sys_config.get('image_quality') or 90
+            ))
+        self.image_stats = {'images': 0, 'resized': 0, 'original_pixels': 0, 'sent_pixels': 0}
+
+        # Stream the split and sample it with a seeded shuffle instead of downloading it
+        self.streaming = bool(sys_config.get('streaming')) or self.STREAMING
+        self.stream_buffer_size = sys_config.get('stream_buffer_size') or DEFAULT_BUFFER_SIZE
+        # An approximate shuffle reading only the sampled rows, or a uniform sample reading the whole stream
+        self.stream_sample = sys_config.get('stream_sample') or SHUFFLE_BUFFER
+        if self.stream_sample not in SAMPLE_METHODS:
+            logger.warning(f"Invalid stream_sample value: {self.stream_sample}. Using {SHUFFLE_BUFFER}.")
+            self.stream_sample = SHUFFLE_BUFFER
+
+        # Answers are stored as Parquet rows with their request metrics; --json_results also writes the old JSON
+        self.json_results = bool(sys_config.get('json_results', False))
+        self.results_writer = None
+
+        # save_questions writes an eval pack; any other task can run from one instead of the hub
+        self.eval_pack_path = sys_config.get('eval_pack')
+        self.eval_pack = None
+        self.pack_writer = None
+        if self.eval_pack_path and self.get_assigned_task() != Tasks.SAVE_QUESTIONS:
+            self.eval_pack = EvalPack(self.eval_pack_path)
+
+        # Every answer is appended to a checkpoint log; --resume skips questions already answered without an error
+        self.resume = bool(sys_config.get('resume', False))
+        self.seed = sys_config.get('seed')
+        self.checkpoint = None
+        # With --shard i/N only the questions hashed to shard i are run
+        self.shard = sys_config.get('shard')
+        self.completed = {}
+
+        # With --work_queue, workers lease batches of questions from a shared queue instead of a fixed shard
+        self.work_queue = None
+        self.worker_id = sys_config.get('worker_id') or default_worker_id()
+        self.queue_batch_size = sys_config.get('queue_batch_size') or 32
+        work_queue_path = sys_config.get('work_queue')
+        if work_queue_path:
+            if self.shard is not None:
+                raise ValueError("--shard and --work_queue are alternative ways to split a run; use one of them")
+            self.work_queue = WorkQueue(work_queue_path, lease_seconds=sys_config.get('lease_seconds') or 300)
+
+        response_cache_path = sys_config.get('response_cache')
+        if response_cache_path:
+            current = ModelQuery.response_cache
+            if current is None or current.path != response_cache_path:
+                ModelQuery.set_response_cache(ResponseCache(
+                    response_cache_path,
+                    max_entries=sys_config.get('response_cache_max_entries'),
+                    max_age_days=sys_config.get('response_cache_max_age_days')
+                ))
+
+        if self.IMAGE_URL_KEYS and any(sys_config.get(key) for key in ('image_cache_dir', 'image_cache_bytes', 'prefetch_workers')):
+            configure_image_prefetcher(
+                cache_dir=sys_config.get('image_cache_dir'),
+                max_bytes=sys_config.get('image_cache_bytes'),
+                max_workers=sys_config.get('prefetch_workers')
+            )
+
+        # Requests aborted by the response timeout, counted across the whole dataset
+        self.cancelled_requests = 0
+        self._stats_lock = threading.Lock()
+        self._progress_logged_at = 0.0
         
         # Infer data source from dataset name
         if self.dataset_name.endswith('.csv'):
@@ -48,64 +232,538 @@ class DatasetHandler(ABC):
             # Default to huggingface if no clear file extension is present
             self.data_source = 'huggingface'
 
+    def plan_subset(self, subject, split, nsamples=None):
+        """Load a subset, draw its sample and drop questions already answered in the checkpoint.
+
+        Returns:
+            SubsetWork or None if the subset could not be loaded
+        """
+        subset_seed = None if self.seed is None else f"{self.seed}:{subject}:{split}"
+        if self.eval_pack is not None:
+            # Pack questions keep the qids they were exported with
+            dataset = self.eval_pack.subset(subject, split)
+            indices = get_sample_indices(dataset, nsamples, seed=subset_seed, population=dataset.qids)
+        elif self.streaming and self.data_source == 'huggingface':
+            dataset = self._stream_sample(subject, split, nsamples, subset_seed)
+            if dataset is None:
+                return None
+            indices = list(range(len(dataset)))
+        else:
+            dataset = self.get_dataset(subject, split)
+            if dataset is None:
+                logger.warning(f"Dataset for {subject} - {split} could not be loaded.")
+                return None
+            population = eligible_indices(dataset, self.ROW_FILTERS)
+            indices = get_sample_indices(dataset, nsamples, seed=subset_seed, population=population)
+        logger.debug(f"Sample indices for {subject}:{split}: {indices}")
+
+        # Every shard draws the same sample and keeps its own part of it
+        sampled = len(indices)
+        if self.shard is not None:
+            indices = [id for id in indices if in_shard(subject, split, id, self.shard)]
+
+        # Answers recovered from the checkpoint are kept; only missing questions are scheduled
+        answers = {id: self.completed[(subject, split, id)] for id in indices if (subject, split, id) in self.completed}
+        indices = [id for id in indices if id not in answers]
+        if answers:
+            logger.info(f"Resuming {subject}:{split}: {len(answers)} done, {len(indices)} remaining")
+        if isinstance(dataset, StreamSample):
+            dataset.set_wanted(indices)
+
+        return SubsetWork(subject, split, dataset, indices, answers, sampled=sampled)
+
+    def _stream_sample(self, subject, split, nsamples, seed):
+        """Open a split as a stream and wrap it in a seeded sample.
+
+        Question ids are positions in the seeded sample, so a run with the same
+        seed and sample size sees the same questions under the same ids.
+        """
+        logger.info(f"Streaming dataset for {subject} - {split}")
+        stream = load_streaming_data(self.dataset_name, subject, split)
+        if stream is None:
+            logger.warning(f"Dataset for {subject} - {split} could not be streamed.")
+            return None
+        num_rows = None
+        if nsamples is None:
+            num_rows = get_manifest().num_rows(self.dataset_name, subject, split)
+            if num_rows is None:
+                logger.error(f"Row count of {subject} - {split} is unknown; pass -n to stream it.")
+                return None
+        stream = self._prepare_columns(stream)
+        if self.ROW_FILTERS:
+            # Streams cannot be filtered column-wise up front, so rows are checked as they arrive
+            stream = stream.filter(lambda row: row_matches(row, self.ROW_FILTERS))
+        return StreamSample(stream, nsamples, seed, buffer_size=self.stream_buffer_size, num_rows=num_rows,
+                            method=self.stream_sample)
+
     def process_subset(self, subject, split, nsamples=None):
         print(f"Processing Subject: {subject} | Split: {split}")
-        
-        dataset = self.get_dataset(subject, split)
-        if dataset is None:
-            logger.warning(f"Dataset for {subject} - {split} could not be loaded.")
-            return None
 
-        indices = get_sample_indices(dataset, nsamples)
-        logger.debug(f"Sample indices for {subject}:{split}: {indices}")
+        work = self.plan_subset(subject, split, nsamples)
+        if work is None:
+            return None
+        self.run_work([work], desc=work.desc)
 
         result = {}
-        desc = f"{split}" if subject is None else f"{subject}:{split}"
-        max_workers = min(self.max_threads, os.cpu_count()) 
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.process_single_question, dataset, id) for id in indices]
-            for future in tqdm(as_completed(futures), total=len(futures), desc=desc, leave=False):
+        if work.answers:
+            result[subject] = {split: work.answers}
+        return result
+
+    def run_work(self, works, desc=None, pending=None, total=None):
+        """Run the questions of several subsets through one long-lived worker pool.
+
+        Questions are interleaved round-robin across subsets, so small subsets do
+        not leave the backend idle while their pool drains. Answers are still
+        collected per subset. `pending` replaces the interleaved questions with
+        another source of (work, index) pairs, such as a work queue; it may
+        yield None when it has nothing to hand out until a question finishes.
+        """
+        total = sum(len(work.indices) for work in works) if total is None else total
+        desc = desc or self.dataset_name.split('/')[-1]
+        self._progress_logged_at = time.monotonic()
+        if self.backend == 'async':
+            if self.get_assigned_task() == Tasks.GENERATE_ANSWERS:
+                # Model validation lists the installed models over blocking HTTP, so it runs before the loop starts
+                self.get_async_model()
+            asyncio.run(self._run_async(works, total, desc, pending))
+        else:
+            self._run_threaded(works, total, desc, pending)
+
+    def _prefetch_images(self, dataset, indices):
+        """Start downloading the image URLs of the given rows in the background."""
+        url_keys = [key for key in self.IMAGE_URL_KEYS if key in dataset.column_names]
+        if not url_keys or not indices:
+            return
+        if isinstance(dataset, StreamSample):
+            rows = dataset.peek(indices)
+            columns = {key: [row.get(key) for row in rows] for key in url_keys}
+        else:
+            rows = dataset.select(indices)
+            columns = {key: rows[key] for key in url_keys}
+        urls = []
+        for key in url_keys:
+            for value in columns[key]:
+                if isinstance(value, list):
+                    urls.extend(value)
+                elif value:
+                    urls.append(value)
+        get_image_prefetcher().prefetch(urls)
+
+    def localize_images(self, model_input):
+        """Replace image URLs in a model input with their downloaded bytes.
+
+        This runs before the timed model call, so network latency is not counted
+        as model latency. URLs that cannot be fetched are left for the model
+        query to report.
+        """
+        images = model_input.get('images')
+        if not images:
+            return model_input
+        if isinstance(images, str):
+            images = [images]
+
+        localized = []
+        for image in images:
+            if isinstance(image, str) and image.startswith(('http://', 'https://')):
                 try:
-                    processed_data = future.result(timeout=self.response_timeout)  # User-specified timeout
-                    if processed_data is not None:
-                        qid, answer = processed_data
-                        if subject not in result:
-                            result[subject] = {}
-                        if split not in result[subject]:
-                            result[subject][split] = {}
-                        result[subject][split][qid] = answer
+                    image = get_image_prefetcher().get(image)
                 except Exception as e:
-                    logger.error(f"Error processing a question in {subject}:{split}: {e}")
-                    logger.exception(e)
+                    logger.warning(f"Failed to fetch image {image}: {e}")
+            localized.append(image)
+        model_input['images'] = localized
+        return model_input
 
-        logger.info(f"Finished processing subset {subject}:{split}")
-        return result
+    def _record_answer(self, work, qid, answer, metrics=None):
+        # In a work queue run, the answer is durable once the queue has committed it
+        if self.work_queue is not None and not self.work_queue.complete(
+                self.dataset_name, self.save_suffix_name, work.subject, work.split, qid, self.worker_id, answer, metrics):
+            logger.info(f"Question {qid} of {work.desc} was already answered by another worker")
+            return
+        if self.results_writer is not None:
+            self.results_writer.append(work.subject, work.split, qid, answer, metrics)
+        if self.pack_writer is not None and isinstance(answer, dict):
+            try:
+                self.pack_writer.append(work.subject, work.split, qid, answer)
+            except Exception as e:
+                logger.error(f"Failed to add question {qid} of {work.desc} to the eval pack: {e}")
+            # Image bytes live in the pack; the JSON results and checkpoint keep the text only
+            answer = {key: value for key, value in answer.items() if key != 'images'}
+        work.answers[qid] = answer
+        if self.checkpoint is not None:
+            self.checkpoint.append(work.subject, work.split, qid, answer, failed=is_failed_answer(answer))
+
+    def _record_failure(self, work, qid):
+        """Store an error for a question that produced no answer, in a work queue run.
+
+        Otherwise its lease, kept alive by the heartbeat, would never be
+        completed or handed to another worker.
+        """
+        if self.work_queue is not None:
+            self._record_answer(work, qid, f"Error: question {qid} of {work.desc} could not be processed")
+
+    def _finish_question(self, work, works, progress):
+        """Count a finished question in the overall bar and its subset, logging subset progress periodically."""
+        work.remaining -= 1
+        progress.set_postfix_str(work.progress, refresh=False)
+        progress.update(1)
+        if work.remaining == 0:
+            logger.info(f"Finished processing subset {work.desc} (cancelled requests so far: {self.cancelled_requests})")
+        now = time.monotonic()
+        if now - self._progress_logged_at >= self.PROGRESS_LOG_INTERVAL:
+            self._progress_logged_at = now
+            active = [other.progress for other in works if 0 < other.remaining < other.planned]
+            if active:
+                logger.info(f"Subsets in progress: {', '.join(active)}")
+
+    def _iter_with_prefetch(self, dataset, indices, window):
+        """Yield indices, starting image downloads one window ahead of the rows being yielded."""
+        self._prefetch_images(dataset, indices[:window])
+        for position, id in enumerate(indices):
+            if position % window == 0:
+                self._prefetch_images(dataset, indices[position + window:position + 2 * window])
+            yield id
+
+    def _interleave(self, works, window):
+        """Yield (work, index) pairs round-robin across subsets."""
+        iterators = [(work, self._iter_with_prefetch(work.dataset, work.indices, window)) for work in works if work.indices]
+        while iterators:
+            for entry in list(iterators):
+                work, indices = entry
+                id = next(indices, None)
+                if id is None:
+                    iterators.remove(entry)
+                    continue
+                yield work, id
+
+    def _run_threaded(self, works, total, desc, pending=None):
+        """Process questions on one thread pool with at most max_inflight submitted at once.
+
+        New questions are only submitted as earlier ones complete, so rows (and their
+        decoded images) are materialized a bounded number at a time regardless of
+        the size of the dataset.
+        """
+        max_workers = min(self.max_threads, os.cpu_count()) 
+        if self.adaptive_inflight:
+            # Threads only wait on the model here; the adaptive limiter gates the requests
+            max_workers = max(max_workers, self.adaptive_inflight)
+        max_inflight = self.max_inflight or 2 * max_workers
+        if pending is None:
+            pending = self._interleave(works, 2 * max_inflight)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                tqdm(total=total, desc=desc, leave=False) as progress:
+            inflight = {}
+            while True:
+                for item in pending:
+                    if item is None:
+                        break
+                    work, id = item
+                    inflight[executor.submit(self.process_single_question, work.dataset, id)] = (work, id)
+                    if len(inflight) >= max_inflight:
+                        break
+                if not inflight:
+                    break
+
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    work, id = inflight.pop(future)
+                    try:
+                        processed_data = future.result(timeout=self.response_timeout)  # User-specified timeout
+                        if processed_data is not None:
+                            qid, answer, metrics = processed_data
+                            self._record_answer(work, qid, answer, metrics)
+                        else:
+                            self._record_failure(work, id)
+                    except Exception as e:
+                        logger.error(f"Error processing a question in {work.desc}: {e}")
+                        logger.exception(e)
+                    self._finish_question(work, works, progress)
+
+    async def _run_async(self, works, total, desc, pending=None):
+        """Process questions on the event loop with at most max_inflight question tasks alive at once."""
+        max_inflight = self.max_inflight or 2 * self.max_concurrency
+        if pending is None:
+            pending = self._interleave(works, 2 * max_inflight)
+        try:
+            with tqdm(total=total, desc=desc, leave=False) as progress:
+                inflight = {}
+                while True:
+                    for item in pending:
+                        if item is None:
+                            break
+                        work, id = item
+                        inflight[asyncio.ensure_future(self.process_single_question_async(work.dataset, id))] = (work, id)
+                        if len(inflight) >= max_inflight:
+                            break
+                    if not inflight:
+                        break
+
+                    done, _ = await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        work, id = inflight.pop(task)
+                        try:
+                            processed_data = task.result()
+                            if processed_data is not None:
+                                qid, answer, metrics = processed_data
+                                self._record_answer(work, qid, answer, metrics)
+                            else:
+                                self._record_failure(work, id)
+                        except Exception as e:
+                            logger.error(f"Error processing a question in {work.desc}: {e}")
+                            logger.exception(e)
+                        self._finish_question(work, works, progress)
+        finally:
+            if self._async_model is not None:
+                await self._async_model.aclose()
 
     def process_single_question(self, dataset, id):
+        metrics = {}
+        token = request_metrics.set(metrics)
+        try:
+            row = dataset[id]
+            start = time.monotonic()
+            answer = self.process_dataset_row(row)
+            metrics['latency'] = time.monotonic() - start
+            metrics['finished_at'] = time.time()
+            self._record_question_stats(answer, metrics)
+            return id, answer, metrics
+        except Exception as e:
+            logger.error(f"Error processing row {id}: {e}")
+            logger.exception(e)
+            return None
+        finally:
+            request_metrics.reset(token)
+
+    async def process_single_question_async(self, dataset, id):
+        metrics = {}
+        request_metrics.set(metrics)  # each question runs in its own task context
         try:
-            answer = self.process_dataset_row(dataset[id])
-            return id, answer
+            row = dataset[id]
+            start = time.monotonic()
+            answer = await self.process_dataset_row_async(row)
+            metrics['latency'] = time.monotonic() - start
+            metrics['finished_at'] = time.time()
+            self._record_question_stats(answer, metrics)
+            return id, answer, metrics
         except Exception as e:
             logger.error(f"Error processing row {id}: {e}")
             logger.exception(e)
             return None
 
+    def _record_question_stats(self, answer, metrics):
+        with self._stats_lock:
+            if answer == ModelQuery.TIMEOUT_ERROR:
+                self.cancelled_requests += 1
+            for sizes in metrics.get('image_sizes', []):
+                original, sent = sizes['original'], sizes['sent']
+                self.image_stats['images'] += 1
+                self.image_stats['resized'] += int(original != sent)
+                self.image_stats['original_pixels'] += original[0] * original[1]
+                self.image_stats['sent_pixels'] += sent[0] * sent[1]
+
+    async def process_dataset_row_async(self, row):
+        return await execute_task_async(self, row)
+
+    def get_async_model(self):
+        """Return the handler's asyncio model client, creating it on first use.
+
+        Creating the client validates the models synchronously, so it is only
+        created outside the event loop; run_work does that before starting it.
+        """
+        if self._async_model is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                logger.error("The async model could not be created before the event loop started")
+                return None
+            try:
+                self._async_model = AsyncModelQuery(self.models, max_concurrency=self.max_concurrency)
+            except Exception as e:
+                logger.error(f"Failed to initialize async model: {e}")
+                return None
+        return self._async_model
+
+    def _open_checkpoint(self, nsamples):
+        """Open the checkpoint log, loading completed answers and the sampling seed when resuming.
+
+        Without --seed, the seed comes from the log being resumed. A run that
+        has no log yet picks one, 0 for a shard and a random one otherwise, and
+        records it in the log's header so that a later resume reuses it.
+        """
+        self.checkpoint = CheckpointLog(get_checkpoint_path(self.dataset_name, self.save_suffix_name, self.shard))
+        self.completed = {}
+        if self.resume:
+            header, self.completed = self.checkpoint.load()
+            if header and header.get('task') != self.get_assigned_task():
+                raise ValueError(f"Checkpoint {self.checkpoint.path} was written by task {header.get('task')}, "
+                                 f"not {self.get_assigned_task()}; run without --resume to start over")
+            if header and header.get('nsamples') != nsamples:
+                logger.warning(f"Checkpoint was written with nsamples={header.get('nsamples')}, resuming with nsamples={nsamples}")
+            if self.seed is None:
+                self.seed = header.get('seed')
+            elif header and header.get('seed') != self.seed:
+                logger.warning(f"Checkpoint was written with seed={header.get('seed')}, resuming with seed={self.seed}; "
+                               f"only its answers to questions also in the new sample are kept")
+
+        if self.seed is None and nsamples is not None:
+            if self.shard is not None:
+                # Shards on different machines must draw the same sample
+                logger.info("No --seed given for a sharded run; sampling with seed 0")
+                self.seed = 0
+            else:
+                self.seed = random.randrange(2 ** 32)
+        self.checkpoint.open(header={'seed': self.seed, 'nsamples': nsamples, 'task': self.get_assigned_task(),
+                                     'shard': self.shard}, resume=self.resume)
+
+    def _join_work_queue(self, nsamples):
+        """Register this run in the work queue, which takes the place of the checkpoint log."""
+        if self.get_assigned_task() == Tasks.SAVE_QUESTIONS:
+            raise ValueError("save_questions writes one eval pack and cannot be split across queue workers")
+        if self.seed is None and nsamples is not None:
+            # Queue workers on different machines must draw the same sample
+            logger.info("No --seed given for a work queue run; sampling with seed 0")
+            self.seed = 0
+        self.work_queue.register_job(self.dataset_name, self.save_suffix_name, self.seed, nsamples)
+        logger.info(f"Worker {self.worker_id} joined work queue {self.work_queue.path}")
+
+    def _drain_work_queue(self, works):
+        """Enqueue the planned questions, then run leased questions until no question of the run is left.
+
+        Every worker plans the same sample, so the first one to start fills the
+        queue and the others add nothing. The questions run on one worker pool
+        or event loop for the whole drain, which takes more leases as its slots
+        free up, while the heartbeat keeps the leases of the questions it holds
+        alive.
+        """
+        queue = self.work_queue
+        added = queue.enqueue(self.dataset_name, self.save_suffix_name,
+                              [(work.subject, work.split, qid) for work in works for qid in work.indices])
+        logger.info(f"Added {added} questions to the work queue")
+        subsets = {(work.subject, work.split): work for work in works}
+
+        with LeaseHeartbeat(queue, self.worker_id):
+            try:
+                outstanding = queue.outstanding(self.dataset_name, self.save_suffix_name)
+                while outstanding:
+                    self.run_work(works, pending=self._lease_questions(subsets), total=outstanding)
+                    # Only a question whose answer could not be stored ends the pool early; it goes back to the queue
+                    queue.release(self.worker_id)
+                    outstanding = queue.outstanding(self.dataset_name, self.save_suffix_name)
+            finally:
+                queue.release(self.worker_id)
+
+    def _lease_questions(self, subsets):
+        """Yield (work, index) pairs leased from the work queue, leasing the next batch once one is handed out.
+
+        When nothing is left to lease, it yields None while this worker still
+        has questions in flight, so the worker pool collects them. Once this
+        worker holds no lease but other workers do, it waits, to take over
+        leases that expire.
+        """
+        queue = self.work_queue
+        while True:
+            items = queue.lease(self.dataset_name, self.save_suffix_name, self.worker_id, self.queue_batch_size)
+            if not items:
+                if queue.leased(self.dataset_name, self.save_suffix_name, self.worker_id):
+                    yield None
+                elif queue.outstanding(self.dataset_name, self.save_suffix_name) == 0:
+                    return
+                else:
+                    time.sleep(min(5.0, queue.lease_seconds / 10))
+                continue
+
+            leased = {}
+            for subject, split, qid in items:
+                leased.setdefault((subject, split), []).append(qid)
+            for (subject, split), qids in leased.items():
+                work = subsets.get((subject, split))
+                if work is None:
+                    # No worker should keep leasing a subset it cannot load
+                    logger.warning(f"Subset {subject}:{split} from the work queue could not be loaded here")
+                    for qid in qids:
+                        queue.complete(self.dataset_name, self.save_suffix_name, subject, split, qid,
+                                       self.worker_id, f"Error: {subject}:{split} could not be loaded")
+                    continue
+                self._prefetch_images(work.dataset, qids)
+                # Answers are collected on the planned work of the subset
+                for qid in qids:
+                    yield work, qid
+
+    def _export_work_queue(self, nsamples):
+        """Write the run's results from the answers stored in the queue, if this worker is the one to do it.
+
+        Answers live in the queue, not in files of the workers that produced
+        them, so answers of a worker that died are exported like any other.
+
+        Returns:
+            dict: results of the whole run by subject and split, or None if another worker exports them
+        """
+        if not self.work_queue.claim_export(self.dataset_name, self.save_suffix_name):
+            logger.info("Another worker is exporting the results of this run")
+            return None
+        path, answers = export_results(self.work_queue, self.dataset_name, self.save_suffix_name,
+                                       seed=self.seed, nsamples=nsamples)
+        logger.info(f"Exported {len(answers)} answers from the work queue to {path}")
+        results = {}
+        for subject, split, qid, answer in answers:
+            results.setdefault(subject, {}).setdefault(split, {})[qid] = answer
+        return results
+
+    def _open_pack_writer(self, nsamples):
+        """Start the eval pack for a save_questions run, recording how the sample was drawn."""
+        if self.completed:
+            # A pack is written in one pass and checkpointed questions carry no image bytes
+            logger.info("Exporting every sampled question again to rebuild the eval pack")
+            self.completed = {}
+        path = self.eval_pack_path or get_eval_pack_path(self.dataset_name, self.shard)
+        self.pack_writer = EvalPackWriter(path, metadata={
+            'dataset': self.dataset_name,
+            'nsamples': nsamples,
+            'seed': self.seed,
+            'shard': self.shard
+        })
+
+    def _open_results_writer(self, works, nsamples):
+        """Start the Parquet results file, recording the run and the questions each subset was assigned."""
+        dataset = self.dataset_name.split('/')[-1]
+        self.results_writer = ResultsWriter(
+            get_results_store_path(self.dataset_name, self.save_suffix_name, self.shard),
+            dataset=dataset,
+            model=self.save_suffix_name,
+            metadata={
+                'dataset': dataset,
+                'model': self.save_suffix_name,
+                'nsamples': nsamples,
+                'seed': self.seed,
+                'shard': self.shard,
+                'planned': {
+                    f"{work.subject}/{work.split}": {'sampled': work.sampled, 'assigned': len(work.indices) + len(work.answers)}
+                    for work in works
+                }
+            }
+        )
+
     def save_results(self, result):
-        save_results(result, self.dataset_name, self.save_suffix_name)
+        save_results(result, self.dataset_name, f"{self.save_suffix_name}{shard_tag(self.shard)}")
 
     def get_subjects(self):
+        if self.eval_pack is not None:
+            return self.eval_pack.subjects()
         if self.data_source in ['csv', 'json']:
             return ['default']  # Single default subject for CSV and JSON
-        subjects = get_dataset_config_names(self.dataset_name)
+        subjects = get_manifest().get_configs(self.dataset_name)
         if not subjects:
             logger.warning("No subjects found for the dataset.")
         return subjects
 
     def get_splits(self, subject):
+        if self.eval_pack is not None:
+            return self.eval_pack.splits(subject)
         if self.data_source in ['csv', 'json']:
             return ['train']  # Single default split for CSV and JSON
-        splits = get_dataset_split_names(self.dataset_name, subject)
+        splits = get_manifest().get_splits(self.dataset_name, subject)
         if not splits:
             logger.warning(f"No splits found for subject {subject}.")
         return splits
@@ -116,8 +774,13 @@ class DatasetHandler(ABC):
         for subject in subjects:
             splits = self.get_splits(subject)
             for split in splits:
-                dataset = self.get_dataset(subject, split)
-                count   = count + dataset.num_rows
+                num_rows = None
+                if self.data_source == 'huggingface':
+                    num_rows = get_manifest().num_rows(self.dataset_name, subject, split)
+                if num_rows is None:
+                    dataset = self.get_dataset(subject, split)
+                    num_rows = dataset.num_rows
+                count = count + num_rows
         return count
 
     def get_dataset(self, subject, split):
@@ -139,11 +802,139 @@ class DatasetHandler(ABC):
             dataset = load_data(self.dataset_name, subject, split)
             if dataset is None:
                 logger.warning(f"Dataset for {subject} - {split} could not be loaded from HuggingFace.")
+                return None
+            dataset = self._prepare_columns(dataset)
+            if self.EXTRACT_INPUT_KEYS:
+                dataset = self._precompute_prompts(dataset)
             return dataset
         except Exception as e:
             logger.error(f"Error loading HuggingFace dataset: {str(e)}")
             return None
 
+    def _prepare_columns(self, dataset):
+        """Project a loaded split to the handler's columns and turn off image decoding when it is not needed."""
+        if self.project_columns:
+            dataset = self._select_required_columns(dataset)
+        # Exporting questions never looks at pixels, so images stay as stored bytes
+        if self.raw_images or self.get_assigned_task() == Tasks.SAVE_QUESTIONS:
+            dataset = self._disable_image_decoding(dataset)
+        return dataset
+
+    def _precompute_prompts(self, dataset):
+        """Add the question and options columns parsed by extract_batch.
+
+        The parse runs with Dataset.map over record batches of the declared
+        input columns only, optionally in several processes. Its fingerprint is
+        derived from the split's own fingerprint, the handler class and
+        EXTRACT_VERSION. Only the two parsed columns are written to the HF
+        cache, next to the split, and reused by later runs and other models
+        until the dataset or the parser changes. They are then joined to the
+        split column-wise, so other columns such as images are never copied.
+        """
+        keys = sorted(self.EXTRACT_INPUT_KEYS)
+        if not keys or any(key not in dataset.column_names for key in keys):
+            return dataset
+        fingerprint = hashlib.blake2b(
+            f"{dataset._fingerprint}:{type(self).__qualname__}:{self.EXTRACT_VERSION}".encode('utf-8'),
+            digest_size=16
+        ).hexdigest()
+        try:
+            parsed = dataset.select_columns(keys).map(
+                _extract_batch_columns,
+                batched=True,
+                input_columns=keys,
+                remove_columns=keys,
+                fn_kwargs={'keys': keys, 'extract': type(self).extract_batch},
+                num_proc=self.extract_workers,
+                new_fingerprint=fingerprint,
+                desc="Extracting prompts"
+            )
+        except (OSError, pickle.PicklingError) as e:
+            # The cache is not writable or the parser cannot be sent to worker processes
+            logger.warning(f"Batched prompt extraction failed, extracting row by row: {e}")
+            return dataset
+        return concatenate_datasets([dataset, parsed], axis=1)
+
+    @staticmethod
+    def batch_columns(parsed):
+        """Turn an iterable of (question, options) pairs, or None for unparseable rows, into extract_batch output."""
+        questions = []
+        options = []
+        for item in parsed:
+            questions.append(None if item is None else item[0])
+            options.append(None if item is None else item[1])
+        return {'question': questions, 'options': options}
+
+    def get_images(self, row):
+        """Return the images of a row for a model input built from precomputed columns."""
+        return None
+
+    def get_model_input(self, row):
+        """Build the model input for a row, preferring eval pack rows and the columns parsed by extract_batch."""
+        if self.eval_pack is not None:
+            return {
+                'question': row['question'],
+                'options': row['options'],
+                'images': row['images'] or None
+            }
+        if self.QUESTION_COLUMN not in row:
+            return self.extract_data(row)
+        question = row[self.QUESTION_COLUMN]
+        if question is None:
+            return None
+        images = self.get_images(row)
+        if self.is_multimodal() and not images:
+            return None
+        return {
+            'question': question,
+            'options': row[self.OPTIONS_COLUMN],
+            'images': images
+        }
+
+    def _select_required_columns(self, dataset):
+        """Keep only the columns named in REQUIRED_DATA_KEYS and IMAGE_URL_KEYS.
+
+        Selecting columns only changes which Arrow columns rows are built from,
+        so unused columns, in particular unused image columns, are never read
+        or decoded. Declared keys missing from a split are ignored, and a
+        handler without declared keys keeps every column.
+        """
+        wanted = getattr(self, 'REQUIRED_DATA_KEYS', frozenset()) | self.IMAGE_URL_KEYS
+        columns = dataset.column_names
+        if not wanted or columns is None:
+            return dataset
+        keep = [name for name in columns if name in wanted]
+        if not keep or len(keep) == len(columns):
+            return dataset
+        logger.debug(f"Projecting {len(columns)} columns to {keep}")
+        return dataset.select_columns(keep)
+
+    @staticmethod
+    def _undecoded_feature(feature):
+        """Return a copy of an image feature with decoding disabled, or None if it holds no images."""
+        if isinstance(feature, ImageFeature):
+            return ImageFeature(decode=False)
+        if isinstance(feature, Sequence):
+            inner = DatasetHandler._undecoded_feature(feature.feature)
+            return None if inner is None else Sequence(inner, length=feature.length)
+        if isinstance(feature, list) and len(feature) == 1:
+            inner = DatasetHandler._undecoded_feature(feature[0])
+            return None if inner is None else [inner]
+        return None
+
+    def _disable_image_decoding(self, dataset):
+        """Cast image columns to decode=False so rows carry {'bytes', 'path'} instead of PIL images.
+
+        The cast only changes the feature metadata; the Arrow storage is unchanged,
+        so the original compressed bytes go straight from the Arrow buffer to base64.
+        """
+        for name, feature in (dataset.features or {}).items():
+            undecoded = self._undecoded_feature(feature)
+            if undecoded is not None:
+                dataset = dataset.cast_column(name, undecoded)
+                logger.debug(f"Disabled image decoding for column {name}")
+        return dataset
+
     def _load_from_csv(self):
         """Load dataset from CSV file."""
         try:
@@ -201,22 +992,77 @@ class DatasetHandler(ABC):
             logger.warning("No subjects found for the dataset. Exiting processing.")
             return
         
+        if self.work_queue is not None:
+            self._join_work_queue(nsamples)
+        else:
+            self._open_checkpoint(nsamples)
+        if self.get_assigned_task() == Tasks.SAVE_QUESTIONS:
+            self._open_pack_writer(nsamples)
         results = {}
-        for subject in subjects:
-            splits = self.get_splits(subject)
-            for split in splits:
-                result = self.process_subset(subject, split, nsamples)
-                if result is not None:
-                    if subject not in results:
-                        results[subject] = {}
-                    if subject in result and split in result[subject]:
-                        results[subject][split] = result[subject][split]
+        completed = False
+        try:
+            works = []
+            for subject in subjects:
+                splits = self.get_splits(subject)
+                for split in splits:
+                    work = self.plan_subset(subject, split, nsamples)
+                    if work is None:
+                        logger.warning(f"Failed to load dataset for {subject} - {split}")
+                        continue
+                    works.append(work)
+            logger.info(f"Scheduling {sum(len(work.indices) for work in works)} questions across {len(works)} subsets"
+                        + ("" if self.shard is None else f" for shard {self.shard[0]}/{self.shard[1]}"))
+            if self.get_assigned_task() != Tasks.SAVE_QUESTIONS and self.work_queue is None:
+                self._open_results_writer(works, nsamples)
+
+            if self.work_queue is not None:
+                self._drain_work_queue(works)
+                results = self._export_work_queue(nsamples)
+            else:
+                self.run_work(works)
+            if self.results_writer is not None:
+                # Answers recovered from the checkpoint are stored without metrics
+                for work in works:
+                    for qid in sorted(work.recovered):
+                        self.results_writer.append(work.subject, work.split, qid, work.answers[qid])
+            if self.work_queue is None:
+                for work in works:
+                    results.setdefault(work.subject, {})
+                    if work.answers:
+                        results[work.subject][work.split] = work.answers
+            completed = True
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+            # Output files are only moved into place by a run that finished; the checkpoint keeps the answers
+            if self.pack_writer is not None:
+                if completed:
+                    self.pack_writer.close()
+                else:
+                    self.pack_writer.discard()
+                self.pack_writer = None
+            if self.results_writer is not None:
+                if completed:
+                    self.results_writer.close()
                 else:
-                    logger.warning(f"Failed to load dataset for {subject} - {split}")
+                    self.results_writer.discard()
+                self.results_writer = None
             
-        self.save_results(results)
+        if results is not None and (self.json_results or self.get_assigned_task() == Tasks.SAVE_QUESTIONS):
+            self.save_results(results)
         total_time = time.time() - start_time
         logger.info(f"Total dataset processing time: {total_time:.2f} seconds")
+        logger.info(f"Requests cancelled after timeout: {self.cancelled_requests}")
+        logger.info(f"In-flight limiter: {get_inflight_limiter().stats()}")
+        endpoint_stats = get_endpoint_stats()
+        if endpoint_stats:
+            logger.info(f"Ollama endpoints: {endpoint_stats}")
+        logger.info(f"Encoded image cache: {get_image_cache().stats()}")
+        if ModelQuery.response_cache is not None:
+            logger.info(f"Response cache: {ModelQuery.response_cache.stats()}")
+        if self.image_stats['images']:
+            logger.info(f"Image budget: {self.image_stats['resized']}/{self.image_stats['images']} images downscaled, "
+                        f"{self.image_stats['sent_pixels'] / self.image_stats['original_pixels']:.1%} of original pixels sent")
 
     
 
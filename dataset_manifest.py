@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from datasets import get_dataset_config_names, get_dataset_split_names, load_dataset, load_dataset_builder
+from huggingface_hub import HfApi
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sophobench", "manifest.json")
+# Seconds a dataset's entry is trusted before its hub revision is checked again
+DEFAULT_MANIFEST_TTL = 24 * 3600
+
+_dataset_memo = {}
+_dataset_memo_locks = {}
+_dataset_memo_lock = threading.Lock()
+
+def load_dataset_dict(dataset_name, subject=None):
+    """Load a DatasetDict once per process and reuse it for every split and caller.
+
+    Each (dataset, subject) pair has its own lock, so different datasets load
+    concurrently while concurrent requests for the same one wait for a single load.
+    """
+    key = (dataset_name, subject)
+    with _dataset_memo_lock:
+        if key in _dataset_memo:
+            return _dataset_memo[key]
+        key_lock = _dataset_memo_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _dataset_memo:
+            if subject:
+                ds = load_dataset(dataset_name, subject, trust_remote_code=True)
+            else:
+                ds = load_dataset(dataset_name, trust_remote_code=True)
+            with _dataset_memo_lock:
+                _dataset_memo[key] = ds
+        return _dataset_memo[key]
+
+class DatasetManifest:
+    """Persistent manifest of dataset configs, splits, row counts and schemas.
+
+    Planning code reads configs, splits and row counts from here instead of
+    querying the hub or loading Arrow tables. Split entries are pinned by the
+    dataset fingerprint recorded when the split was last loaded. If a later
+    load sees a different fingerprint, the entry is replaced.
+
+    Each dataset's entry also records the hub revision it was built from. Once
+    it is older than `ttl` seconds, the current revision is looked up, and a
+    new revision drops the cached configs, splits and row counts. When the hub
+    cannot be reached, the entry is kept as it is.
+    """
+    def __init__(self, path=DEFAULT_MANIFEST_PATH, ttl=DEFAULT_MANIFEST_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self._data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable dataset manifest {path}: {e}")
+
+    def _save_locked(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _entry(self, dataset_name):
+        return self._data.setdefault(dataset_name, {'configs': None, 'splits': {}, 'split_info': {},
+                                                    'revision': None, 'checked_at': 0})
+
+    @staticmethod
+    def _hub_revision(dataset_name):
+        """Return the commit sha of a hub dataset, or None if it cannot be looked up."""
+        try:
+            return HfApi().dataset_info(dataset_name).sha
+        except Exception as e:
+            logger.debug(f"Could not look up the revision of {dataset_name}: {e}")
+            return None
+
+    def _revalidate(self, dataset_name):
+        """Stamp a new entry with the dataset's revision, and drop an expired one if the hub now serves another."""
+        with self._lock:
+            entry = self._data.get(dataset_name)
+            if entry is not None and time.time() - entry.get('checked_at', 0) < self.ttl:
+                return
+        revision = self._hub_revision(dataset_name)
+        with self._lock:
+            entry = self._entry(dataset_name)
+            if revision is not None and revision != entry.get('revision'):
+                if entry.get('revision'):
+                    logger.info(f"Dataset {dataset_name} moved to revision {revision}; refreshing its manifest entry")
+                del self._data[dataset_name]
+                entry = self._entry(dataset_name)
+                entry['revision'] = revision
+            entry['checked_at'] = time.time()
+            self._save_locked()
+
+    def get_configs(self, dataset_name):
+        self._revalidate(dataset_name)
+        with self._lock:
+            configs = self._entry(dataset_name)['configs']
+        if configs is None:
+            configs = get_dataset_config_names(dataset_name)
+            with self._lock:
+                self._entry(dataset_name)['configs'] = configs
+                self._save_locked()
+        return configs
+
+    def get_splits(self, dataset_name, subject):
+        config_key = subject or ""
+        self._revalidate(dataset_name)
+        with self._lock:
+            splits = self._entry(dataset_name)['splits'].get(config_key)
+        if splits is None:
+            splits = get_dataset_split_names(dataset_name, subject)
+            with self._lock:
+                self._entry(dataset_name)['splits'][config_key] = splits
+                self._save_locked()
+        return splits
+
+    def get_split_info(self, dataset_name, subject, split):
+        self._revalidate(dataset_name)
+        with self._lock:
+            return self._entry(dataset_name)['split_info'].get(f"{subject or ''}/{split}")
+
+    def num_rows(self, dataset_name, subject, split):
+        """Return the row count of a split without loading it.
+
+        Falls back to the builder's split metadata and records the result;
+        returns None when neither source knows the count.
+        """
+        info = self.get_split_info(dataset_name, subject, split)
+        if info is not None:
+            return info['num_rows']
+        try:
+            builder = load_dataset_builder(dataset_name, subject, trust_remote_code=True)
+            split_info = (builder.info.splits or {}).get(split)
+        except Exception as e:
+            logger.warning(f"Could not read split metadata for {dataset_name} {subject}:{split}: {e}")
+            return None
+        if split_info is None or not split_info.num_examples:
+            return None
+        with self._lock:
+            self._entry(dataset_name)['split_info'][f"{subject or ''}/{split}"] = {
+                'num_rows': split_info.num_examples,
+                'fingerprint': None,
+                'features': builder.info.features.to_dict() if builder.info.features else None
+            }
+            self._save_locked()
+        return split_info.num_examples
+
+    def record_split(self, dataset_name, subject, split, dataset):
+        """Record the row count, schema and fingerprint of a loaded split."""
+        key = f"{subject or ''}/{split}"
+        fingerprint = getattr(dataset, '_fingerprint', None)
+        with self._lock:
+            entry = self._entry(dataset_name)['split_info'].get(key)
+            if entry is not None and entry.get('fingerprint') == fingerprint:
+                return
+            if entry is not None and entry.get('fingerprint'):
+                logger.info(f"Dataset {dataset_name} {key} changed (fingerprint {entry['fingerprint']} -> {fingerprint})")
+            self._entry(dataset_name)['split_info'][key] = {
+                'num_rows': dataset.num_rows,
+                'fingerprint': fingerprint,
+                'features': dataset.features.to_dict()
+            }
+            self._save_locked()
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def get_manifest():
+    """Return the process-wide dataset manifest (path and expiry overridable with SOPHO_MANIFEST and SOPHO_MANIFEST_TTL)."""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = DatasetManifest(os.getenv('SOPHO_MANIFEST', DEFAULT_MANIFEST_PATH),
+                                            ttl=float(os.getenv('SOPHO_MANIFEST_TTL', DEFAULT_MANIFEST_TTL)))
+    return _manifest
@@ -1,5 +1,7 @@
 import argparse
 from typing import NamedTuple, Type
+from ollama_client import configure_inflight_limit
+from sharding import parse_shard
 from task_list import Tasks
 
 class ExecutionArgs(NamedTuple):
@@ -51,6 +53,175 @@ def get_execution_args(description: str = "Process dataset") -> ExecutionArgs:
         default=100,
         help="Timeout in seconds for model response. Default is 100 seconds."
     )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="thread",
+        choices=["thread", "async"],
+        help="Execution backend: one thread per in-flight question, or a single asyncio event loop. Default is thread."
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of in-flight model requests for the async backend."
+    )
+    parser.add_argument(
+        "--max_inflight",
+        type=int,
+        default=None,
+        help="Maximum number of questions loaded and queued at once. Defaults to twice the worker count."
+    )
+    parser.add_argument(
+        "--ollama_hosts",
+        nargs="+",
+        default=None,
+        help="Ollama servers to spread model requests across, e.g. gpu1:11434 gpu2:11434. Defaults to OLLAMA_HOSTS or OLLAMA_HOST."
+    )
+    parser.add_argument(
+        "--max_inflight_requests",
+        type=int,
+        default=None,
+        help="Global limit on model requests in flight. Defaults to 8 per Ollama server; 0 removes it. With --adaptive_inflight, a hard cap on the adaptive limit."
+    )
+    parser.add_argument(
+        "--adaptive_inflight",
+        type=int,
+        default=None,
+        metavar="MAX",
+        help="Adapt the number of model requests in flight, up to MAX, to observed latency and timeouts."
+    )
+    parser.add_argument(
+        "--raw_images",
+        action="store_true",
+        help="Load image columns without decoding and send the original JPEG/PNG bytes to the vision model."
+    )
+    parser.add_argument(
+        "--all_columns",
+        action="store_true",
+        help="Load every dataset column instead of only the columns the handler declares."
+    )
+    parser.add_argument(
+        "--extract_workers",
+        type=int,
+        default=None,
+        help="Processes used to parse prompts for datasets with batched extraction. Default is the main process."
+    )
+    parser.add_argument(
+        "--image_max_pixels",
+        type=int,
+        default=None,
+        help="Pixel budget for images sent to the vision model. Larger images are downscaled to fit."
+    )
+    parser.add_argument(
+        "--image_format",
+        type=str,
+        default="JPEG",
+        choices=["JPEG", "PNG"],
+        help="Format used for images downscaled to the pixel budget. Default is JPEG."
+    )
+    parser.add_argument(
+        "--image_workers",
+        type=int,
+        default=None,
+        help="Processes used to decode, resize and encode images, separate from the request threads. Default is none (inline)."
+    )
+    parser.add_argument(
+        "--image_cache_dir",
+        type=str,
+        default=None,
+        help="Directory of the on-disk cache for images downloaded from URLs."
+    )
+    parser.add_argument(
+        "--prefetch_workers",
+        type=int,
+        default=None,
+        help="Number of concurrent image downloads for datasets that reference images by URL."
+    )
+    parser.add_argument(
+        "--response_cache",
+        type=str,
+        default=None,
+        help="Path of a SQLite file caching model responses across runs. Disabled if not provided."
+    )
+    parser.add_argument(
+        "--response_cache_max_entries",
+        type=int,
+        default=None,
+        help="Evict least recently used cached responses beyond this many entries."
+    )
+    parser.add_argument(
+        "--response_cache_max_age_days",
+        type=float,
+        default=None,
+        help="Evict cached responses older than this many days."
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Stream the dataset and draw a seeded sample instead of downloading whole splits."
+    )
+    parser.add_argument(
+        "--stream_sample",
+        choices=["shuffle_buffer", "reservoir"],
+        default=None,
+        help="How a streamed dataset is sampled: shuffle_buffer (default) is an approximate shuffle that reads only "
+             "the sampled rows; reservoir draws a uniform sample but reads the whole stream."
+    )
+    parser.add_argument(
+        "--stream_shuffle_buffer",
+        "--stream_buffer_size",
+        dest="stream_buffer_size",
+        type=int,
+        default=None,
+        help="Rows held in the buffer of the approximate shuffle of a streamed dataset. Default is 1000."
+    )
+    parser.add_argument(
+        "--json_results",
+        action="store_true",
+        help="Also save answers as the nested JSON file, besides the Parquet results."
+    )
+    parser.add_argument(
+        "--eval_pack",
+        type=str,
+        default=None,
+        help="Eval pack file. save_questions writes it (default packs/<dataset>.arrow); other tasks read questions from it instead of the dataset."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run from its checkpoint log, only processing missing questions and those that failed or timed out."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for sampling questions with -n. Recorded in the checkpoint so resumed runs draw the same sample."
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Run shard i of N, given as i/N, of the sampled questions. Merge the shard results with sharding.py."
+    )
+    parser.add_argument(
+        "--work_queue",
+        type=str,
+        default=None,
+        help="Shared SQLite work queue. Any number of workers started with the same queue lease and run its questions; the worker that finishes the run exports its results from the queue."
+    )
+    parser.add_argument(
+        "--queue_batch_size",
+        type=int,
+        default=None,
+        help="Questions leased from the work queue at a time. Default is 32."
+    )
+    parser.add_argument(
+        "--lease_seconds",
+        type=float,
+        default=None,
+        help="Seconds a work queue lease lasts without a heartbeat before its questions are re-queued. Default is 300."
+    )
     parser.add_argument(
         '-task', 
         type=str, 
@@ -67,7 +238,35 @@ def get_execution_args(description: str = "Process dataset") -> ExecutionArgs:
     
     sys_config = {
         'max_threads': args.max_threads,
-        'response_timeout': args.timeout
+        'response_timeout': args.timeout,
+        'backend': args.backend,
+        'max_concurrency': args.max_concurrency,
+        'max_inflight': args.max_inflight,
+        'max_inflight_requests': args.max_inflight_requests,
+        'adaptive_inflight': args.adaptive_inflight,
+        'ollama_hosts': args.ollama_hosts,
+        'raw_images': args.raw_images,
+        'all_columns': args.all_columns,
+        'extract_workers': args.extract_workers,
+        'image_max_pixels': args.image_max_pixels,
+        'image_format': args.image_format,
+        'image_workers': args.image_workers,
+        'image_cache_dir': args.image_cache_dir,
+        'prefetch_workers': args.prefetch_workers,
+        'response_cache': args.response_cache,
+        'response_cache_max_entries': args.response_cache_max_entries,
+        'response_cache_max_age_days': args.response_cache_max_age_days,
+        'streaming': args.streaming,
+        'stream_sample': args.stream_sample,
+        'stream_buffer_size': args.stream_buffer_size,
+        'json_results': args.json_results,
+        'eval_pack': args.eval_pack,
+        'resume': args.resume,
+        'seed': args.seed,
+        'shard': args.shard,
+        'work_queue': args.work_queue,
+        'queue_batch_size': args.queue_batch_size,
+        'lease_seconds': args.lease_seconds
     }
 
     return ExecutionArgs(
@@ -86,6 +285,8 @@ def run_dataset(execute_class: Type) -> None:
     """
     description = f"Executing {execute_class.__name__} dataset"
     args = get_execution_args(description=description)
+    configure_inflight_limit(args.sys_config['max_inflight_requests'], args.sys_config['adaptive_inflight'],
+                             args.sys_config['ollama_hosts'])
 
     bench = execute_class(task=args.task, models=args.models, sys_config=args.sys_config)
    
@@ -0,0 +1,172 @@
+import io
+import json
+import logging
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from PIL import Image
+
+from image_prefetch import get_image_prefetcher
+from sharding import shard_tag
+
+logger = logging.getLogger(__name__)
+
+PACK_SCHEMA = pa.schema([
+    ('qid', pa.int64()),
+    ('subject', pa.string()),
+    ('split', pa.string()),
+    ('question', pa.string()),
+    ('options', pa.list_(pa.string())),
+    ('answer', pa.string()),
+    ('images', pa.list_(pa.binary()))
+])
+
+def get_eval_pack_path(bench_name, shard=None):
+    """Default location of the eval pack written for a benchmark, or for one shard of it."""
+    bench_name = bench_name.split('/')[-1].lower()
+    return os.path.join('packs', f'{bench_name}{shard_tag(shard)}.arrow')
+
+def image_to_bytes(image):
+    """Return the compressed bytes of an image as handlers pass it: PIL image, raw dict, bytes, path or URL."""
+    if isinstance(image, bytes):
+        return image
+    if isinstance(image, Image.Image):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+    if isinstance(image, dict):
+        if image.get('bytes'):
+            return image['bytes']
+        if image.get('path') and os.path.isfile(image['path']):
+            with open(image['path'], 'rb') as f:
+                return f.read()
+        raise ValueError("Undecoded image has neither bytes nor a readable path.")
+    if isinstance(image, str):
+        if image.startswith(('http://', 'https://')):
+            return get_image_prefetcher().get(image)
+        with open(image, 'rb') as f:
+            return f.read()
+    raise ValueError(f"Unsupported image type {type(image).__name__}")
+
+class EvalPackWriter:
+    """Write extracted questions, options, gold answers and image bytes to an Arrow IPC file.
+
+    Rows are buffered and written as record batches of `batch_size` rows, so
+    memory holds one batch of images at a time. The file format is the
+    uncompressed Arrow IPC file format, so readers can memory-map it.
+    """
+    def __init__(self, path, metadata=None, batch_size=256):
+        self.path = path
+        self.batch_size = batch_size
+        self.rows = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        schema = PACK_SCHEMA.with_metadata({
+            key: json.dumps(value, default=str) for key, value in (metadata or {}).items()
+        })
+        self._tmp_path = f"{path}.tmp"
+        self._sink = pa.OSFile(self._tmp_path, 'wb')
+        self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def append(self, subject, split, qid, model_input):
+        images = model_input.get('images') or []
+        if not isinstance(images, list):
+            images = [images]
+        options = model_input.get('options')
+        answer = model_input.get('answer')
+        record = {
+            'qid': qid,
+            'subject': subject,
+            'split': split,
+            'question': model_input.get('question'),
+            'options': None if options is None else [str(option) for option in options],
+            'answer': None if answer is None else str(answer),
+            'images': [image_to_bytes(image) for image in images if image is not None]
+        }
+        with self._lock:
+            self._buffer.append(record)
+            self.rows += 1
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            self._writer.write_batch(pa.RecordBatch.from_pylist(self._buffer, schema=PACK_SCHEMA))
+            self._buffer = []
+
+    def close(self):
+        """Write the remaining rows and move the finished pack into place."""
+        with self._lock:
+            self._flush_locked()
+            self._writer.close()
+            self._sink.close()
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"Wrote eval pack with {self.rows} questions to {self.path}")
+
+    def discard(self):
+        """Close the writer and delete the partial pack, leaving any earlier pack in place."""
+        with self._lock:
+            self._buffer = []
+            self._writer.close()
+            self._sink.close()
+        os.remove(self._tmp_path)
+        logger.info(f"Discarded partial eval pack with {self.rows} questions; {self.path} was not updated")
+
+class EvalPackSubset:
+    """The questions of one (subject, split) in a pack, addressed by qid.
+
+    Rows are zero-copy slices of the memory-mapped table.
+    """
+    def __init__(self, table, positions, qids):
+        self._table = table
+        self._positions = dict(zip(qids, positions))
+        self.qids = qids
+
+    def __len__(self):
+        return len(self.qids)
+
+    @property
+    def column_names(self):
+        # Pack columns never hold image URLs, so handlers find nothing to prefetch here
+        return self._table.column_names
+
+    def __getitem__(self, qid):
+        return self._table.slice(self._positions[qid], 1).to_pylist()[0]
+
+class EvalPack:
+    """Read-only, memory-mapped eval pack.
+
+    Opening a pack maps the file and reads only the Arrow metadata. No hub
+    lookup, HF cache or handler extraction is involved, so a pack copied to
+    an offline machine is ready to run at once.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._source = pa.memory_map(path, 'r')
+        self.table = pa.ipc.open_file(self._source).read_all()
+        self.metadata = {
+            key.decode('utf-8'): json.loads(value) for key, value in (self.table.schema.metadata or {}).items()
+        }
+        logger.info(f"Opened eval pack {path} with {self.table.num_rows} questions")
+
+    def subjects(self):
+        return self.table.column('subject').unique().to_pylist()
+
+    def splits(self, subject):
+        return self.table.filter(self._subject_mask(subject)).column('split').unique().to_pylist()
+
+    def _subject_mask(self, subject):
+        column = self.table.column('subject')
+        if subject is None:
+            return pc.is_null(column)
+        return pc.fill_null(pc.equal(column, subject), False)
+
+    def subset(self, subject, split):
+        mask = pc.and_(self._subject_mask(subject), pc.fill_null(pc.equal(self.table.column('split'), split), False))
+        positions = pc.indices_nonzero(mask).to_pylist()
+        qids = self.table.column('qid').take(positions).to_pylist()
+        return EvalPackSubset(self.table, positions, qids)
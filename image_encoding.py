@@ -0,0 +1,175 @@
+import base64
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+class ImageBudget(NamedTuple):
+    """Resolution budget and output format for images sent to a vision model."""
+    max_pixels: int | None = None
+    format: str = "JPEG"
+    quality: int = 90
+
+class EncodedImageCache:
+    """Thread-safe LRU cache of base64 image payloads keyed by image content hash.
+
+    The cache is bounded by the total size of the stored payloads rather than
+    by the number of entries, since image sizes vary by orders of magnitude.
+    """
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = payload
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+_image_cache = EncodedImageCache()
+_image_budgets = {}
+
+def get_image_cache():
+    """Return the process-wide encoded image cache."""
+    return _image_cache
+
+def set_image_budget(model, budget):
+    """Set the resolution budget used for images sent to `model`."""
+    _image_budgets[model] = budget
+    logger.info(f"Image budget for {model}: {budget}")
+
+def get_image_budget(model):
+    """Return the resolution budget for `model`, or None to send images unchanged."""
+    budget = _image_budgets.get(model)
+    if budget is None or not budget.max_pixels:
+        return None
+    return budget
+
+def image_content_hash(image):
+    """Hash a PIL image by its decoded pixels, mode and size."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode('utf-8'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def is_over_budget(size, budget):
+    return budget is not None and size[0] * size[1] > budget.max_pixels
+
+def budget_size(size, budget):
+    """Largest size with the same aspect ratio that fits in the pixel budget."""
+    scale = (budget.max_pixels / (size[0] * size[1])) ** 0.5
+    return max(1, int(size[0] * scale)), max(1, int(size[1] * scale))
+
+def sent_image_size(size, budget):
+    """Size an image of `size` is sent at under `budget`."""
+    return budget_size(size, budget) if is_over_budget(size, budget) else size
+
+def image_cache_key(image, budget=None):
+    """Key of an image's encoded payload in the encoded image cache."""
+    key = image_content_hash(image)
+    if is_over_budget(image.size, budget):
+        key = f"{key}:{budget.max_pixels}:{budget.format}:{budget.quality}"
+    return key
+
+def _save(image, fmt, quality=90):
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffer, format=fmt, quality=quality)
+    else:
+        image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+def _downscale(image, budget):
+    target = budget_size(image.size, budget)
+    return image.resize(target, Image.Resampling.BICUBIC, reducing_gap=2.0)
+
+def encode_pil_image(image, cache=None, budget=None):
+    """Encode a PIL image to a base64 payload in memory.
+
+    Images over the budget are downscaled and saved in the budget's format;
+    everything else is saved as PNG. When a cache is given, images with
+    identical content are only encoded once per budget.
+
+    Returns:
+        tuple: (payload, sent_size)
+    """
+    over_budget = is_over_budget(image.size, budget)
+    sent_size = sent_image_size(image.size, budget)
+
+    key = None
+    if cache is not None:
+        key = image_cache_key(image, budget)
+        payload = cache.get(key)
+        if payload is not None:
+            return payload, sent_size
+
+    if over_budget:
+        data = _save(_downscale(image, budget), budget.format, budget.quality)
+    else:
+        data = _save(image, "PNG")
+    payload = base64.b64encode(data).decode('utf-8')
+
+    if cache is not None:
+        cache.put(key, payload)
+    return payload, sent_size
+
+def fit_image_bytes(data, budget):
+    """Fit compressed image bytes into a resolution budget.
+
+    Only the image header is read to get the size. Images within the budget are
+    returned untouched; JPEGs over the budget are decoded in draft mode, which
+    lets libjpeg decode directly at a reduced scale before the final resize.
+
+    Returns:
+        tuple: (data, original_size, sent_size)
+    """
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    if not is_over_budget(original_size, budget):
+        return data, original_size, original_size
+
+    if image.format == "JPEG":
+        image.draft("RGB", budget_size(original_size, budget))
+    image = _downscale(image, budget)
+    return _save(image, budget.format, budget.quality), original_size, image.size
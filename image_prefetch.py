@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sophobench", "images")
+
+class DiskImageCache:
+    """Content-addressed on-disk cache for downloaded images.
+
+    Image bytes are stored under the SHA-256 of their content, and each URL maps
+    to its content hash through a small ref file, so identical images fetched
+    from different URLs are stored once. When the cache grows past `max_bytes`
+    the least recently used blobs are evicted.
+    """
+    DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.ref_dir = os.path.join(directory, "refs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.ref_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.current_bytes = sum(size for _, _, size in self._scan_blobs())
+
+    @staticmethod
+    def _url_key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.blob_dir, content_hash[:2], content_hash)
+
+    def _scan_blobs(self):
+        for root, _, files in os.walk(self.blob_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    @staticmethod
+    def _write_temp(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return tmp_path
+
+    @classmethod
+    def _write_atomic(cls, path, data):
+        os.replace(cls._write_temp(path, data), path)
+
+    def get(self, url):
+        """Return the cached bytes for `url`, or None on a miss.
+
+        A blob evicted while it is being read is a miss as well.
+        """
+        ref_path = os.path.join(self.ref_dir, self._url_key(url))
+        try:
+            with open(ref_path, 'r') as f:
+                blob_path = self._blob_path(f.read().strip())
+            with open(blob_path, 'rb') as f:
+                data = f.read()
+            os.utime(blob_path)  # mark as recently used for eviction
+        except FileNotFoundError:
+            return None
+        return data
+
+    def contains(self, url):
+        ref_path = os.path.join(self.ref_dir, self._url_key(url))
+        try:
+            with open(ref_path, 'r') as f:
+                return os.path.exists(self._blob_path(f.read().strip()))
+        except FileNotFoundError:
+            return False
+
+    def put(self, url, data):
+        content_hash = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        tmp_path = None
+        if not os.path.exists(blob_path):
+            tmp_path = self._write_temp(blob_path, data)
+
+        with self._lock:
+            # Only the put that creates the blob counts its bytes; a concurrent put of the same content drops its copy
+            if tmp_path is not None:
+                if os.path.exists(blob_path):
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, blob_path)
+                    self.current_bytes += len(data)
+            self._write_atomic(os.path.join(self.ref_dir, self._url_key(url)), content_hash.encode('utf-8'))
+            if self.current_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used blobs until the cache is at 90% of its budget.
+
+        Refs to evicted blobs are left behind and treated as misses.
+        """
+        target = int(self.max_bytes * 0.9)
+        for path, _, size in sorted(self._scan_blobs(), key=lambda entry: entry[1]):
+            if self.current_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self.current_bytes -= size
+            except FileNotFoundError:
+                pass
+        logger.info(f"Image cache evicted down to {self.current_bytes} bytes")
+
+class ImagePrefetcher:
+    """Downloads image URLs ahead of the model calls that need them.
+
+    Downloads run on a small thread pool over one pooled requests.Session and
+    land in a DiskImageCache. Pending downloads only hold a future, not the
+    image bytes, so prefetching a long run of rows keeps memory flat.
+    """
+    DEFAULT_WORKERS = 16
+    DEFAULT_TIMEOUT = 30
+
+    def __init__(self, cache=None, max_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+        self.cache = cache or DiskImageCache()
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        retries = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        self.cache.put(url, response.content)
+        return response.content
+
+    def _download(self, url):
+        if not self.cache.contains(url):
+            self._fetch(url)
+
+    def _forget(self, url):
+        with self._lock:
+            self._pending.pop(url, None)
+
+    def prefetch(self, urls):
+        """Start background downloads for any of `urls` that are not cached yet."""
+        submitted = 0
+        for url in urls:
+            if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+                continue
+            with self._lock:
+                if url in self._pending:
+                    continue
+                future = self._executor.submit(self._download, url)
+                self._pending[url] = future
+            future.add_done_callback(lambda _, url=url: self._forget(url))
+            submitted += 1
+        logger.debug(f"Prefetching {submitted} image URLs")
+
+    def get(self, url):
+        """Return the bytes for `url`, waiting for its prefetch or downloading it now."""
+        with self._lock:
+            future = self._pending.get(url)
+        if future is not None:
+            future.result()
+        data = self.cache.get(url)
+        if data is None:
+            # Not prefetched, failed, or evicted since; fetch it again
+            data = self._fetch(url)
+        return data
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def configure_image_prefetcher(cache_dir=None, max_bytes=None, max_workers=None):
+    """Replace the process-wide prefetcher with one using the given settings."""
+    global _prefetcher
+    cache = DiskImageCache(cache_dir or DEFAULT_CACHE_DIR, max_bytes or DiskImageCache.DEFAULT_MAX_BYTES)
+    with _prefetcher_lock:
+        if _prefetcher is not None:
+            _prefetcher.shutdown()
+        _prefetcher = ImagePrefetcher(cache, max_workers=max_workers or ImagePrefetcher.DEFAULT_WORKERS)
+    return _prefetcher
+
+def get_image_prefetcher():
+    """Return the process-wide image prefetcher, creating a default one on first use."""
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = ImagePrefetcher()
+    return _prefetcher
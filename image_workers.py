@@ -0,0 +1,156 @@
+import base64
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+from PIL import Image, ImageFile
+
+from image_encoding import encode_pil_image, fit_image_bytes, image_cache_key, is_over_budget, sent_image_size
+
+logger = logging.getLogger(__name__)
+
+def _to_shared_memory(payload):
+    """Copy a payload into a new shared memory block and return (name, size).
+
+    The block outlives this call; the receiving process unlinks it. The block is
+    unregistered from this process's resource tracker, which would otherwise
+    report it as leaked and unlink it a second time when the worker exits.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(1, len(payload)))
+    block.buf[:len(payload)] = payload
+    name = block.name
+    block.close()
+    if os.name == 'posix':
+        # SharedMemory.name drops the leading '/' of POSIX names, which the tracker registered
+        resource_tracker.unregister(f"/{name}", 'shared_memory')
+    return name, len(payload)
+
+def _from_shared_memory(name, size):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        block.unlink()
+
+def _encode_source_job(data, budget):
+    payload, sent_size = encode_pil_image(Image.open(io.BytesIO(data)), budget=budget)
+    return _to_shared_memory(payload.encode('ascii')), sent_size
+
+def _encode_pixels_job(pixels, mode, size, palette, info, budget):
+    image = Image.frombytes(mode, size, _from_shared_memory(*pixels))
+    if palette is not None:
+        image.putpalette(*palette)
+    image.info.update(info)
+    payload, sent_size = encode_pil_image(image, budget=budget)
+    return _to_shared_memory(payload.encode('ascii')), sent_size
+
+def _source_bytes(image):
+    """Compressed bytes of an image opened from a file that is still on disk, else None."""
+    path = getattr(image, 'filename', None)
+    if not isinstance(image, ImageFile.ImageFile) or not path or not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data
+
+def _encode_bytes_job(data, budget):
+    data, original_size, sent_size = fit_image_bytes(data, budget)
+    return _to_shared_memory(base64.b64encode(data)), original_size, sent_size
+
+def _warm_up():
+    return True
+
+class ImagePreprocessPool:
+    """Process pool for the CPU-bound part of preparing images: decode, resize, encode and base64.
+
+    Request threads or the event loop keep doing the I/O and submit image work
+    here, so pixel work runs on all cores instead of contending for the GIL.
+    A PIL image opened from a file is sent as that file's compressed bytes;
+    any other PIL image has its pixels copied into a shared memory block.
+    Encoded payloads come back through shared memory blocks too, so only
+    block names, image sizes and compressed bytes go through the pipes.
+
+    Workers are started from a forkserver (spawn where that is unavailable),
+    never forked from the caller, so locks held by the caller's threads, such
+    as those of the HTTP clients and the endpoint prober, are not copied into
+    them.
+    """
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        # Start the forkserver and a first worker now rather than on the first image
+        self._executor.submit(_warm_up).result()
+
+    def encode_pil_image(self, image, cache=None, budget=None):
+        """Same contract as image_encoding.encode_pil_image, with the encoding done in a worker process.
+
+        Images opened from a file are cached by the hash of the file's bytes,
+        which is far cheaper than hashing the decoded pixels.
+        """
+        data = _source_bytes(image)
+        key = None
+        if cache is not None:
+            if data is None:
+                key = image_cache_key(image, budget)
+            else:
+                key = f"src:{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+                if is_over_budget(image.size, budget):
+                    key = f"{key}:{budget.max_pixels}:{budget.format}:{budget.quality}"
+            payload = cache.get(key)
+            if payload is not None:
+                return payload, sent_image_size(image.size, budget)
+
+        if data is not None:
+            future = self._executor.submit(_encode_source_job, data, budget)
+        else:
+            palette = None
+            if image.palette is not None:
+                palette = (image.getpalette(image.palette.mode), image.palette.mode)
+            pixels = _to_shared_memory(image.tobytes())
+            future = self._executor.submit(_encode_pixels_job, pixels, image.mode, image.size, palette, dict(image.info), budget)
+        (name, size), sent_size = future.result()
+        payload = _from_shared_memory(name, size).decode('ascii')
+        if cache is not None:
+            cache.put(key, payload)
+        return payload, sent_size
+
+    def encode_bytes(self, data, budget):
+        """Fit compressed image bytes into a budget and base64 them in a worker process.
+
+        Returns:
+            tuple: (payload, original_size, sent_size)
+        """
+        (name, size), original_size, sent_size = self._executor.submit(_encode_bytes_job, data, budget).result()
+        return _from_shared_memory(name, size).decode('ascii'), original_size, sent_size
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+def configure_image_workers(max_workers):
+    """Start the process-wide image preprocessing pool; 0 or None keeps image work on the calling thread."""
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is not None:
+            if _image_pool.max_workers == max_workers:
+                return _image_pool
+            _image_pool.shutdown()
+            _image_pool = None
+        if max_workers:
+            _image_pool = ImagePreprocessPool(max_workers)
+            logger.info(f"Started {max_workers} image preprocessing processes")
+    return _image_pool
+
+def get_image_pool():
+    """Return the image preprocessing pool, or None when images are prepared inline."""
+    return _image_pool
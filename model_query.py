@@ -1,4 +1,3 @@
-import ollama
 import sys
 import threading
 import argparse
@@ -6,18 +5,62 @@ import logging
 import os
 import torch
 import base64
+import contextvars
+import hashlib
+import httpx
+import json
 import requests
+import time
 from queue import Queue
 from PIL import Image
-import uuid
+
+from image_encoding import encode_pil_image, fit_image_bytes, get_image_budget, get_image_cache, image_content_hash
+from image_prefetch import get_image_prefetcher
+from image_workers import get_image_pool
+from ollama_client import OUTCOME_ERROR, OUTCOME_OK, OUTCOME_TIMEOUT, get_endpoint_pool, get_inflight_limiter
+from response_cache import ResponseCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='query.log', filemode='w')
 
+class RequestCancelled(Exception):
+    """Raised inside a worker when its request was cancelled by a timeout."""
+
+# Per-question metrics dict, set by the caller and filled in while the request runs
+request_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+def record_request_metric(key, value):
+    """Store a metric for the current question, if the caller is collecting them."""
+    metrics = request_metrics.get()
+    if metrics is not None:
+        metrics[key] = value
+
+def record_generation_metrics(chunk):
+    """Store the token counts and server-side duration reported in the final chunk of a reply."""
+    record_request_metric('prompt_tokens', chunk.get('prompt_eval_count'))
+    record_request_metric('completion_tokens', chunk.get('eval_count'))
+    if chunk.get('total_duration') is not None:
+        record_request_metric('server_duration', chunk['total_duration'] / 1e9)
+
+def prompt_hash(model_input):
+    """Short hash of a question and its options, for matching prompts across runs."""
+    payload = json.dumps({
+        'question': model_input.get('question'),
+        'options': model_input.get('options')
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
 class ModelQuery:
     DEFAULT_TIMEOUT = 100
     DEFAULT_MODELS  = {'text': "llama3.2", 'vision': "llama3.2-vision"}
     VALID_INPUT_KEYS = {'question', 'options', 'images'}
+    TIMEOUT_ERROR = "Error: Request timed out."
+
+    _shared_models = {}
+    _shared_models_lock = threading.Lock()
+
+    # Optional persistent response cache, shared by every ModelQuery in the process
+    response_cache = None
 
     def __init__(self, models = DEFAULT_MODELS):
         # Validate model keys and use defaults for invalid keys
@@ -32,6 +75,9 @@ class ModelQuery:
 
         self.text_model   = validated_models['text']
         self.vision_model = validated_models['vision']
+
+        # Per-worker request state (cancel flag and deadline), set by execute_with_timeout
+        self._request_state = threading.local()
         
         # Validate models are available
         if not self._validate_models():
@@ -41,16 +87,57 @@ class ModelQuery:
             torch.cuda.empty_cache()
     
 
+    def endpoint_pool(self):
+        """The endpoint pool requests and model checks go through; the process-wide one by default."""
+        return get_endpoint_pool()
+
     def chat(self, model, messages):
+        """Send a chat request and return the reply text.
+
+        The request goes to the least loaded Ollama endpoint that has the model.
+        The reply is streamed so that a request cancelled by execute_with_timeout
+        stops between chunks. Leaving the stream early closes the connection,
+        which makes Ollama abort the generation and free the server slot.
+        """
+        cancel_event = getattr(self._request_state, 'cancel_event', None)
+        deadline = getattr(self._request_state, 'deadline', None)
+        read_timeout = None if deadline is None else max(deadline - time.monotonic(), 0.001)
+
+        payload = {'model': model, 'messages': messages, 'stream': True}
+        content = []
         try:
-            response = ollama.chat(model=model, messages=messages)
-            return response['message']['content'].strip()
+            with self.endpoint_pool().route(model) as endpoint, \
+                    endpoint.client.stream('POST', '/api/chat', json=payload, timeout=httpx.Timeout(read_timeout, connect=10.0)) as response:
+                if response.is_error:
+                    response.read()
+                    raise RuntimeError(f"Ollama at {endpoint.host} returned {response.status_code}: {response.text}")
+                for line in response.iter_lines():
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RequestCancelled("Request cancelled after timeout")
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if 'error' in chunk:
+                        raise RuntimeError(chunk['error'])
+                    content.append(chunk.get('message', {}).get('content', ''))
+                    if chunk.get('done'):
+                        record_generation_metrics(chunk)
+                        break
+            return ''.join(content).strip()
+        except RequestCancelled:
+            logging.info(f"Cancelled timed-out request to model {model}")
+            raise
         except Exception as e:
             logging.error(f"Exception occurred while interacting with the model: {e}")
             raise e
 
+    @staticmethod
+    def is_raw_image(image):
+        """Check for an undecoded HF image value, i.e. {'bytes': ..., 'path': ...}."""
+        return isinstance(image, dict) and ('bytes' in image or 'path' in image)
+
     def ensure_list(self, items):
-        if isinstance(items, str) or isinstance(items, Image.Image):
+        if isinstance(items, (str, bytes, Image.Image)) or self.is_raw_image(items):
             return [items]
         return items
 
@@ -78,7 +165,12 @@ class ModelQuery:
         
         valid_extensions = ['.jpg', '.jpeg', '.png']
         for image in images:
-            if isinstance(image, Image.Image):
+            if isinstance(image, (Image.Image, bytes)):
+                continue
+            if self.is_raw_image(image):
+                if not image.get('bytes') and not (image.get('path') and os.path.isfile(image['path'])):
+                    logging.error(f"Undecoded image has neither bytes nor a readable path: {image.get('path')}")
+                    return False
                 continue
             if not (os.path.isfile(image) or image.startswith(('http', 'https')) or isinstance(image, bytes)):
                 logging.error(f"Image file {image} does not exist")
@@ -96,9 +188,8 @@ class ModelQuery:
         """
         
         try:
-            # Check if models are installed in Ollama
-            models = ollama.list()
-            available_models = {model.model.replace(':latest', '') for model in models['models']}
+            # Check if models are installed in Ollama (cached process-wide)
+            available_models = self.endpoint_pool().available_models()
             
             if self.text_model not in available_models:
                 logging.error(f"Text model '{self.text_model}' not installed in Ollama")
@@ -126,12 +217,40 @@ class ModelQuery:
 
     def execute_with_timeout(self, target, args, timeout):
         resultQ = Queue()
-        thread = threading.Thread(target=target, args=(*args, resultQ))
+        cancel_event = threading.Event()
+
+        # Wait for a global in-flight slot before the deadline starts; the worker
+        # releases it when the request has actually finished
+        limiter = get_inflight_limiter()
+        limiter.acquire()
+        record_request_metric('concurrency_limit', limiter.limit)
+        started = time.monotonic()
+        deadline = started + timeout
+
+        def run_request():
+            self._request_state.cancel_event = cancel_event
+            self._request_state.deadline = deadline
+            outcome = OUTCOME_ERROR
+            try:
+                target(*args, resultQ)
+                # Report how the request ended, so an adaptive limit can follow the server
+                if cancel_event.is_set() or time.monotonic() >= deadline:
+                    outcome = OUTCOME_TIMEOUT
+                elif resultQ.queue and not str(resultQ.queue[0]).startswith("Error"):
+                    outcome = OUTCOME_OK
+            finally:
+                limiter.release(time.monotonic() - started, outcome)
+
+        # Run in a copy of the caller's context so the worker sees its request_metrics
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(run_request,), daemon=True)
         thread.start()
         thread.join(timeout=timeout)
 
         if thread.is_alive():
-            return "Error: Request timed out."
+            # Stop the worker at its next chunk; its read timeout is bounded by the same deadline
+            cancel_event.set()
+            return self.TIMEOUT_ERROR
         elif resultQ.empty():
             return "Error: No response received."
         return resultQ.get()
@@ -198,30 +317,60 @@ class ModelQuery:
         complete_question = f"{question}\n{options_text}\nPlease answer with one of the following: {', '.join([f'({chr(65 + i)})' for i in range(len(options))])}. Do not include any explanation or additional text, just respond with the letter."
         return complete_question
 
-    def encode_images(self, images):
+    def encode_images(self, images, model=None):
+        """Base64-encode images for a request to `model` (the vision model by default).
+
+        If the model has a resolution budget, images over it are downscaled and the
+        original and sent dimensions are recorded in the request metrics.
+        """
+        budget = get_image_budget(model or self.vision_model)
+        # Pixel work goes to the preprocessing processes when they are configured
+        pool = get_image_pool()
         encoded_images = []
+        image_sizes = []
         for image in images:
+            data = None
             if isinstance(image, bytes):
-                encoded_images.append(base64.b64encode(image).decode('utf-8'))
+                data = image
             elif isinstance(image, Image.Image):
-                temp_image_path = f"{uuid.uuid4().hex}.png"
-                with open(temp_image_path, "wb") as img_file:
-                    image.save(img_file, format="PNG")
-                with open(temp_image_path, "rb") as img_read:
-                    encoded_images.append(base64.b64encode(img_read.read()).decode('utf-8'))
-                os.remove(temp_image_path)
+                encode = encode_pil_image if pool is None else pool.encode_pil_image
+                payload, sent_size = encode(image, cache=get_image_cache(), budget=budget)
+                encoded_images.append(payload)
+                if budget is not None:
+                    image_sizes.append({'original': list(image.size), 'sent': list(sent_size)})
+                continue
+            elif self.is_raw_image(image):
+                # Original compressed bytes from the Arrow buffer, sent without a PIL round trip
+                if image.get('bytes'):
+                    data = image['bytes']
+                elif image.get('path') and os.path.isfile(image['path']):
+                    with open(image['path'], "rb") as img_file:
+                        data = img_file.read()
+                else:
+                    raise ValueError("Undecoded image has neither bytes nor a readable path.")
             elif os.path.isfile(image):
                 with open(image, "rb") as img_file:
-                    encoded_images.append(base64.b64encode(img_file.read()).decode('utf-8'))
+                    data = img_file.read()
             elif image.startswith(('http', 'https')):
                 try:
-                    response = requests.get(image)
-                    response.raise_for_status()
-                    encoded_images.append(base64.b64encode(response.content).decode('utf-8'))
+                    data = get_image_prefetcher().get(image)
                 except requests.RequestException as e:
                     raise ValueError(f"Failed to fetch image from URL {image}: {e}")
             else:
                 raise ValueError("Unsupported image format.")
+
+            if budget is not None and pool is not None:
+                payload, original_size, sent_size = pool.encode_bytes(data, budget)
+                image_sizes.append({'original': list(original_size), 'sent': list(sent_size)})
+                encoded_images.append(payload)
+                continue
+            if budget is not None:
+                data, original_size, sent_size = fit_image_bytes(data, budget)
+                image_sizes.append({'original': list(original_size), 'sent': list(sent_size)})
+            encoded_images.append(base64.b64encode(data).decode('utf-8'))
+
+        if image_sizes:
+            record_request_metric('image_sizes', image_sizes)
         return encoded_images
 
     def image_mcq_ollama(self, question, images, options, resultQ):
@@ -434,15 +583,115 @@ class ModelQuery:
         is_valid, error = self._validate_arguments(model_input, timeout)
         if not is_valid:
             return error
+        record_request_metric('prompt_hash', prompt_hash(model_input))
+
+        cache_entry = self.get_response_cache_key(model_input)
+        if cache_entry is not None:
+            cached = self.response_cache.get(cache_entry[1])
+            if cached is not None:
+                record_request_metric('cache_hit', True)
+                return cached
         
         if not model_input.get('images') or len(model_input.get('images', [])) == 0:
-            return self.get_text_response(model_input, timeout)
-        
-        return self.get_image_response(model_input, timeout)
+            response = self.get_text_response(model_input, timeout)
+        else:
+            response = self.get_image_response(model_input, timeout)
+
+        self.store_cached_response(cache_entry, response)
+        return response
+
+    @classmethod
+    def set_response_cache(cls, cache):
+        """Put a ResponseCache (or None to disable caching) in front of get_response."""
+        cls.response_cache = cache
+
+    def image_content_hashes(self, images):
+        """Hash the content of each image so cache keys do not depend on how images are passed."""
+        hashes = []
+        for image in self.ensure_list(images or []):
+            if isinstance(image, Image.Image):
+                hashes.append(image_content_hash(image))
+                continue
+            data = None
+            if isinstance(image, bytes):
+                data = image
+            elif self.is_raw_image(image):
+                data = image.get('bytes')
+                if not data and image.get('path') and os.path.isfile(image['path']):
+                    with open(image['path'], "rb") as img_file:
+                        data = img_file.read()
+            elif isinstance(image, str) and os.path.isfile(image):
+                with open(image, "rb") as img_file:
+                    data = img_file.read()
+            hashes.append(hashlib.sha256(data).hexdigest() if data else str(image))
+        return hashes
+
+    def get_response_cache_key(self, model_input):
+        """Return (model, key) for the response cache, or None when caching is disabled.
+
+        The key covers the model name and digest, the image budget, the fully
+        formatted prompt and the image content hashes.
+        """
+        if self.response_cache is None:
+            return None
+
+        question = model_input['question'].strip()
+        options = model_input.get('options') or []
+        images = model_input.get('images') or []
+        if images:
+            model = self.vision_model
+            prompt = self.format_image_mcq(question, images, options) if options else question
+        else:
+            model = self.text_model
+            prompt = self.format_text_mcq(question, options) if options else question
+
+        try:
+            digest = self.endpoint_pool().available_models().get(model, {}).get('digest')
+        except Exception as e:
+            logging.warning(f"Could not read model digest for cache key: {e}")
+            digest = None
+        budget = get_image_budget(model) if images else None
+        options_key = {'image_budget': budget._asdict() if budget else None}
+
+        key = ResponseCache.make_key(model, digest, options_key, prompt, self.image_content_hashes(images))
+        return model, key
+
+    def store_cached_response(self, cache_entry, response):
+        """Cache a model response; errors and timeouts are never cached."""
+        if cache_entry is None or not isinstance(response, str) or response.startswith("Error"):
+            return
+        model, key = cache_entry
+        try:
+            self.response_cache.put(key, model, response)
+        except Exception as e:
+            logging.warning(f"Failed to store response in cache: {e}")
+
+    @classmethod
+    def get_shared_model(cls, models):
+        """Return the process-wide model instance for a model configuration.
+
+        ModelQuery is thread-safe, so every handler and worker thread that asks
+        for the same text/vision models shares one instance and one client.
+
+        Args:
+            models: dict of model configurations
+
+        Returns:
+            ModelQuery instance or None if initialization fails
+        """
+        key = (models.get('text'), models.get('vision'))
+        with cls._shared_models_lock:
+            if key not in cls._shared_models:
+                try:
+                    cls._shared_models[key] = cls(models)
+                except Exception as e:
+                    logging.error(f"Failed to initialize model: {e}")
+                    return None
+            return cls._shared_models[key]
 
     @staticmethod
     def get_thread_model(local_thread, models):
-        """Static method to get or create a model instance for a thread.
+        """Static method to get the shared model instance for a thread.
         
         Args:
             local_thread: threading.local instance
@@ -451,9 +700,6 @@ class ModelQuery:
         Returns:
             ModelQuery instance or None if initialization fails
         """
-        if not hasattr(local_thread, 'model'):
-            try:
-                local_thread.model = ModelQuery(models)
-            except Exception as e:
-                return None
+        if getattr(local_thread, 'model', None) is None:
+            local_thread.model = ModelQuery.get_shared_model(models)
         return local_thread.model
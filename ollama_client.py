@@ -0,0 +1,521 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+MAX_CONNECTIONS = int(os.getenv('OLLAMA_MAX_CONNECTIONS', 64))
+KEEPALIVE_EXPIRY = 30.0
+MODEL_LIST_TTL = 60.0
+PROBE_INTERVAL = 10.0
+PROBE_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+# Requests in flight a warm endpoint may have beyond a cold one before the cold one loads the model
+COLD_START_PENALTY = 4
+# Seconds before an endpoint that cannot serve a request is probed again on demand
+REPROBE_INTERVAL = 1.0
+
+# Model requests in flight per Ollama server when no global limit is given; Ollama itself runs a few per model at once
+DEFAULT_INFLIGHT_PER_HOST = 8
+
+# Failures that mean the endpoint is unreachable, as opposed to a slow or failed generation
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# Outcome of a model request, as reported to the in-flight limiter
+OUTCOME_OK = "ok"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+
+class NoEndpointError(RuntimeError):
+    """No healthy endpoint has the requested model installed."""
+
+def normalize_host(host):
+    if not host.startswith(('http://', 'https://')):
+        host = f"http://{host}"
+    return host.rstrip('/')
+
+def get_ollama_host():
+    """Return the Ollama base URL from OLLAMA_HOST, defaulting to the local server."""
+    return normalize_host(os.getenv('OLLAMA_HOST') or DEFAULT_HOST)
+
+def get_ollama_hosts():
+    """Return the Ollama base URLs from OLLAMA_HOSTS (comma separated), falling back to OLLAMA_HOST."""
+    hosts = [host.strip() for host in os.getenv('OLLAMA_HOSTS', '').split(',') if host.strip()]
+    return [normalize_host(host) for host in hosts] or [get_ollama_host()]
+
+def model_key(name):
+    return name.replace(':latest', '')
+
+class OllamaEndpoint:
+    """One Ollama server: its pooled HTTP client, its health and the requests in flight to it.
+
+    The client is thread-safe and keeps keep-alive connections, so every
+    handler and worker thread reuses the same connections to this server.
+    """
+    def __init__(self, host):
+        self.host = host
+        limits = httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+        self.client = httpx.Client(base_url=host, limits=limits, timeout=httpx.Timeout(None, connect=10.0))
+        self.healthy = False
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+        # Installed models by name, from /api/tags, and the names of those loaded in memory, from /api/ps
+        self.models = {}
+        self.loaded = set()
+        self.checked_at = 0.0
+
+    def stats(self):
+        return {
+            'host': self.host,
+            'healthy': self.healthy,
+            'inflight': self.inflight,
+            'requests': self.requests,
+            'failures': self.failures,
+            'loaded': sorted(self.loaded)
+        }
+
+class EndpointPool:
+    """Routes model requests across one or more Ollama servers.
+
+    Every endpoint is probed on /api/tags, and on /api/ps for the models it has
+    in memory, when the pool is created and then every `probe_interval`
+    seconds from a background thread. A failed probe or a refused connection
+    ejects the endpoint, and the next successful probe re-admits it. With a
+    `probe_interval` of None there is no background thread; endpoints are
+    then probed again only when the model list is older than its TTL.
+
+    A request goes to the healthy endpoint with the fewest requests in flight
+    among those that have the model installed. An endpoint that would have to
+    load the model first counts COLD_START_PENALTY extra requests. When no
+    healthy endpoint has the model, the endpoints are probed again (at most
+    once per REPROBE_INTERVAL each) and NoEndpointError is raised if that
+    still finds none; requests never go to an endpoint without the model.
+    """
+    def __init__(self, hosts, probe_interval=PROBE_INTERVAL):
+        self.endpoints = [OllamaEndpoint(host) for host in hosts]
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.probe_all()
+        self._prober = None
+        if probe_interval is not None:
+            self._prober = threading.Thread(target=self._probe_loop, name="ollama-endpoint-probe", daemon=True)
+            self._prober.start()
+        logger.info(f"Routing model requests across {len(self.endpoints)} Ollama endpoints: {self.hosts}")
+
+    @property
+    def hosts(self):
+        return [endpoint.host for endpoint in self.endpoints]
+
+    def probe(self, endpoint):
+        try:
+            response = endpoint.client.get('/api/tags', timeout=PROBE_TIMEOUT)
+            response.raise_for_status()
+            models = {}
+            for model in response.json().get('models', []):
+                models[model_key(model.get('model') or model.get('name', ''))] = model
+            try:
+                response = endpoint.client.get('/api/ps', timeout=PROBE_TIMEOUT)
+                response.raise_for_status()
+                loaded = {model_key(model.get('model') or model.get('name', '')) for model in response.json().get('models', [])}
+            except Exception:
+                # Older servers have no /api/ps; treat every model as cold
+                loaded = set()
+        except Exception as e:
+            self.eject(endpoint, f"health probe failed: {e}")
+            return False
+
+        with self._lock:
+            if not endpoint.healthy and endpoint.failures:
+                logger.info(f"Re-admitted Ollama endpoint {endpoint.host}")
+            endpoint.healthy = True
+            endpoint.models = models
+            endpoint.loaded = loaded
+            endpoint.checked_at = time.monotonic()
+        return True
+
+    def probe_all(self):
+        for endpoint in self.endpoints:
+            self.probe(endpoint)
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            self.probe_all()
+
+    def eject(self, endpoint, reason):
+        with self._lock:
+            if endpoint.healthy:
+                logger.warning(f"Ejected Ollama endpoint {endpoint.host}: {reason}")
+            elif not endpoint.failures:
+                logger.warning(f"Ollama endpoint {endpoint.host} is unreachable: {reason}")
+            endpoint.healthy = False
+            endpoint.failures += 1
+            endpoint.checked_at = time.monotonic()
+
+    def _candidates_locked(self, model):
+        return [endpoint for endpoint in self.endpoints if endpoint.healthy and model in endpoint.models]
+
+    def acquire(self, model):
+        """Pick the endpoint for a request to `model` and count the request against it.
+
+        Raises NoEndpointError when no healthy endpoint has the model installed.
+        """
+        model = model_key(model)
+        with self._lock:
+            candidates = self._candidates_locked(model)
+        if not candidates:
+            # Ejected endpoints may be back and the model may have been pulled since the last probe
+            now = time.monotonic()
+            for endpoint in self.endpoints:
+                if now - endpoint.checked_at > REPROBE_INTERVAL:
+                    self.probe(endpoint)
+        with self._lock:
+            candidates = self._candidates_locked(model)
+            if not candidates:
+                raise NoEndpointError(f"No healthy Ollama endpoint serves {model} (endpoints: {', '.join(self.hosts)})")
+            endpoint = min(candidates, key=lambda e: e.inflight + (0 if model in e.loaded else COLD_START_PENALTY))
+            # The request loads the model, so later requests can treat the endpoint as warm
+            endpoint.loaded.add(model)
+            endpoint.inflight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint):
+        with self._lock:
+            endpoint.inflight -= 1
+
+    @contextmanager
+    def route(self, model):
+        """Hold an endpoint for one request; an endpoint that refuses the connection is ejected."""
+        endpoint = self.acquire(model)
+        try:
+            yield endpoint
+        except CONNECT_ERRORS as e:
+            self.eject(endpoint, str(e))
+            raise
+        finally:
+            self.release(endpoint)
+
+    def available_models(self, max_age=MODEL_LIST_TTL):
+        """Models installed on any healthy endpoint, keyed by name without ':latest'.
+
+        Endpoints probed more than `max_age` seconds ago are probed again first.
+        """
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if now - endpoint.checked_at > max_age:
+                self.probe(endpoint)
+        models = {}
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.healthy:
+                    for name, model in endpoint.models.items():
+                        models.setdefault(name, model)
+        return models
+
+    def stats(self):
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self):
+        self._stop.set()
+        if self._prober is not None:
+            self._prober.join()
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+_endpoint_pool = None
+_endpoint_pool_lock = threading.Lock()
+
+def configure_ollama_hosts(hosts):
+    """Route model requests across `hosts`; None or empty uses OLLAMA_HOSTS or OLLAMA_HOST.
+
+    Calling it again with the same hosts keeps the current pool.
+    """
+    global _endpoint_pool
+    hosts = [normalize_host(host) for host in hosts] if hosts else get_ollama_hosts()
+    with _endpoint_pool_lock:
+        if _endpoint_pool is not None:
+            if _endpoint_pool.hosts == hosts:
+                return _endpoint_pool
+            _endpoint_pool.close()
+        _endpoint_pool = EndpointPool(hosts)
+        return _endpoint_pool
+
+def get_endpoint_pool():
+    """Return the process-wide pool of Ollama endpoints, created from the environment on first use."""
+    if _endpoint_pool is None:
+        configure_ollama_hosts(None)
+    return _endpoint_pool
+
+def get_endpoint_stats():
+    """Per-endpoint health and request counts, or None if no request was routed yet."""
+    return None if _endpoint_pool is None else _endpoint_pool.stats()
+
+def get_available_models(ttl=MODEL_LIST_TTL):
+    """Return the models installed on any healthy endpoint, keyed by name without ':latest'.
+
+    Endpoints are probed at most once per `ttl` seconds by callers, besides the
+    pool's background probes, and the result is shared by every caller in the
+    process.
+    """
+    return get_endpoint_pool().available_models(max_age=ttl)
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+class InflightLimiter:
+    """Process-wide cap on model requests in flight, shared by every handler.
+
+    Thread-based callers block in acquire(); asyncio callers wait in
+    acquire_async() on a future of their own event loop, which release() wakes
+    with call_soon_threadsafe, so waiting coroutines cost nothing until a slot
+    frees up. A limit of None means unlimited.
+    """
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.inflight = 0
+        self._condition = threading.Condition()
+        # (event loop, future) of every waiting coroutine, oldest first
+        self._async_waiters = deque()
+
+    def _has_slot_locked(self):
+        return self.limit is None or self.inflight < self.limit
+
+    def try_acquire(self):
+        with self._condition:
+            if not self._has_slot_locked():
+                return False
+            self.inflight += 1
+            return True
+
+    def acquire(self):
+        with self._condition:
+            while not self._has_slot_locked():
+                self._condition.wait()
+            self.inflight += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._has_slot_locked():
+                    self.inflight += 1
+                    return
+                entry = (loop, loop.create_future())
+                self._async_waiters.append(entry)
+            try:
+                await entry[1]
+            except asyncio.CancelledError:
+                with self._condition:
+                    try:
+                        self._async_waiters.remove(entry)
+                    except ValueError:
+                        # Already woken; pass the wakeup on to the next waiter
+                        self._wake_locked(1)
+                raise
+
+    def _wake_locked(self, count=None):
+        """Wake up to `count` waiting threads and coroutines; None wakes every one."""
+        if count is None:
+            self._condition.notify_all()
+        else:
+            self._condition.notify(count)
+        woken = 0
+        while self._async_waiters and (count is None or woken < count):
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError:
+                # The waiter's event loop is already closed
+                continue
+            woken += 1
+
+    def release(self, latency=None, outcome=None):
+        """Free a slot. `latency` (seconds) and `outcome` describe the finished request; a fixed limit ignores them."""
+        with self._condition:
+            self.inflight -= 1
+            self._wake_locked(1)
+
+    def set_limit(self, limit):
+        with self._condition:
+            self.limit = limit
+            self._wake_locked()
+
+    def stats(self):
+        with self._condition:
+            return {'limit': self.limit, 'inflight': self.inflight}
+
+class AdaptiveInflightLimiter(InflightLimiter):
+    """In-flight limit that follows what the server can handle, by additive increase and multiplicative decrease.
+
+    Every finished request reports its latency and outcome to release(). The
+    baseline is the lowest short-run average latency seen, drifting slowly
+    toward the long-run average so it can follow a change of workload. While
+    the limiter is full and the short-run average stays within `tolerance`
+    times the baseline, the limit grows by about one per limit's worth of
+    requests. A timeout, or a short-run average above that band, multiplies
+    the limit by `backoff`. After a decrease, further decreases wait one
+    average latency, so the requests admitted under the old limit only count
+    once.
+
+    set_limit() sets a hard cap, such as --max_inflight_requests, that the
+    limit never grows past; the limit adapts between `min_limit` and the lower
+    of `max_limit` and the cap.
+    """
+    SHORT_WINDOW = 10
+    LONG_WINDOW = 200
+    # Seconds for the baseline to move most of the way to the long-run average
+    BASELINE_DRIFT_SECONDS = 300.0
+
+    def __init__(self, max_limit, min_limit=1, initial=None, backoff=0.5, tolerance=2.0, cap=None):
+        super().__init__(initial or min_limit)
+        self.min_limit = min_limit
+        self.configured_max = max_limit
+        self.max_limit = max_limit
+        self.cap = None
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.increases = 0
+        self.decreases = 0
+        # Fractional limit; the enforced limit is its integer part
+        self._window = float(self.limit)
+        self._short_latency = None
+        self._short_samples = 0
+        self._long_latency = None
+        self._baseline = None
+        self._baseline_at = time.monotonic()
+        self._cooldown_until = 0.0
+        if cap is not None:
+            self.set_limit(cap)
+
+    def release(self, latency=None, outcome=None):
+        with self._condition:
+            saturated = self.inflight >= self.limit
+            self.inflight -= 1
+            if outcome == OUTCOME_TIMEOUT:
+                self._decrease("timeout")
+            elif outcome == OUTCOME_OK and latency is not None:
+                self._observe(latency, saturated)
+            self._wake_locked(max(1, self.limit - self.inflight))
+
+    @staticmethod
+    def _ewma(average, value, window):
+        return value if average is None else average + (value - average) * 2 / (window + 1)
+
+    def _observe(self, latency, saturated):
+        self._short_latency = self._ewma(self._short_latency, latency, self.SHORT_WINDOW)
+        self._short_samples += 1
+        self._long_latency = self._ewma(self._long_latency, latency, self.LONG_WINDOW)
+        now = time.monotonic()
+        if self._baseline is None or self._short_latency < self._baseline:
+            self._baseline = self._short_latency
+        else:
+            drift = min(1.0, (now - self._baseline_at) / self.BASELINE_DRIFT_SECONDS)
+            self._baseline += (self._long_latency - self._baseline) * drift
+        self._baseline_at = now
+        if self._short_samples >= self.SHORT_WINDOW and self._short_latency > self.tolerance * self._baseline:
+            self._decrease("latency spike")
+        elif saturated and self._window < self.max_limit:
+            # Only grow while the limit is what holds requests back
+            self._window = min(self.max_limit, self._window + 1 / self._window)
+            if int(self._window) > self.limit:
+                self.limit = int(self._window)
+                self.increases += 1
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        if now < self._cooldown_until:
+            return
+        self._window = max(self.min_limit, self._window * self.backoff)
+        self.limit = int(self._window)
+        self.decreases += 1
+        self._cooldown_until = now + (self._short_latency or 0.0)
+        # The short-run average restarts, so one spike is not counted again after the cooldown
+        self._short_latency = None
+        self._short_samples = 0
+        logger.info(f"Adaptive in-flight limit lowered to {self.limit} after a {reason}")
+
+    def set_limit(self, limit):
+        """Cap the adaptive limit at `limit`; None removes the cap."""
+        with self._condition:
+            self.cap = limit
+            self.max_limit = self.configured_max if limit is None else max(self.min_limit, min(self.configured_max, limit))
+            self._window = min(self._window, float(self.max_limit))
+            self.limit = int(self._window)
+            self._wake_locked()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'inflight': self.inflight,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'cap': self.cap,
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'short_latency': self._short_latency,
+                'baseline_latency': self._baseline
+            }
+
+_inflight_limiter = InflightLimiter()
+
+def get_inflight_limiter():
+    """Return the process-wide limiter on in-flight model requests."""
+    return _inflight_limiter
+
+def set_max_inflight_requests(limit):
+    """Set the global limit on in-flight model requests; None removes it.
+
+    With an adaptive limit, this is a hard cap the adaptive limit stays under.
+    """
+    _inflight_limiter.set_limit(limit)
+    logger.info(f"Global in-flight request limit: {limit}")
+
+def configure_inflight_limit(max_requests=None, adaptive_max=None, hosts=None):
+    """Install the global in-flight limit of an in-process run.
+
+    With `adaptive_max`, the limit adapts up to it and `max_requests`, if
+    given, caps it. Without either, the limit defaults to
+    DEFAULT_INFLIGHT_PER_HOST requests per Ollama server in `hosts` (by
+    default OLLAMA_HOSTS or OLLAMA_HOST), so handlers running side by side
+    cannot flood the servers. A `max_requests` of 0 removes the limit.
+    """
+    if adaptive_max:
+        set_adaptive_inflight_limit(adaptive_max)
+    elif max_requests is None:
+        max_requests = DEFAULT_INFLIGHT_PER_HOST * len(hosts or get_ollama_hosts())
+    if max_requests is not None:
+        set_max_inflight_requests(max_requests or None)
+
+def set_adaptive_inflight_limit(max_limit, min_limit=1, initial=None):
+    """Make the global in-flight limit adapt to latency and timeouts, between `min_limit` and `max_limit`.
+
+    Calling it again with the same bounds keeps the limit learned so far. A
+    limit set earlier with set_max_inflight_requests stays in force as a cap.
+    Requests already holding a slot release it on the limiter they acquired.
+    """
+    global _inflight_limiter
+    current = _inflight_limiter
+    if isinstance(current, AdaptiveInflightLimiter):
+        if (current.min_limit, current.configured_max) == (min_limit, max_limit):
+            return current
+        cap = current.cap
+    else:
+        cap = current.limit
+    _inflight_limiter = AdaptiveInflightLimiter(max_limit, min_limit=min_limit, initial=initial, cap=cap)
+    logger.info(f"Adaptive in-flight request limit between {min_limit} and {max_limit}")
+    return _inflight_limiter
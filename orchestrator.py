@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+import argparse
+import importlib.util
+import inspect
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from dataset_handler import DatasetHandler
+from image_workers import configure_image_workers
+from ollama_client import configure_inflight_limit, configure_ollama_hosts
+from task_list import Tasks
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Dataset scripts per benchmark category, relative to the project root
+CATEGORIES = {
+    "L-MCQ": ("LLM/MCQ", [
+        "ai2arc.py",
+        "bigbenchhard.py",
+        "medical_meadow_medqa.py",
+        "medmcqa.py",
+        "medqa.py",
+        "medqa_usmle_4_options.py",
+        "mmlu_pro.py",
+        "mmlu.py",
+        "sciq.py",
+        "winogrande.py"
+    ]),
+    "L-OEQ": ("LLM/OEQ", [
+        "gpqa.py",
+        "gsm8k.py",
+        "gsmplus.py",
+        "imo_geometry.py",
+        "mathqa.py",
+        "medical_meadow_flashcards.py",
+        "medical_meadow_wikidoc_patient.py",
+        "medicalquestions.py",
+        "medicationqa.py",
+        "medqna_version3.py",
+        "medquad.py",
+        "metamathqa.py",
+        "metamathqa40k.py",
+        "scibench.py",
+        "simpleqa.py",
+        "truthfulqa.py"
+    ]),
+    "V-MCQ": ("VLM/MCQ", [
+        "ai2d.py",
+        "blink.py",
+        "cauldron.py",
+        "mathv360k.py",
+        "mmmu.py",
+        "nejm.py",
+        "scienceqa.py",
+        "worldmedqa.py"
+    ]),
+    "V-OEQ": ("VLM/OEQ", [
+        "animals.py",
+        "camaou.py",
+        "captcha.py",
+        "kvasirvqa.py",
+        "mathvision.py",
+        "mathvista.py",
+        "medtrinity25m.py",
+        "olympiadbench.py",
+        "olympicarena.py",
+        "pd12m.py",
+        "realworldqa.py",
+        "rocoradiology.py",
+        "slake.py",
+        "theoremqa.py",
+        "visitbench.py",
+        "vlmsareblind.py",
+        "vqarad.py"
+    ])
+}
+
+def load_handler_class(script_path):
+    """Import a dataset script in-process and return its DatasetHandler subclass.
+
+    Scripts are imported under a name derived from their path, so scripts with
+    the same file name in different categories do not collide.
+    """
+    script_path = os.path.abspath(script_path)
+    script_dir = os.path.dirname(script_path)
+    relative = os.path.relpath(script_path, PROJECT_ROOT)
+    module_name = "sopho_" + os.path.splitext(relative)[0].replace(os.sep, "_").lower()
+
+    module = sys.modules.get(module_name)
+    if module is None:
+        # Dataset scripts import the global_setting module that sits next to them
+        if script_dir not in sys.path:
+            sys.path.insert(0, script_dir)
+        spec = importlib.util.spec_from_file_location(module_name, script_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+
+    for _, obj in inspect.getmembers(module, inspect.isclass):
+        if issubclass(obj, DatasetHandler) and obj is not DatasetHandler and obj.__module__ == module_name:
+            return obj
+    raise ImportError(f"No DatasetHandler subclass found in {script_path}")
+
+def get_category_scripts(categories):
+    """Return the absolute paths of the dataset scripts in the given categories."""
+    scripts = []
+    for category in categories:
+        directory, names = CATEGORIES[category]
+        scripts.extend(os.path.join(PROJECT_ROOT, directory, name) for name in names)
+    return scripts
+
+def run_handler(script_path, task, models, sys_config, nsamples=None):
+    """Load and run one dataset script in the current process.
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    script = os.path.basename(script_path)
+    try:
+        handler_class = load_handler_class(script_path)
+        logger.info(f"Starting {script} ({handler_class.__name__})")
+        start_time = time.time()
+
+        handler = handler_class(task=task, models=models, sys_config=dict(sys_config))
+        handler.run(nsamples=nsamples)
+
+        logger.info(f"✓ Completed {script} in {time.time() - start_time:.2f} seconds")
+        return True
+    except BaseException as e:
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        logger.error(f"✗ Failed to run {script}: {e}")
+        logger.exception(e)
+        return False
+
+def run_scripts(script_paths, task=Tasks.GENERATE_ANSWERS, models=None, sys_config=None, nsamples=None,
+                parallel=False, max_parallel_datasets=None, max_inflight_requests=None):
+    """Run dataset scripts in-process, sharing one model client and one request budget.
+
+    Every handler uses the same pooled Ollama client and model instance.
+    `max_inflight_requests` bounds the model requests in flight across all
+    datasets together, so running datasets in parallel no longer multiplies
+    the load on the server. It defaults to DEFAULT_INFLIGHT_PER_HOST per
+    Ollama server unless the limit is adaptive; 0 removes it.
+
+    Returns:
+        tuple: (successful, failed) counts
+    """
+    models = models or {'text': "llama3.2", 'vision': "llama3.2-vision"}
+    sys_config = sys_config or {}
+    if sys_config.get('image_workers'):
+        # The workers come from a forkserver, so they never inherit the Ollama clients or prober thread
+        configure_image_workers(sys_config['image_workers'])
+    if sys_config.get('ollama_hosts'):
+        configure_ollama_hosts(sys_config['ollama_hosts'])
+    configure_inflight_limit(max_inflight_requests, sys_config.get('adaptive_inflight'), sys_config.get('ollama_hosts'))
+
+    start_time = time.time()
+    successful = 0
+    failed = 0
+    logger.info(f"Starting to process {len(script_paths)} datasets in-process...")
+
+    if parallel:
+        with ThreadPoolExecutor(max_workers=max_parallel_datasets or len(script_paths) or 1) as executor:
+            futures = {
+                executor.submit(run_handler, path, task, models, sys_config, nsamples): path
+                for path in script_paths
+            }
+            for future in as_completed(futures):
+                if future.result():
+                    successful += 1
+                else:
+                    failed += 1
+    else:
+        for i, path in enumerate(script_paths, 1):
+            logger.info(f"[{i}/{len(script_paths)}] Processing dataset...")
+            if run_handler(path, task, models, sys_config, nsamples):
+                successful += 1
+            else:
+                failed += 1
+
+    logger.info("Execution Summary:")
+    logger.info(f"Total time: {time.time() - start_time:.2f} seconds")
+    logger.info(f"Successful: {successful}")
+    logger.info(f"Failed: {failed}")
+    return successful, failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Run SophoBench datasets in a single process')
+    parser.add_argument('--categories', nargs='+', choices=list(CATEGORIES), default=list(CATEGORIES),
+                        help='Benchmark categories to run (default: all)')
+    parser.add_argument('--parallel', action='store_true',
+                        help='Run datasets concurrently')
+    parser.add_argument('--max_parallel_datasets', type=int, default=None,
+                        help='Maximum number of datasets running at once with --parallel')
+    parser.add_argument('--max_inflight_requests', type=int, default=None,
+                        help='Global limit on model requests in flight across all datasets (default: 8 per Ollama server, 0 for none); '
+                             'with --adaptive_inflight, a hard cap on the adaptive limit')
+    parser.add_argument('--ollama_hosts', nargs='+', default=None,
+                        help='Ollama servers to spread model requests across (default: OLLAMA_HOSTS or OLLAMA_HOST)')
+    parser.add_argument('--adaptive_inflight', type=int, default=None, metavar='MAX',
+                        help='Adapt the global number of model requests in flight, up to MAX, to latency and timeouts')
+    parser.add_argument('-n', '--sample-size', type=int,
+                        help='Sample size for each dataset')
+    parser.add_argument('--text_model', type=str, default="llama3.2",
+                        help='Name of the text model to use for processing.')
+    parser.add_argument('--vision_model', type=str, default="llama3.2-vision",
+                        help='Name of the vision model to use for processing.')
+    parser.add_argument('-t', '--max_threads', type=int, default=None,
+                        help='Maximum number of worker threads per dataset.')
+    parser.add_argument('--backend', type=str, default="thread", choices=["thread", "async"],
+                        help='Execution backend for each dataset.')
+    parser.add_argument('--image_workers', type=int, default=None,
+                        help='Processes used to decode, resize and encode images for all datasets.')
+    parser.add_argument('-task', type=str, default=Tasks.GENERATE_ANSWERS, choices=list(Tasks.VALID_TASKS),
+                        help='Specify the task to run (default: generate_answers).')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.FileHandler('orchestrator.log'), logging.StreamHandler(sys.stdout)],
+        force=True
+    )
+
+    models = {'text': args.text_model, 'vision': args.vision_model}
+    sys_config = {'max_threads': args.max_threads, 'backend': args.backend, 'image_workers': args.image_workers,
+                  'adaptive_inflight': args.adaptive_inflight, 'ollama_hosts': args.ollama_hosts}
+
+    logger.info(f"Starting in-process run at {datetime.now()}")
+    run_scripts(
+        get_category_scripts(args.categories),
+        task=args.task,
+        models=models,
+        sys_config=sys_config,
+        nsamples=args.sample_size,
+        parallel=args.parallel,
+        max_parallel_datasets=args.max_parallel_datasets,
+        max_inflight_requests=args.max_inflight_requests
+    )
+    logger.info(f"Completed in-process run at {datetime.now()}")
+
+if __name__ == "__main__":
+    main()
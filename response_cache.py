@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Persistent cache of model responses backed by SQLite in WAL mode.
+
+    Entries are keyed by a hash of everything that determines a response: the
+    model name and digest, generation options, the fully formatted prompt and
+    the content hashes of the images. Each thread gets its own connection, and
+    WAL mode lets readers proceed while another thread writes.
+    """
+    EVICT_EVERY = 1000
+
+    def __init__(self, path, max_entries=None, max_age_days=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = None if max_age_days is None else max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        conn.commit()
+        self.evict()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model, model_digest, options, prompt, image_hashes):
+        payload = json.dumps({
+            'model': model,
+            'digest': model_digest,
+            'options': options,
+            'prompt': prompt,
+            'images': list(image_hashes)
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, model, response, now, now)
+        )
+        conn.commit()
+        with self._stats_lock:
+            self._puts += 1
+            evict_now = self._puts % self.EVICT_EVERY == 0
+        if evict_now:
+            self.evict()
+
+    def evict(self):
+        """Drop entries older than max_age, then the least recently used beyond max_entries."""
+        conn = self._connection()
+        removed = 0
+        if self.max_age is not None:
+            removed += conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,)).rowcount
+        if self.max_entries is not None:
+            removed += conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+        conn.commit()
+        if removed:
+            logger.info(f"Response cache evicted {removed} entries")
+
+    def stats(self):
+        entries = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from sharding import shard_tag
+
+logger = logging.getLogger(__name__)
+
+RESULT_SCHEMA = pa.schema([
+    ('dataset', pa.string()),
+    ('subject', pa.string()),
+    ('split', pa.string()),
+    ('qid', pa.int64()),
+    ('model', pa.string()),
+    ('answer', pa.string()),
+    ('status', pa.string()),
+    ('latency', pa.float64()),
+    ('server_duration', pa.float64()),
+    ('prompt_tokens', pa.int64()),
+    ('completion_tokens', pa.int64()),
+    ('prompt_hash', pa.string()),
+    ('concurrency_limit', pa.int64()),
+    ('timestamp', pa.timestamp('ms', tz='UTC'))
+])
+
+# Schema metadata key of the run description: shard, seed, sample size and planned questions per subset
+RUN_METADATA_KEY = b'sophobench'
+
+# Status of an answer, derived from the answer text and the request metrics
+STATUS_OK = "ok"
+STATUS_CACHED = "cached"
+STATUS_TIMEOUT = "timeout"
+STATUS_ERROR = "error"
+
+TIMEOUT_ANSWER = "Error: Request timed out."
+ERROR_PREFIXES = ("Error", "Failed to extract data", "Invalid model selection", "Unknown task")
+
+def get_results_store_path(bench_name, model_name, shard=None):
+    """Location of the Parquet results file of a benchmark run, or of one shard of it."""
+    bench_name = bench_name.split('/')[-1].lower()
+    return os.path.join('results', f'{bench_name}_result_{model_name}{shard_tag(shard)}.parquet')
+
+def answer_status(answer, metrics=None):
+    if answer == TIMEOUT_ANSWER:
+        return STATUS_TIMEOUT
+    if not isinstance(answer, str) or answer.startswith(ERROR_PREFIXES):
+        return STATUS_ERROR
+    if metrics and metrics.get('cache_hit'):
+        return STATUS_CACHED
+    return STATUS_OK
+
+def is_failed_answer(answer):
+    """Whether a model answer is an error or a timeout; exported questions (dicts) never are."""
+    return isinstance(answer, str) and answer_status(answer) in (STATUS_ERROR, STATUS_TIMEOUT)
+
+class ResultsWriter:
+    """Write one row per answered question to a zstd-compressed Parquet file.
+
+    Rows are buffered and written as row groups of `batch_size` rows. The file
+    is written under a temporary name and moved into place on close. A run
+    that fails calls discard() instead, which deletes the temporary file, so
+    readers never see a partial file. `metadata` describes the run and is
+    stored in the file's schema metadata.
+    """
+    def __init__(self, path, dataset, model, metadata=None, batch_size=1024, compression='zstd'):
+        self.path = path
+        self.dataset = dataset
+        self.model = model
+        self.batch_size = batch_size
+        self.rows = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._tmp_path = f"{path}.tmp"
+        schema = RESULT_SCHEMA
+        if metadata is not None:
+            schema = schema.with_metadata({RUN_METADATA_KEY: json.dumps(metadata, default=str)})
+        self._writer = pq.ParquetWriter(self._tmp_path, schema, compression=compression)
+
+    def append(self, subject, split, qid, answer, metrics=None):
+        metrics = metrics or {}
+        record = {
+            'dataset': self.dataset,
+            'subject': subject,
+            'split': split,
+            'qid': qid,
+            'model': self.model,
+            'answer': answer if isinstance(answer, str) else None,
+            'status': answer_status(answer, metrics),
+            'latency': metrics.get('latency'),
+            'server_duration': metrics.get('server_duration'),
+            'prompt_tokens': metrics.get('prompt_tokens'),
+            'completion_tokens': metrics.get('completion_tokens'),
+            'prompt_hash': metrics.get('prompt_hash'),
+            'concurrency_limit': metrics.get('concurrency_limit'),
+            'timestamp': datetime.fromtimestamp(metrics.get('finished_at', time.time()), tz=timezone.utc)
+        }
+        with self._lock:
+            self._buffer.append(record)
+            self.rows += 1
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def write_table(self, table):
+        """Write rows that are already in RESULT_SCHEMA, e.g. when merging result files."""
+        with self._lock:
+            self._flush_locked()
+            self._writer.write_table(table)
+            self.rows += table.num_rows
+
+    def _flush_locked(self):
+        if self._buffer:
+            self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=RESULT_SCHEMA))
+            self._buffer = []
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._writer.close()
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"Results for {self.rows} questions saved to {self.path}")
+
+    def discard(self):
+        """Close the writer and delete the partial file, leaving any earlier results in place."""
+        with self._lock:
+            self._buffer = []
+            self._writer.close()
+        os.remove(self._tmp_path)
+        logger.info(f"Discarded partial results for {self.rows} questions; {self.path} was not updated")
+
+def read_run_metadata(path):
+    """Return the run description stored in a results file, or None."""
+    metadata = pq.read_schema(path).metadata or {}
+    if RUN_METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[RUN_METADATA_KEY])
+
+def open_results(source='results'):
+    """Open Parquet results as one Arrow dataset, for column scans across many runs.
+
+    `source` can be a directory, a file, or a list of files.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        source = sorted(
+            os.path.join(source, name) for name in os.listdir(source) if name.endswith('.parquet')
+        )
+    return ds.dataset(source, format='parquet', schema=RESULT_SCHEMA)
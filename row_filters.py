@@ -0,0 +1,67 @@
+import logging
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+logger = logging.getLogger(__name__)
+
+# Row filters are declared on handlers as (column, op) or (column, op, value) tuples
+VALID_OPS = frozenset({'==', '!=', 'in', 'not_null'})
+
+def _unpack(row_filter):
+    column, op = row_filter[0], row_filter[1]
+    value = row_filter[2] if len(row_filter) > 2 else None
+    if op not in VALID_OPS:
+        raise ValueError(f"Unknown row filter operator {op!r} for column {column}")
+    return column, op, value
+
+def _column_mask(array, op, value):
+    if op == '==':
+        mask = pc.equal(array, value)
+    elif op == '!=':
+        mask = pc.not_equal(array, value)
+    elif op == 'in':
+        mask = pc.is_in(array, value_set=pa.array(list(value)))
+    else:
+        return pc.is_valid(array)
+    # Comparisons against null are null; null never passes a filter
+    return pc.fill_null(mask, False)
+
+def eligible_indices(dataset, row_filters):
+    """Return the indices of the rows that pass every filter, or None if there are no filters.
+
+    The filter columns are read as Arrow arrays and compared with Arrow compute
+    kernels. No row is built, and no image is decoded. Filters on columns that
+    the split does not have are skipped.
+    """
+    row_filters = [_unpack(row_filter) for row_filter in row_filters or ()]
+    row_filters = [row_filter for row_filter in row_filters if row_filter[0] in dataset.column_names]
+    if not row_filters:
+        return None
+
+    arrow_dataset = dataset.with_format('arrow')
+    mask = None
+    for column, op, value in row_filters:
+        column_mask = _column_mask(arrow_dataset[column], op, value)
+        mask = column_mask if mask is None else pc.and_(mask, column_mask)
+    indices = np.flatnonzero(mask.to_numpy(zero_copy_only=False)).tolist()
+    logger.info(f"Row filters kept {len(indices)} of {dataset.num_rows} rows")
+    return indices
+
+def row_matches(row, row_filters):
+    """Check a single row against the filters, for datasets that can only be read row by row."""
+    for row_filter in row_filters or ():
+        column, op, value = _unpack(row_filter)
+        if column not in row:
+            continue
+        cell = row[column]
+        if cell is None:
+            return False
+        if op == '==' and cell != value:
+            return False
+        if op == '!=' and cell == value:
+            return False
+        if op == 'in' and cell not in value:
+            return False
+    return True
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+from tabulate import tabulate
+
+from eval_pack import EvalPack
+from orchestrator import load_handler_class
+from results_store import STATUS_CACHED, STATUS_ERROR, STATUS_OK, STATUS_TIMEOUT, open_results
+from task_list import Tasks
+
+logger = logging.getLogger(__name__)
+
+GOLD_SCHEMA = pa.schema([
+    ('subject', pa.string()),
+    ('split', pa.string()),
+    ('qid', pa.int64()),
+    ('gold', pa.string())
+])
+
+KEYS = ['subject', 'split', 'qid']
+
+# Multiple-choice answers are a single option letter; anything else from an MCQ question is invalid
+MCQ_ANSWER_PATTERN = r'^[A-Z]$'
+OPTION_LETTERS = pa.array([chr(ord('A') + i) for i in range(26)], pa.string())
+
+def index_gold_to_letters(gold, num_options):
+    """Turn 0-based integer gold answers of questions with options into option letters.
+
+    Some datasets, e.g. cais/mmlu, give the index of the correct option where
+    the model answers with its letter. Gold answers of questions without
+    options, and indices past the last option, are kept as they are.
+    """
+    is_index = pc.and_(pc.match_substring_regex(gold, r'^\s*\d+\s*$'), pc.greater(num_options, 0))
+    index = pc.cast(pc.utf8_trim_whitespace(pc.if_else(is_index, gold, pa.scalar(None, pa.string()))), pa.int64())
+    in_range = pc.fill_null(pc.and_(pc.less(index, num_options), pc.less(index, len(OPTION_LETTERS))), False)
+    letters = pc.take(OPTION_LETTERS, pc.if_else(in_range, index, pa.scalar(None, pa.int64())))
+    return pc.if_else(in_range, letters, gold)
+
+def gold_from_pack(pack):
+    """Gold answers of an eval pack, read as columns."""
+    table = pack.table
+    gold = index_gold_to_letters(table['answer'], pc.fill_null(pc.list_value_length(table['options']), 0))
+    return pa.Table.from_arrays([table['subject'], table['split'], table['qid'], gold], schema=GOLD_SCHEMA)
+
+def _gold_batch(batch, handler):
+    """Dataset.map function: gold answers of one batch of rows, with option counts for integer answers."""
+    golds, num_options = [], []
+    for values in zip(*batch.values()):
+        row = dict(zip(batch, values))
+        gold = handler.get_correct_answer(row)
+        options = None
+        if isinstance(gold, int) and not isinstance(gold, bool):
+            # An integer gold answer may be an option index; that needs the question's options
+            try:
+                options = (handler.get_model_input(row) or {}).get('options')
+            except Exception as e:
+                logger.debug(f"Could not read the options of a question: {e}")
+        golds.append(None if gold is None else str(gold))
+        num_options.append(len(options) if options else 0)
+    return {'gold': golds, 'num_options': num_options}
+
+def gold_from_handler(handler, results):
+    """Gold answers for the questions in `results`, computed with the handler's get_correct_answer.
+
+    Each (subject, split) is loaded once, projected to the handler's columns
+    with images undecoded, and the rows of the answered qids are taken from it
+    in one Arrow take. get_correct_answer is handler code that reads one row,
+    so it still runs per row, but inside a batched Dataset.map that returns
+    Arrow columns; the subsets' columns are then concatenated as a table, as
+    gold_from_pack does.
+    """
+    if handler.streaming:
+        raise ValueError("Streamed datasets have no stable row indices; score them from an eval pack")
+
+    tables = []
+    pairs = results.select(['subject', 'split']).group_by(['subject', 'split']).aggregate([]).to_pylist()
+    for pair in pairs:
+        subject, split = pair['subject'], pair['split']
+        subject_mask = pc.is_null(results['subject']) if subject is None else pc.equal(results['subject'], subject)
+        mask = pc.fill_null(pc.and_(subject_mask, pc.equal(results['split'], split)), False)
+        qids = pc.unique(results.filter(mask)['qid'])
+        dataset = handler.get_dataset(subject, split)
+        if dataset is None:
+            logger.warning(f"Could not load {subject}:{split}; its answers are left unscored")
+            continue
+        rows = dataset.select(qids.to_pylist())
+        columns = rows.map(
+            _gold_batch,
+            batched=True,
+            remove_columns=rows.column_names,
+            fn_kwargs={'handler': handler},
+            keep_in_memory=True,
+            new_fingerprint=f"{rows._fingerprint}-gold",
+            desc=f"Gold answers of {subject}:{split}"
+        ).with_format('arrow')[:]
+        gold = index_gold_to_letters(pc.cast(columns['gold'], pa.string()), pc.cast(columns['num_options'], pa.int64()))
+        tables.append(pa.Table.from_arrays([
+            pa.array([subject] * len(qids), pa.string()),
+            pa.array([split] * len(qids), pa.string()),
+            pc.cast(qids, pa.int64()),
+            gold
+        ], schema=GOLD_SCHEMA))
+    return pa.concat_tables(tables) if tables else GOLD_SCHEMA.empty_table()
+
+def normalize(array):
+    """Trim whitespace, surrounding brackets and trailing periods, and upper-case answers for comparison."""
+    array = pc.utf8_upper(pc.utf8_trim_whitespace(array))
+    array = pc.utf8_trim(array, characters="().")
+    return pc.utf8_trim_whitespace(array)
+
+def score(results, gold):
+    """Join answers with gold answers by (subject, split, qid) and compute per-subset rates.
+
+    Returns:
+        pa.Table: one row per (model, subject, split) with counts, accuracy,
+        invalid-response rate and timeout rate
+    """
+    joined = results.join(gold, keys=KEYS, join_type='left outer')
+
+    status = joined['status']
+    answered = pc.is_in(status, value_set=pa.array([STATUS_OK, STATUS_CACHED]))
+    answer = normalize(pc.fill_null(joined['answer'], ""))
+    gold_answer = normalize(pc.fill_null(joined['gold'], ""))
+    has_gold = pc.and_(pc.is_valid(joined['gold']), pc.not_equal(gold_answer, ""))
+
+    is_mcq = pc.match_substring_regex(gold_answer, MCQ_ANSWER_PATTERN)
+    malformed = pc.and_(is_mcq, pc.invert(pc.match_substring_regex(answer, MCQ_ANSWER_PATTERN)))
+    invalid = pc.or_(pc.equal(status, STATUS_ERROR), pc.and_(answered, malformed))
+    correct = pc.and_(pc.and_(answered, has_gold), pc.equal(answer, gold_answer))
+
+    table = pa.table({
+        'model': joined['model'],
+        'subject': joined['subject'],
+        'split': joined['split'],
+        'scored': pc.cast(has_gold, pa.int64()),
+        'correct': pc.cast(correct, pa.int64()),
+        'invalid': pc.cast(invalid, pa.int64()),
+        'timeout': pc.cast(pc.equal(status, STATUS_TIMEOUT), pa.int64())
+    })
+    summary = table.group_by(['model', 'subject', 'split']).aggregate([
+        ('correct', 'count'), ('scored', 'sum'), ('correct', 'sum'), ('invalid', 'sum'), ('timeout', 'sum')
+    ])
+
+    total = summary['correct_count'].to_numpy().astype(np.float64)
+    scored = summary['scored_sum'].to_numpy().astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = np.where(scored > 0, summary['correct_sum'].to_numpy() / scored, np.nan)
+        invalid_rate = summary['invalid_sum'].to_numpy() / total
+        timeout_rate = summary['timeout_sum'].to_numpy() / total
+    return pa.table({
+        'model': summary['model'],
+        'subject': summary['subject'],
+        'split': summary['split'],
+        'questions': summary['correct_count'],
+        'scored': summary['scored_sum'],
+        'correct': summary['correct_sum'],
+        'accuracy': accuracy,
+        'invalid_rate': invalid_rate,
+        'timeout_rate': timeout_rate
+    }).sort_by([('model', 'ascending'), ('subject', 'ascending'), ('split', 'ascending')])
+
+def load_results_table(source, dataset=None, model=None):
+    """Read the answer columns needed for scoring, filtered to one dataset and/or model.
+
+    A question answered in several input files, e.g. in shard files and in the
+    file they were merged into, is counted once, with its first answer.
+    """
+    results = open_results(source)
+    expression = None
+    for column, value in (('dataset', dataset), ('model', model)):
+        if value is not None:
+            condition = pc.field(column) == value
+            expression = condition if expression is None else expression & condition
+    table = results.to_table(columns=['model', 'subject', 'split', 'qid', 'answer', 'status'], filter=expression)
+
+    unique = table.group_by(['model'] + KEYS, use_threads=False).aggregate([('answer', 'first'), ('status', 'first')])
+    if unique.num_rows == table.num_rows:
+        return table
+    logger.warning(f"{table.num_rows - unique.num_rows} answers appear in more than one results file and are "
+                   f"counted once; pass either the shard files or the merged file, not both")
+    return pa.table({
+        'model': unique['model'],
+        'subject': unique['subject'],
+        'split': unique['split'],
+        'qid': unique['qid'],
+        'answer': unique['answer_first'],
+        'status': unique['status_first']
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description='Score saved answers against gold answers')
+    parser.add_argument('--results', nargs='+', required=True,
+                        help='Parquet results files or a results directory')
+    parser.add_argument('--eval_pack', type=str, default=None,
+                        help='Eval pack holding the gold answers')
+    parser.add_argument('--script', type=str, default=None,
+                        help='Dataset script whose handler computes the gold answers, when there is no eval pack')
+    parser.add_argument('--dataset', type=str, default=None,
+                        help='Only score rows of this dataset, i.e. the last part of its HF name, e.g. mmlu')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Only score rows of this model')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the score table to this CSV file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+    if not args.eval_pack and not args.script:
+        parser.error("one of --eval_pack or --script is required")
+
+    source = args.results[0] if len(args.results) == 1 else args.results
+    results = load_results_table(source, dataset=args.dataset, model=args.model)
+    logger.info(f"Loaded {results.num_rows} answers")
+
+    if args.eval_pack:
+        gold = gold_from_pack(EvalPack(args.eval_pack))
+    else:
+        handler_class = load_handler_class(args.script)
+        models = {'text': args.model or "", 'vision': args.model or ""}
+        handler = handler_class(task=Tasks.SAVE_QUESTIONS, models=models, sys_config={})
+        gold = gold_from_handler(handler, results)
+
+    scores = score(results, gold)
+    print(tabulate(scores.to_pylist(), headers='keys', floatfmt='.3f'))
+    if args.output:
+        pa_csv.write_csv(scores, args.output)
+        logger.info(f"Scores written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+def parse_shard(text):
+    """Parse a shard given as 'i/N' into (i, N), with 0 <= i < N."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', text or "")
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid shard {text!r}; expected i/N, e.g. 0/4")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or index >= count:
+        raise argparse.ArgumentTypeError(f"Invalid shard {text!r}; need 0 <= i < N")
+    return index, count
+
+def shard_of(subject, split, index, count):
+    """Shard a question belongs to, from a stable hash of (subject, split, index)."""
+    key = f"{subject}\x00{split}\x00{index}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big') % count
+
+def in_shard(subject, split, index, shard):
+    return shard is None or shard_of(subject, split, index, shard[1]) == shard[0]
+
+def shard_tag(shard):
+    """File name tag of a shard's outputs; empty for an unsharded run."""
+    return "" if shard is None else f".shard-{shard[0]}-of-{shard[1]}"
+
+def find_shard_files(path):
+    """Return the shard files written for the unsharded results path `path`."""
+    base, extension = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(base)}.shard-*-of-*{extension}"))
+
+def merge_shards(path, output=None):
+    """Merge the shard results of one run into the file an unsharded run would have written.
+
+    Before writing, the merge checks that:
+    - every shard from 0 to N-1 is present exactly once and used the same
+      seed and sample size,
+    - the shards' assigned slices add up to the full sample of every subset,
+    - every assigned question was answered, and no question appears twice.
+
+    Returns:
+        str: path of the merged results file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from results_store import RESULT_SCHEMA, ResultsWriter, read_run_metadata
+
+    files = find_shard_files(path)
+    if not files:
+        raise ValueError(f"No shard files found for {path}")
+
+    runs = {}
+    tables = []
+    for file in files:
+        run = read_run_metadata(file)
+        if run is None or run.get('shard') is None:
+            raise ValueError(f"{file} is not the results file of a shard")
+        index, count = run['shard']
+        if index in runs:
+            raise ValueError(f"Shard {index} appears in more than one file")
+        runs[index] = run
+        tables.append(pq.read_table(file))
+
+    counts = {run['shard'][1] for run in runs.values()}
+    if len(counts) != 1:
+        raise ValueError(f"Shard files disagree on the number of shards: {sorted(counts)}")
+    count = counts.pop()
+    missing = sorted(set(range(count)) - set(runs))
+    if missing:
+        raise ValueError(f"Missing shards {missing} of {count}")
+    for key in ('seed', 'nsamples', 'dataset', 'model'):
+        values = {json.dumps(run.get(key)) for run in runs.values()}
+        if len(values) != 1:
+            raise ValueError(f"Shards were run with different {key}: {sorted(values)}")
+
+    # Every subset must be fully covered by the shards' slices of the same sample
+    subsets = {}
+    for run in runs.values():
+        for subset, plan in run['planned'].items():
+            entry = subsets.setdefault(subset, {'sampled': set(), 'assigned': 0})
+            entry['sampled'].add(plan['sampled'])
+            entry['assigned'] += plan['assigned']
+    planned = {}
+    for subset, entry in sorted(subsets.items()):
+        if len(entry['sampled']) != 1:
+            raise ValueError(f"Shards drew different samples for {subset}: {sorted(entry['sampled'])}")
+        sampled = entry['sampled'].pop()
+        if entry['assigned'] != sampled:
+            raise ValueError(f"Shards cover {entry['assigned']} of {sampled} sampled questions in {subset}")
+        planned[subset] = {'sampled': sampled, 'assigned': sampled}
+
+    merged = pa.concat_tables(tables).sort_by([('subject', 'ascending'), ('split', 'ascending'), ('qid', 'ascending')])
+    keys = merged.select(['subject', 'split', 'qid']).group_by(['subject', 'split', 'qid']).aggregate([])
+    if keys.num_rows != merged.num_rows:
+        raise ValueError(f"{merged.num_rows - keys.num_rows} questions were answered by more than one shard")
+    expected = sum(plan['sampled'] for plan in planned.values())
+    if merged.num_rows != expected:
+        raise ValueError(f"Shards answered {merged.num_rows} of {expected} sampled questions")
+
+    run = dict(runs[0], shard=None, planned=planned)
+    output = output or path
+    writer = ResultsWriter(output, dataset=run['dataset'], model=run['model'], metadata=run)
+    writer.write_table(merged.select(RESULT_SCHEMA.names).cast(RESULT_SCHEMA))
+    writer.close()
+    logger.info(f"Merged {count} shards, {merged.num_rows} questions, into {output}")
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge the results of a sharded run and check that it is complete')
+    parser.add_argument('results', help='Results path of the unsharded run, e.g. results/mmlu_result_llama3.2.parquet')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Where to write the merged results (default: the unsharded results path)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+    merge_shards(args.results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import logging
+import math
+import random
+import threading
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 1000
+
+# How a streamed split is sampled: an approximate shuffle that reads only the rows it returns,
+# or a uniform reservoir sample that reads the whole stream
+SHUFFLE_BUFFER = "shuffle_buffer"
+RESERVOIR = "reservoir"
+SAMPLE_METHODS = (SHUFFLE_BUFFER, RESERVOIR)
+
+def stream_seed(seed):
+    """Derive the integer seed used for shuffling a stream from any hashable seed."""
+    return random.Random(seed).getrandbits(32)
+
+def _open_unit(rng):
+    """Uniform draw from the open interval (0, 1)."""
+    while True:
+        u = rng.random()
+        if u > 0.0:
+            return u
+
+def reservoir_sample(rows, k, rng):
+    """Uniform random sample of `k` rows of an iterable, in random order (Algorithm L).
+
+    Every row is read, but only the rows replacing a reservoir entry are drawn
+    for; the rows in between are skipped in one step, so the cost is one pass
+    over the stream and O(k log(n/k)) random draws.
+    """
+    rows = iter(rows)
+    reservoir = list(islice(rows, k))
+    if len(reservoir) == k and k > 0:
+        w = math.exp(math.log(_open_unit(rng)) / k)
+        while True:
+            skip = math.floor(math.log(_open_unit(rng)) / math.log(1.0 - w))
+            row = next(islice(rows, skip, None), None)
+            if row is None:
+                break
+            reservoir[rng.randrange(k)] = row
+            w *= math.exp(math.log(_open_unit(rng)) / k)
+    rng.shuffle(reservoir)
+    return reservoir
+
+class StreamSample:
+    """Seeded random sample of a streaming dataset, readable by sample position.
+
+    With the default `method`, SHUFFLE_BUFFER, the stream is shuffled with a
+    seed: the shard order is permuted first, so the first rows come from
+    randomly chosen shards, and then rows are mixed through a bounded buffer.
+    Only the first `nsamples` rows are read and nothing else is downloaded, but
+    this is an approximate shuffle, not a uniform sample: rows more than
+    `buffer_size` past the start of the first shards read are never picked.
+    RESERVOIR draws a uniform sample instead, at the cost of reading the whole
+    stream before the first row is returned and holding the sampled rows in
+    memory. Either way the same seed always gives the same rows in the same
+    order.
+
+    Row i of the sample is read with sample[i]. Rows are read from the stream on
+    demand and kept only until they are requested, so memory holds only the rows
+    that are in flight. Rows that will never be requested, e.g. rows already
+    answered in a resumed run, are dropped as the stream passes them.
+
+    One thread at a time reads from the stream, without holding the lock, so
+    threads whose rows are already buffered never wait behind a slow read.
+    """
+    def __init__(self, dataset, nsamples, seed, buffer_size=DEFAULT_BUFFER_SIZE, num_rows=None, method=SHUFFLE_BUFFER):
+        if method not in SAMPLE_METHODS:
+            raise ValueError(f"Unknown stream sampling method {method!r}; expected one of {SAMPLE_METHODS}")
+        # Without a sample size the whole stream is read in order
+        self.nsamples = nsamples if nsamples is not None else num_rows
+        self.features = dataset.features
+        self.column_names = list(dataset.features) if dataset.features else []
+        if nsamples is None:
+            self._rows = iter(dataset)
+        elif method == RESERVOIR:
+            # Drawn on the first read, by the thread reading the stream
+            self._rows = iter(self._reservoir_rows(dataset, nsamples, seed))
+        else:
+            self._rows = iter(islice(dataset.shuffle(seed=stream_seed(seed), buffer_size=buffer_size), nsamples))
+        self._position = 0
+        self._exhausted = False
+        self._wanted = None
+        self._buffered = {}
+        self._lock = threading.Condition()
+        self._reading = False
+
+    def __len__(self):
+        return self.nsamples
+
+    @staticmethod
+    def _reservoir_rows(dataset, nsamples, seed):
+        logger.info(f"Reading the whole stream to draw a uniform sample of {nsamples} rows")
+        yield from reservoir_sample(dataset, nsamples, random.Random(stream_seed(seed)))
+
+    def set_wanted(self, indices):
+        """Restrict buffering to the sample positions that will actually be requested."""
+        with self._lock:
+            self._wanted = set(indices)
+
+    def _read_until(self, index):
+        """Wait until the stream has been read past `index`; called with the lock held."""
+        while self._position <= index and not self._exhausted:
+            if self._reading:
+                # Another thread is reading; it announces every row it adds
+                self._lock.wait()
+                continue
+            self._reading = True
+            self._lock.release()
+            try:
+                row = next(self._rows, None)
+            finally:
+                self._lock.acquire()
+                self._reading = False
+                self._lock.notify_all()
+            if row is None:
+                self._exhausted = True
+                logger.warning(f"Stream ended after {self._position} rows, fewer than requested")
+                break
+            if self._wanted is None or self._position in self._wanted:
+                self._buffered[self._position] = row
+            self._position += 1
+
+    def peek(self, indices):
+        """Return the rows at the given positions without consuming them."""
+        with self._lock:
+            if indices:
+                self._read_until(max(indices))
+            return [self._buffered[index] for index in indices if index in self._buffered]
+
+    def __getitem__(self, index):
+        with self._lock:
+            self._read_until(index)
+            if index not in self._buffered:
+                raise IndexError(f"Sample position {index} is not available")
+            if self._wanted is not None:
+                self._wanted.discard(index)
+            return self._buffered.pop(index)
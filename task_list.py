@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 class Tasks:
@@ -18,13 +19,14 @@ def execute_task(obj, row):
     task  = obj.get_assigned_task()
     dname = obj.get_dataset_name()
 
-    model_input = obj.extract_data(row)
+    model_input = obj.get_model_input(row)
     if model_input is None:
        error_msg = "Failed to extract data from the row"
        logging.error(error_msg)
        return error_msg
 
     if task == Tasks.GENERATE_ANSWERS:
+       obj.localize_images(model_input)
        return generate_answer(obj, model_input)
         
     if task == Tasks.SAVE_QUESTIONS:
@@ -32,3 +34,31 @@ def execute_task(obj, row):
        return model_input
 
     return "Unknown task"
+
+async def generate_answer_async(obj, model_input):
+    model = obj.get_async_model()
+    if model is None:
+       logging.error("Invalid model selection or initialization failed")
+       return "Invalid model selection or initialization failed"
+
+    response = await model.get_response(model_input)
+    return response
+
+async def execute_task_async(obj, row):
+    task  = obj.get_assigned_task()
+
+    model_input = obj.get_model_input(row)
+    if model_input is None:
+       error_msg = "Failed to extract data from the row"
+       logging.error(error_msg)
+       return error_msg
+
+    if task == Tasks.GENERATE_ANSWERS:
+       await asyncio.to_thread(obj.localize_images, model_input)
+       return await generate_answer_async(obj, model_input)
+
+    if task == Tasks.SAVE_QUESTIONS:
+       model_input['answer'] = obj.get_correct_answer(row)
+       return model_input
+
+    return "Unknown task"
@@ -0,0 +1,76 @@
+import hashlib
+import logging
+import os
+import sys
+import threading
+
+# Modules set up file logging in the working directory with basicConfig, which does nothing once root has a handler
+logging.getLogger().addHandler(logging.NullHandler())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from datasets import Dataset
+
+from dataset_handler import DatasetHandler
+from model_query import ModelQuery
+from task_list import Tasks, execute_task
+
+class FakeDataset(DatasetHandler):
+    """Two in-memory subjects of text MCQs, answered by the stubbed model."""
+    SUBJECTS = {'algebra': 40, 'geometry': 30}
+
+    @classmethod
+    def is_multimodal(cls):
+        return False
+
+    def __init__(self, sys_config=None):
+        self.task = Tasks.GENERATE_ANSWERS
+        self.models = {'text': 'fake-model', 'vision': 'fake-model'}
+        self.local_thread = threading.local()
+        super().__init__("local/fakemcq", "fake-model", sys_config)
+
+    def get_subjects(self):
+        return list(self.SUBJECTS)
+
+    def get_splits(self, subject):
+        return ['test']
+
+    def get_dataset(self, subject, split):
+        rows = self.SUBJECTS[subject]
+        return Dataset.from_dict({
+            'question': [f"{subject} question {i}?" for i in range(rows)],
+            'choices': [[f"option {j} of {i}" for j in range(4)] for i in range(rows)],
+            'answer': [i % 4 for i in range(rows)]
+        })
+
+    def process_dataset_row(self, row):
+        return execute_task(self, row)
+
+    def extract_data(self, row):
+        return {'question': row['question'], 'options': row['choices'], 'images': None}
+
+    def get_correct_answer(self, row):
+        return row['answer']
+
+    def get_model(self):
+        return ModelQuery.get_thread_model(self.local_thread, self.models)
+
+    def get_dataset_name(self):
+        return "FakeMCQ"
+
+    def get_assigned_task(self):
+        return self.task
+
+def fake_chat(self, model, messages):
+    """Answer with a letter derived from the prompt, so every run gives the same answer to a question."""
+    digest = hashlib.blake2b(messages[-1]['content'].encode('utf-8'), digest_size=1).digest()[0]
+    return "ABCD"[digest % 4]
+
+@pytest.fixture
+def fake_backend(tmp_path, monkeypatch):
+    """Run handlers in a scratch directory against the stubbed model instead of Ollama."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ModelQuery, 'chat', fake_chat)
+    monkeypatch.setattr(ModelQuery, '_validate_models', lambda self: True)
+    monkeypatch.setattr(ModelQuery, '_shared_models', {})
+    return tmp_path
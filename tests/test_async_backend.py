@@ -0,0 +1,31 @@
+import asyncio
+
+import pyarrow.parquet as pq
+
+from async_model_query import AsyncModelQuery
+from conftest import FakeDataset, fake_chat
+from model_query import ModelQuery
+from results_store import get_results_store_path
+
+def test_async_model_is_validated_outside_the_event_loop(fake_backend, monkeypatch):
+    validated_in_loop = []
+
+    def validate(self):
+        try:
+            asyncio.get_running_loop()
+            validated_in_loop.append(True)
+        except RuntimeError:
+            validated_in_loop.append(False)
+        return True
+
+    async def chat(self, model, messages):
+        return fake_chat(self, model, messages)
+
+    monkeypatch.setattr(ModelQuery, '_validate_models', validate)
+    monkeypatch.setattr(AsyncModelQuery, 'chat', chat)
+    FakeDataset({'backend': 'async', 'seed': 1}).run(nsamples=5)
+
+    assert validated_in_loop == [False]
+    results = pq.read_table(get_results_store_path("local/fakemcq", "fake-model"))
+    assert results.num_rows == 5 * len(FakeDataset.SUBJECTS)
+    assert set(results['status'].to_pylist()) == {'ok'}
@@ -0,0 +1,72 @@
+import json
+import logging
+
+import pyarrow.parquet as pq
+import pytest
+
+from checkpoint import CheckpointLog
+from conftest import FakeDataset, fake_chat
+from model_query import ModelQuery
+from results_store import get_results_store_path
+from task_list import Tasks
+from utils import get_checkpoint_path
+
+NSAMPLES = 8
+
+def test_resume_asks_only_missing_and_failed_questions(fake_backend, monkeypatch):
+    def flaky_chat(self, model, messages):
+        if "geometry" in messages[-1]['content']:
+            raise RuntimeError("server went away")
+        return fake_chat(self, model, messages)
+    monkeypatch.setattr(ModelQuery, 'chat', flaky_chat)
+    FakeDataset({'seed': 2}).run(nsamples=NSAMPLES)
+
+    header, completed = CheckpointLog(get_checkpoint_path("local/fakemcq", "fake-model")).load()
+    assert header['seed'] == 2
+    assert {subject for subject, _, _ in completed} == {'algebra'}
+
+    asked = []
+    def counting_chat(self, model, messages):
+        asked.append(messages[-1]['content'])
+        return fake_chat(self, model, messages)
+    monkeypatch.setattr(ModelQuery, 'chat', counting_chat)
+    FakeDataset({'resume': True}).run(nsamples=NSAMPLES)
+
+    assert len(asked) == NSAMPLES and all("geometry" in prompt for prompt in asked)
+    results = pq.read_table(get_results_store_path("local/fakemcq", "fake-model"))
+    assert results.num_rows == 2 * NSAMPLES
+    assert set(results['status'].to_pylist()) == {'ok'}
+
+def test_truncated_last_line_is_skipped_and_cut(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    log = CheckpointLog(path)
+    log.open(header={'seed': 1})
+    log.append(None, 'test', 0, "A")
+    log.close()
+    with open(path, 'a') as f:
+        f.write('{"subject": null, "split": "test", "qid": 1, "ans')
+
+    assert CheckpointLog(path).load()[1] == {(None, 'test', 0): "A"}
+    log = CheckpointLog(path)
+    log.open(header={'seed': 1}, resume=True)
+    log.append(None, 'test', 2, "Error: Request timed out.", failed=True)
+    log.append(None, 'test', 3, "C")
+    log.close()
+
+    with open(path) as f:
+        assert [json.loads(line).get('qid') for line in f] == [None, 0, 2, 3]
+    header, completed = CheckpointLog(path).load()
+    assert header['seed'] == 1
+    assert completed == {(None, 'test', 0): "A", (None, 'test', 3): "C"}
+
+def test_resume_checks_the_checkpoint_header(fake_backend, caplog):
+    FakeDataset({'seed': 4}).run(nsamples=NSAMPLES)
+
+    caplog.set_level(logging.WARNING, logger='dataset_handler')
+    FakeDataset({'resume': True}).run(nsamples=NSAMPLES + 1)
+    assert any("nsamples=8, resuming with nsamples=9" in record.getMessage() for record in caplog.records)
+
+    handler = FakeDataset({'resume': True})
+    handler.task = Tasks.SAVE_QUESTIONS
+    with pytest.raises(ValueError, match="written by task generate_answers"):
+        handler._open_checkpoint(NSAMPLES)
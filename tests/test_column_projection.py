@@ -0,0 +1,98 @@
+import os
+
+import pytest
+from datasets import Dataset
+from PIL import Image
+
+from orchestrator import CATEGORIES, PROJECT_ROOT, get_category_scripts, load_handler_class
+from row_filters import row_matches
+from task_list import Tasks
+
+MODELS = {'text': 'fake-model', 'vision': 'fake-model'}
+
+def sample_image():
+    return Image.new('RGB', (8, 8), (200, 30, 30))
+
+# One plausible value per dataset column; columns not listed hold a short string
+COLUMN_VALUES = {
+    'image': sample_image, 'decoded_image': sample_image, 'Picture': sample_image,
+    **{f'image_{j}': sample_image for j in range(1, 8)},
+    'images': lambda: [sample_image()],
+    'Image': lambda: "images/case.png",
+    'img_name': lambda: "xmlab1/source.jpg",
+    'url': lambda: "https://example.com/image.jpg",
+    'figure_urls': lambda: ["https://example.com/figure.png"],
+    'choices': lambda: ["first", "second"],
+    'options': lambda: ["first", "second"],
+    'Options': lambda: ["first", "second"],
+    'conversations': lambda: [{'from': "human", 'value': "<image>\nHow many sides?"},
+                              {'from': "gpt", 'value': "The answer is 4"}],
+    'answer': lambda: 1,
+    'label': lambda: 0,
+    'cop': lambda: 1,
+    'response': lambda: 0,
+    'final_answer': lambda: "2",
+    'q_lang': lambda: "en",
+    'language': lambda: "EN",
+}
+
+# Columns whose format is specific to one dataset
+SCRIPT_VALUES = {
+    'ai2arc.py': {'choices': lambda: {'text': ["first", "second"], 'label': ["A", "B"]}},
+    'bigbenchhard.py': {'input': lambda: "Which is larger?\nOptions:\n(A) one\n(B) two", 'target': lambda: "(B)"},
+    'medical_meadow_medqa.py': {'input': lambda: "Q: Which drug? {'A': 'first', 'B': 'second'},",
+                                'output': lambda: "A: first"},
+    'medqa.py': {'data': lambda: {'Question': "Which drug?", 'question': "Which drug?",
+                                  'options': ["first", "second"], 'Correct Option': "A"}},
+    'winogrande.py': {'request': lambda: 'Given the text "The cup fell because _ was slippery", '
+                                         'choose the option that fits:\n1 - "cup."\n2 - "table."'},
+    'realworldqa.py': {'question': lambda: "Which way is the car facing? A. Left B. Right Please answer directly."},
+}
+
+# Handlers that fail to load in this tree
+BROKEN = {
+    'mathqa.py': "__init__ reads the misspelled HF_DATASET_NAMEDATASET_NAME",
+    'kvasirvqa.py': "process_dataset_row is not implemented",
+}
+
+# Handlers whose gold answer is not read from a column: datasets without references, and
+# Cauldron, which passes its answer in the model input
+NO_GOLD_COLUMN = {'camaou.py', 'cauldron.py', 'imo_geometry.py', 'medicalquestions.py', 'simpleqa.py'}
+
+def handler_scripts():
+    params = []
+    for path in get_category_scripts(list(CATEGORIES)):
+        name = os.path.basename(path)
+        marks = [pytest.mark.xfail(reason=BROKEN[name], strict=True)] if name in BROKEN else []
+        params.append(pytest.param(path, id=os.path.relpath(path, PROJECT_ROOT), marks=marks))
+    return params
+
+def projected_row(script_path):
+    """Build the handler and one row holding every declared column, projected the way a run projects it."""
+    handler = load_handler_class(script_path)(task=Tasks.GENERATE_ANSWERS, models=MODELS, sys_config={})
+    values = {**COLUMN_VALUES, **SCRIPT_VALUES.get(os.path.basename(script_path), {})}
+    columns = set(handler.REQUIRED_DATA_KEYS) | handler.IMAGE_URL_KEYS | {rule[0] for rule in handler.ROW_FILTERS}
+    row = {column: values.get(column, lambda column=column: f"sample {column}")() for column in sorted(columns)}
+    dataset = Dataset.from_list([{**row, 'unused': "not declared"}])
+    projected = handler._select_required_columns(dataset)
+    assert 'unused' not in projected.column_names
+    row = projected[0]
+    assert row_matches(row, handler.ROW_FILTERS)
+    return handler, row
+
+@pytest.mark.parametrize('script_path', handler_scripts())
+def test_projected_row_gives_a_model_input(fake_backend, script_path):
+    handler, row = projected_row(script_path)
+    model_input = handler.extract_data(row)
+    assert model_input is not None and model_input['question']
+    if handler.is_multimodal():
+        assert model_input['images']
+
+@pytest.mark.parametrize('script_path', [
+    param for param in handler_scripts() if os.path.basename(param.values[0]) not in NO_GOLD_COLUMN
+])
+def test_projected_row_keeps_the_gold_answer(fake_backend, script_path):
+    handler, row = projected_row(script_path)
+    if os.path.basename(script_path) == 'olympiadbench.py':
+        pytest.importorskip('antlr4', reason="OlympiadBench parses gold answers with sympy's LaTeX parser")
+    assert handler.get_correct_answer(row) not in (None, "", "NA")
@@ -0,0 +1,51 @@
+import logging
+import re
+
+from conftest import FakeDataset
+
+def test_progress_is_reported_per_subset(fake_backend, monkeypatch, caplog):
+    monkeypatch.setattr(FakeDataset, 'PROGRESS_LOG_INTERVAL', 0.0)
+    caplog.set_level(logging.INFO, logger='dataset_handler')
+    FakeDataset({'seed': 5, 'max_threads': 2}).run(nsamples=6)
+
+    counts = {}
+    for record in caplog.records:
+        if record.getMessage().startswith("Subsets in progress: "):
+            for desc, done, planned in re.findall(r"(\w+:\w+) (\d+)/(\d+)", record.getMessage()):
+                assert int(planned) == 6
+                counts.setdefault(desc, []).append(int(done))
+    assert set(counts) == {'algebra:test', 'geometry:test'}
+    # Counts only grow, and a subset drops out of the report once it is finished
+    assert all(done == sorted(done) and max(done) < 6 for done in counts.values())
+    finished = [record.getMessage() for record in caplog.records if record.getMessage().startswith("Finished processing subset")]
+    assert len(finished) == 2
+
+def test_questions_are_materialized_a_bounded_number_at_a_time(fake_backend, monkeypatch):
+    counts = {'pulled': 0, 'finished': 0, 'peak': 0}
+    interleave, finish = FakeDataset._interleave, FakeDataset._finish_question
+
+    def counted_interleave(self, works, window):
+        for item in interleave(self, works, window):
+            counts['pulled'] += 1
+            counts['peak'] = max(counts['peak'], counts['pulled'] - counts['finished'])
+            yield item
+
+    def counted_finish(self, *args):
+        counts['finished'] += 1
+        finish(self, *args)
+
+    monkeypatch.setattr(FakeDataset, '_interleave', counted_interleave)
+    monkeypatch.setattr(FakeDataset, '_finish_question', counted_finish)
+    FakeDataset({'seed': 5, 'max_threads': 2, 'max_inflight': 3}).run(nsamples=20)
+
+    assert counts['pulled'] == counts['finished'] == 40
+    assert counts['peak'] == 3
+
+def test_subsets_share_one_round_robin_schedule(fake_backend):
+    handler = FakeDataset({'seed': 5})
+    handler._open_checkpoint(6)
+    works = [handler.plan_subset(subject, 'test', 6) for subject in ['algebra', 'geometry']]
+    works[1].indices = works[1].indices[:2]
+    order = [work.subject for work, _ in handler._interleave(works, window=4)]
+    assert order == ['algebra', 'geometry'] * 2 + ['algebra'] * 4
+    handler.checkpoint.close()
@@ -0,0 +1,57 @@
+import threading
+
+from datasets import Dataset
+
+import dataset_manifest
+from dataset_manifest import DatasetManifest, load_dataset_dict
+
+def test_manifest_is_persisted_and_refreshed_on_a_new_revision(tmp_path, monkeypatch):
+    calls = []
+    revision = {'sha': "rev1"}
+    monkeypatch.setattr(dataset_manifest, 'get_dataset_config_names', lambda name: calls.append(name) or ["a", "b"])
+    monkeypatch.setattr(DatasetManifest, '_hub_revision', staticmethod(lambda name: revision['sha']))
+    path = str(tmp_path / "manifest.json")
+
+    assert DatasetManifest(path).get_configs("org/ds") == ["a", "b"]
+    # A new process reads the configs from the file within the TTL
+    assert DatasetManifest(path).get_configs("org/ds") == ["a", "b"]
+    assert len(calls) == 1
+
+    # Once expired, the same revision keeps the entry, an unreachable hub keeps it, and a new one drops it
+    expired = DatasetManifest(path, ttl=0)
+    expired.get_configs("org/ds")
+    revision['sha'] = None
+    expired.get_configs("org/ds")
+    assert len(calls) == 1
+    revision['sha'] = "rev2"
+    expired.get_configs("org/ds")
+    assert len(calls) == 2
+
+def test_split_entries_follow_the_dataset_fingerprint(tmp_path, monkeypatch):
+    monkeypatch.setattr(DatasetManifest, '_hub_revision', staticmethod(lambda name: None))
+    manifest = DatasetManifest(str(tmp_path / "manifest.json"))
+    manifest.record_split("org/ds", None, "test", Dataset.from_dict({'x': [1, 2, 3]}))
+    assert manifest.num_rows("org/ds", None, "test") == 3
+
+    manifest.record_split("org/ds", None, "test", Dataset.from_dict({'x': [1, 2, 3, 4]}))
+    assert manifest.get_split_info("org/ds", None, "test")['num_rows'] == 4
+
+def test_dataset_dict_is_loaded_once_per_process(monkeypatch):
+    loads = []
+    release = threading.Event()
+    def load_dataset(name, *args, **kwargs):
+        loads.append(name)
+        release.wait(5)
+        return {'test': name}
+    monkeypatch.setattr(dataset_manifest, 'load_dataset', load_dataset)
+    monkeypatch.setattr(dataset_manifest, '_dataset_memo', {})
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load_dataset_dict("org/memo"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert loads == ["org/memo"]
+    assert results == [{'test': "org/memo"}] * 4
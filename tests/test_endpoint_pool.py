@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from async_model_query import AsyncModelQuery
+from ollama_client import COLD_START_PENALTY, EndpointPool, NoEndpointError
+
+MODEL = "llama3.2"
+
+class StubOllama:
+    """Minimal Ollama server answering /api/tags, /api/ps and non-streamed /api/chat."""
+    def __init__(self, name, installed=(), loaded=(), port=0):
+        self.name = name
+        self.installed = list(installed)
+        self.loaded = list(loaded)
+        self.chats = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._reply({'models': [{'name': f"{model}:latest", 'model': f"{model}:latest"} for model in stub.installed]})
+                elif self.path == '/api/ps':
+                    self._reply({'models': [{'name': f"{model}:latest", 'model': f"{model}:latest"} for model in stub.loaded]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.chats += 1
+                self._reply({'message': {'role': 'assistant', 'content': f"reply from {stub.name}"}, 'done': True})
+
+            def _reply(self, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._handler = Handler
+        self._start(port)
+
+    def _start(self, port):
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def host(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def restart(self):
+        self._start(self.port)
+
+@pytest.fixture
+def stubs():
+    servers = {
+        'warm': StubOllama('warm', installed=[MODEL], loaded=[MODEL]),
+        'cold': StubOllama('cold', installed=[MODEL]),
+        'other': StubOllama('other', installed=['mistral'], loaded=['mistral'])
+    }
+    yield servers
+    for server in servers.values():
+        server.stop()
+
+def chat(pool):
+    with pool.route(MODEL) as endpoint:
+        response = endpoint.client.post('/api/chat', json={'model': MODEL, 'messages': [], 'stream': False})
+    return response.json()['message']['content']
+
+def test_routes_to_least_loaded_endpoint_with_the_model(stubs):
+    pool = EndpointPool([server.host for server in stubs.values()], probe_interval=3600)
+    try:
+        warm, cold, other = pool.endpoints
+        assert chat(pool) == "reply from warm"
+
+        # A cold endpoint is only picked once the warm one has more than COLD_START_PENALTY requests in flight
+        held = [pool.acquire(MODEL) for _ in range(COLD_START_PENALTY + 2)]
+        assert [endpoint.host for endpoint in held] == [warm.host] * (COLD_START_PENALTY + 1) + [cold.host]
+        assert MODEL in cold.loaded
+        for endpoint in held:
+            pool.release(endpoint)
+        assert other.requests == 0
+        assert [endpoint.inflight for endpoint in pool.endpoints] == [0, 0, 0]
+    finally:
+        pool.close()
+
+def test_ejects_unreachable_endpoint_and_readmits_it(stubs):
+    pool = EndpointPool([stubs['warm'].host, stubs['other'].host], probe_interval=3600)
+    try:
+        warm, other = pool.endpoints
+        stubs['warm'].stop()
+        with pytest.raises(httpx.ConnectError):
+            chat(pool)
+        assert not warm.healthy
+
+        # The only endpoint holding the model is ejected, and the healthy one does not have it
+        with pytest.raises(NoEndpointError, match=f"No healthy Ollama endpoint serves {MODEL}"):
+            chat(pool)
+        pool.probe_all()
+        assert not warm.healthy
+        assert stubs['other'].chats == 0
+
+        stubs['warm'].restart()
+        pool.probe_all()
+        assert warm.healthy
+        assert chat(pool) == "reply from warm"
+    finally:
+        pool.close()
+
+def test_pinned_async_model_has_no_prober(stubs):
+    model = AsyncModelQuery({'text': MODEL, 'vision': MODEL}, host=stubs['cold'].host)
+
+    async def ask():
+        try:
+            return await model.chat(MODEL, [{'role': 'user', 'content': "hi"}])
+        finally:
+            await model.aclose()
+
+    assert model.pool._prober is None
+    assert asyncio.run(ask()) == "reply from cold"
+    model.pool.close()
+
+def test_pinned_async_model_validates_against_its_own_server(stubs):
+    with pytest.raises(RuntimeError, match="Models not properly initialized"):
+        AsyncModelQuery({'text': MODEL, 'vision': MODEL}, host=stubs['other'].host)
@@ -0,0 +1,58 @@
+import pyarrow.parquet as pq
+
+from conftest import FakeDataset
+from eval_pack import EvalPack, EvalPackWriter, get_eval_pack_path
+from results_store import get_results_store_path
+from task_list import Tasks
+
+NSAMPLES = 6
+
+class PackedFakeDataset(FakeDataset):
+    """FakeDataset that must answer from its eval pack without touching the source subsets."""
+    def get_dataset(self, subject, split):
+        raise AssertionError("source dataset loaded during a pack run")
+
+class QuestionSaver(FakeDataset):
+    def get_assigned_task(self):
+        return Tasks.SAVE_QUESTIONS
+
+def answers_by_question(path):
+    table = pq.read_table(path).to_pydict()
+    return {(subject, qid): answer for subject, qid, answer in zip(table['subject'], table['qid'], table['answer'])}
+
+def test_pack_run_matches_source_run(fake_backend):
+    QuestionSaver({'seed': 4}).run(nsamples=NSAMPLES)
+    pack_path = get_eval_pack_path("local/fakemcq")
+    pack = EvalPack(pack_path)
+    assert pack.metadata['seed'] == 4 and pack.metadata['nsamples'] == NSAMPLES
+    assert sorted(pack.subjects()) == ['algebra', 'geometry']
+    subset = pack.subset('algebra', 'test')
+    assert len(subset) == NSAMPLES
+    row = subset[subset.qids[0]]
+    assert row['question'] == f"algebra question {subset.qids[0]}?"
+    assert row['answer'] == str(subset.qids[0] % 4) and row['images'] == []
+
+    FakeDataset({'seed': 4}).run(nsamples=NSAMPLES)
+    source_answers = answers_by_question(get_results_store_path("local/fakemcq", "fake-model"))
+    assert len(source_answers) == 2 * NSAMPLES
+    PackedFakeDataset({'eval_pack': pack_path}).run(nsamples=NSAMPLES)
+    assert answers_by_question(get_results_store_path("local/fakemcq", "fake-model")) == source_answers
+
+def test_discarded_pack_leaves_earlier_pack_in_place(tmp_path):
+    path = str(tmp_path / "bench.arrow")
+    writer = EvalPackWriter(path, metadata={'seed': 1}, batch_size=2)
+    for qid in range(3):
+        writer.append(None, 'test', qid, {'question': f"q{qid}", 'options': ["a", "b"], 'answer': 1, 'images': None})
+    writer.close()
+
+    writer = EvalPackWriter(path, metadata={'seed': 2})
+    writer.append(None, 'test', 9, {'question': "partial", 'options': None, 'answer': None})
+    writer.discard()
+
+    pack = EvalPack(path)
+    assert pack.metadata == {'seed': 1}
+    assert pack.subjects() == [None]
+    subset = pack.subset(None, 'test')
+    assert subset.qids == [0, 1, 2]
+    assert subset[2] == {'qid': 2, 'subject': None, 'split': 'test', 'question': "q2",
+                         'options': ["a", "b"], 'answer': "1", 'images': []}
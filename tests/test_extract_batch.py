@@ -0,0 +1,32 @@
+import os
+
+from datasets import Dataset
+
+from orchestrator import PROJECT_ROOT, load_handler_class
+from task_list import Tasks
+
+MODELS = {'text': 'fake-model', 'vision': 'fake-model'}
+
+def request(sentence, first, second):
+    return f'Given the text "{sentence}", choose the option that fits:\n1 - "{first}."\n2 - "{second}."'
+
+def test_batched_prompts_match_row_by_row_extraction(fake_backend):
+    handler_class = load_handler_class(os.path.join(PROJECT_ROOT, "LLM/MCQ/winogrande.py"))
+    handler = handler_class(task=Tasks.GENERATE_ANSWERS, models=MODELS, sys_config={})
+    dataset = Dataset.from_dict({
+        'request': [request("The trophy does not fit in the case because _ is big", "trophy", "case"),
+                    "not a winogrande request",
+                    request("Anna helped Mary because _ was kind", "Anna", "Mary")],
+        'response': [0, 1, 0]
+    })
+
+    parsed = handler._precompute_prompts(dataset)
+    assert handler.QUESTION_COLUMN in parsed.column_names and handler.OPTIONS_COLUMN in parsed.column_names
+    assert parsed.num_rows == dataset.num_rows
+    assert [handler.get_model_input(row) for row in parsed] == [handler.extract_data(row) for row in dataset]
+    assert parsed[0][handler.OPTIONS_COLUMN] == ["trophy", "case"]
+    assert handler.get_model_input(parsed[1]) is None
+
+    # Parsing in worker processes gives the same columns
+    handler.extract_workers = 2
+    assert handler._precompute_prompts(dataset)[handler.QUESTION_COLUMN] == parsed[handler.QUESTION_COLUMN]
@@ -0,0 +1,86 @@
+import base64
+import io
+
+from datasets import Dataset
+from datasets import Image as ImageFeature
+from PIL import Image
+
+import image_encoding
+from conftest import FakeDataset
+from image_encoding import EncodedImageCache, ImageBudget, encode_pil_image, fit_image_bytes, set_image_budget
+from model_query import ModelQuery, request_metrics
+
+def png_bytes(color, size=(32, 24), fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+def decode(payload):
+    return Image.open(io.BytesIO(base64.b64decode(payload)))
+
+def test_identical_images_are_encoded_once():
+    cache = EncodedImageCache()
+    first = Image.new('RGB', (32, 24), 'red')
+    payload, size = encode_pil_image(first, cache=cache)
+    assert size == (32, 24)
+    assert decode(payload).convert('RGB').getpixel((0, 0)) == (255, 0, 0)
+
+    # Another object with the same pixels is a hit; different pixels are not
+    assert encode_pil_image(Image.new('RGB', (32, 24), 'red'), cache=cache) == (payload, size)
+    encode_pil_image(Image.new('RGB', (32, 24), 'blue'), cache=cache)
+    assert cache.stats() == {'entries': 2, 'bytes': cache.current_bytes, 'hits': 1, 'misses': 2}
+
+def test_cache_evicts_least_recently_used_by_size():
+    cache = EncodedImageCache(max_bytes=10)
+    cache.put('a', "x" * 4)
+    cache.put('b', "x" * 4)
+    cache.get('a')
+    cache.put('c', "x" * 4)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.current_bytes == 8
+    # An entry larger than the whole cache is not stored
+    cache.put('d', "x" * 11)
+    assert cache.get('d') is None
+
+def test_undecoded_images_are_sent_as_their_original_bytes(fake_backend, monkeypatch):
+    monkeypatch.setattr(image_encoding, '_image_budgets', {})
+    jpeg = png_bytes('green', fmt='JPEG')
+    dataset = Dataset.from_dict({'image': [{'bytes': jpeg, 'path': None}]}).cast_column('image', ImageFeature())
+    assert isinstance(dataset[0]['image'], Image.Image)
+
+    raw = FakeDataset()._disable_image_decoding(dataset)[0]['image']
+    assert raw == {'bytes': jpeg, 'path': None}
+    path = fake_backend / "green.jpg"
+    path.write_bytes(jpeg)
+
+    model = ModelQuery.__new__(ModelQuery)
+    model.vision_model = 'fake-vision'
+    encoded = model.encode_images([raw, {'bytes': None, 'path': str(path)}, jpeg])
+    assert encoded == [base64.b64encode(jpeg).decode('ascii')] * 3
+
+def test_images_over_the_budget_are_downscaled(monkeypatch):
+    monkeypatch.setattr(image_encoding, '_image_budgets', {})
+    budget = ImageBudget(max_pixels=200, format="JPEG", quality=80)
+    small, large = png_bytes('red', size=(10, 10)), png_bytes('red', size=(40, 20))
+
+    assert fit_image_bytes(small, budget) == (small, (10, 10), (10, 10))
+    data, original, sent = fit_image_bytes(large, budget)
+    assert original == (40, 20) and sent == (20, 10)
+    assert Image.open(io.BytesIO(data)).format == "JPEG"
+
+    # PIL images give the same size as the same image passed as bytes
+    assert encode_pil_image(Image.open(io.BytesIO(large)), budget=budget)[1] == sent
+
+    set_image_budget('fake-vision', budget)
+    model = ModelQuery.__new__(ModelQuery)
+    model.vision_model = 'fake-vision'
+    metrics = {}
+    token = request_metrics.set(metrics)
+    try:
+        encoded = model.encode_images([small, large])
+    finally:
+        request_metrics.reset(token)
+    assert base64.b64decode(encoded[0]) == small
+    assert Image.open(io.BytesIO(base64.b64decode(encoded[1]))).size == (20, 10)
+    assert metrics['image_sizes'] == [{'original': [10, 10], 'sent': [10, 10]}, {'original': [40, 20], 'sent': [20, 10]}]
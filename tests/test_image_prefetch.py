@@ -0,0 +1,78 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from image_prefetch import DiskImageCache, ImagePrefetcher
+
+IMAGES = {
+    '/cat.png': b"cat" * 100,
+    '/same-cat.png': b"cat" * 100,
+    '/dog.png': b"dog" * 100,
+}
+
+@pytest.fixture
+def image_server():
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.path)
+            data = IMAGES.get(self.path)
+            if data is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", requests_seen
+    server.shutdown()
+    server.server_close()
+
+def test_prefetched_images_are_served_from_the_cache(image_server, tmp_path):
+    base, requests_seen = image_server
+    prefetcher = ImagePrefetcher(DiskImageCache(str(tmp_path)), max_workers=4)
+    try:
+        urls = [base + path for path in IMAGES]
+        prefetcher.prefetch(urls)
+        assert [prefetcher.get(url) for url in urls] == list(IMAGES.values())
+        assert sorted(requests_seen) == sorted(IMAGES)
+
+        # Cached images are not downloaded again, and identical content is stored once
+        prefetcher.prefetch(urls)
+        assert prefetcher.get(urls[0]) == IMAGES['/cat.png']
+        assert len(requests_seen) == len(IMAGES)
+        assert prefetcher.cache.current_bytes == 600
+    finally:
+        prefetcher.shutdown()
+
+def test_evicted_image_is_fetched_again(image_server, tmp_path):
+    base, requests_seen = image_server
+    # Room for one image only, so caching the dog evicts the cat
+    prefetcher = ImagePrefetcher(DiskImageCache(str(tmp_path), max_bytes=400), max_workers=2)
+    try:
+        assert prefetcher.get(base + '/cat.png') == IMAGES['/cat.png']
+        assert prefetcher.get(base + '/dog.png') == IMAGES['/dog.png']
+        assert prefetcher.cache.get(base + '/cat.png') is None
+        assert prefetcher.get(base + '/cat.png') == IMAGES['/cat.png']
+        assert requests_seen == ['/cat.png', '/dog.png', '/cat.png']
+    finally:
+        prefetcher.shutdown()
+
+def test_concurrent_puts_of_the_same_content_count_once(tmp_path):
+    cache = DiskImageCache(str(tmp_path))
+    threads = [threading.Thread(target=cache.put, args=(f"http://example/{i}", b"x" * 1000)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.current_bytes == 1000
+    assert all(cache.get(f"http://example/{i}") == b"x" * 1000 for i in range(8))
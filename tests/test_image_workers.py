@@ -0,0 +1,45 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from image_encoding import EncodedImageCache, ImageBudget, encode_pil_image
+from image_workers import ImagePreprocessPool
+
+def gradient(mode, size=(64, 48)):
+    image = Image.new('RGB', size)
+    image.putdata([(x * 4 % 256, y * 5 % 256, (x + y) % 256) for y in range(size[1]) for x in range(size[0])])
+    return image.convert(mode) if mode != 'RGB' else image
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = ImagePreprocessPool(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA', 'L', 'P'])
+@pytest.mark.parametrize('budget', [None, ImageBudget(max_pixels=600)])
+def test_in_memory_image_matches_inline_encoding(pool, mode, budget):
+    image = gradient(mode)
+    assert pool.encode_pil_image(image, budget=budget) == encode_pil_image(image, budget=budget)
+
+@pytest.mark.parametrize('budget', [None, ImageBudget(max_pixels=600)])
+def test_file_image_is_sent_as_its_bytes_and_matches_inline_encoding(pool, tmp_path, budget):
+    path = tmp_path / "gradient.png"
+    gradient('RGB').save(path)
+    image = Image.open(path)
+    cache = EncodedImageCache()
+
+    expected = encode_pil_image(Image.open(path), budget=budget)
+    assert pool.encode_pil_image(image, cache=cache, budget=budget) == expected
+    assert pool.encode_pil_image(image, cache=cache, budget=budget) == expected
+    assert cache.stats()['hits'] == 1
+
+def test_encode_bytes_matches_inline_fit(pool):
+    buffer = io.BytesIO()
+    gradient('RGB').save(buffer, format='JPEG')
+    payload, original_size, sent_size = pool.encode_bytes(buffer.getvalue(), ImageBudget(max_pixels=600))
+    assert original_size == (64, 48)
+    assert sent_size[0] * sent_size[1] <= 600
+    assert Image.open(io.BytesIO(base64.b64decode(payload))).size == sent_size
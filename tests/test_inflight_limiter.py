@@ -0,0 +1,61 @@
+import pytest
+
+import ollama_client
+from ollama_client import (DEFAULT_INFLIGHT_PER_HOST, OUTCOME_OK, OUTCOME_TIMEOUT, AdaptiveInflightLimiter, InflightLimiter,
+                           configure_inflight_limit, get_inflight_limiter)
+
+HOSTS = ["http://gpu1:11434", "http://gpu2:11434"]
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    monkeypatch.setattr(ollama_client, '_inflight_limiter', InflightLimiter())
+
+def test_in_process_runs_get_a_default_limit_per_host():
+    configure_inflight_limit(hosts=HOSTS)
+    assert get_inflight_limiter().limit == DEFAULT_INFLIGHT_PER_HOST * len(HOSTS)
+
+def test_explicit_limit_and_zero_for_none():
+    configure_inflight_limit(5, hosts=HOSTS)
+    assert get_inflight_limiter().limit == 5
+    configure_inflight_limit(0, hosts=HOSTS)
+    assert get_inflight_limiter().limit is None
+
+def test_adaptive_limit_is_not_capped_by_the_default():
+    configure_inflight_limit(adaptive_max=64, hosts=HOSTS)
+    limiter = get_inflight_limiter()
+    assert isinstance(limiter, AdaptiveInflightLimiter)
+    assert limiter.cap is None and limiter.max_limit == 64
+
+def fill_and_release(limiter, latency, outcome=OUTCOME_OK):
+    """Admit requests until the limiter is full, then finish them all."""
+    admitted = 0
+    while limiter.try_acquire():
+        admitted += 1
+    for _ in range(admitted):
+        limiter.release(latency, outcome)
+    return admitted
+
+def test_adaptive_limit_grows_to_the_cap_and_halves_on_timeout():
+    limiter = AdaptiveInflightLimiter(max_limit=16, initial=2, cap=8)
+    for _ in range(40):
+        fill_and_release(limiter, 0.1)
+    assert limiter.limit == 8 and limiter.increases == 6 and limiter.decreases == 0
+
+    # Requests admitted under the old limit time out together but lower the limit once
+    assert fill_and_release(limiter, None, OUTCOME_TIMEOUT) == 8
+    assert limiter.limit == 4 and limiter.decreases == 1
+
+def test_adaptive_limit_backs_off_on_a_latency_spike_and_ignores_idle_latency():
+    limiter = AdaptiveInflightLimiter(max_limit=16, initial=4)
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(0.1, OUTCOME_OK)
+    assert limiter.limit == 4 and limiter.increases == 0
+
+    for _ in range(10):
+        fill_and_release(limiter, 0.1)
+    grown = limiter.limit
+    assert grown > 4
+    fill_and_release(limiter, 1.0)
+    fill_and_release(limiter, 1.0)
+    assert limiter.decreases == 1 and limiter.limit < grown
@@ -0,0 +1,58 @@
+import pyarrow.parquet as pq
+import pytest
+
+from conftest import FakeDataset, fake_chat
+from model_query import ModelQuery
+from response_cache import ResponseCache
+from results_store import get_results_store_path
+
+class FakePool:
+    def __init__(self, digest):
+        self.digest = digest
+
+    def available_models(self):
+        return {'fake-model': {'digest': self.digest}}
+
+@pytest.fixture
+def counted_chat(fake_backend, monkeypatch):
+    asked = []
+    def chat(self, model, messages):
+        asked.append(messages[-1]['content'])
+        return fake_chat(self, model, messages)
+    monkeypatch.setattr(ModelQuery, 'chat', chat)
+    monkeypatch.setattr(ModelQuery, 'response_cache', None)
+    return asked
+
+def run(digest, monkeypatch):
+    monkeypatch.setattr(ModelQuery, 'endpoint_pool', lambda self: FakePool(digest))
+    FakeDataset({'seed': 9, 'response_cache': "cache/responses.db"}).run(nsamples=5)
+    return pq.read_table(get_results_store_path("local/fakemcq", "fake-model"))
+
+def test_repeated_run_is_answered_from_the_cache(counted_chat, monkeypatch):
+    first = run("sha256:aaa", monkeypatch)
+    assert len(counted_chat) == 10
+    assert set(first['status'].to_pylist()) == {'ok'}
+
+    second = run("sha256:aaa", monkeypatch)
+    assert len(counted_chat) == 10
+    assert set(second['status'].to_pylist()) == {'cached'}
+    assert second.sort_by('qid')['answer'] == first.sort_by('qid')['answer']
+    assert ModelQuery.response_cache.stats()['hits'] == 10
+
+    # A new build of the model has another digest, so nothing is reused
+    run("sha256:bbb", monkeypatch)
+    assert len(counted_chat) == 20
+
+def test_errors_are_not_cached_and_old_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"), max_entries=2)
+    model = ModelQuery.__new__(ModelQuery)
+    model.response_cache = cache
+    model.store_cached_response(('m', 'k0'), "Error: Request timed out.")
+    assert cache.get('k0') is None
+
+    for i in range(3):
+        cache.put(f"k{i + 1}", 'm', f"answer {i + 1}")
+    cache.get('k1')
+    cache.evict()
+    assert cache.get('k1') == "answer 1" and cache.get('k3') == "answer 3"
+    assert cache.get('k2') is None
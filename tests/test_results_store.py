@@ -0,0 +1,43 @@
+import os
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from results_store import ResultsWriter, TIMEOUT_ANSWER, open_results, read_run_metadata
+
+def test_answers_are_stored_with_status_and_run_metadata(tmp_path):
+    path = str(tmp_path / "bench_result_model.parquet")
+    writer = ResultsWriter(path, dataset="bench", model="model", metadata={'seed': 5, 'nsamples': 4}, batch_size=2)
+    writer.append("algebra", "test", 0, "A", {'latency': 0.5, 'prompt_tokens': 12, 'finished_at': 1000.0})
+    writer.append("algebra", "test", 1, "B", {'cache_hit': True})
+    writer.append("algebra", "test", 2, TIMEOUT_ANSWER)
+    writer.append("algebra", "test", 3, "Error: connection refused")
+    writer.append("algebra", "test", 4, {'question': "exported", 'options': None})
+    assert not os.path.exists(path)
+    writer.close()
+
+    assert read_run_metadata(path) == {'seed': 5, 'nsamples': 4}
+    table = pq.read_table(path)
+    assert table['qid'].to_pylist() == [0, 1, 2, 3, 4]
+    assert table['status'].to_pylist() == ["ok", "cached", "timeout", "error", "error"]
+    assert table['answer'].to_pylist()[-1] is None
+    first = table.slice(0, 1).to_pylist()[0]
+    assert (first['latency'], first['prompt_tokens'], first['timestamp'].timestamp()) == (0.5, 12, 1000.0)
+
+    failed = open_results(str(tmp_path)).to_table(filter=pc.field('status') != "ok", columns=['qid'])
+    assert failed['qid'].to_pylist() == [1, 2, 3, 4]
+
+def test_discard_keeps_earlier_results(tmp_path):
+    path = str(tmp_path / "bench_result_model.parquet")
+    writer = ResultsWriter(path, dataset="bench", model="model")
+    writer.append(None, "test", 0, "A")
+    writer.close()
+
+    writer = ResultsWriter(path, dataset="bench", model="model", metadata={'seed': 6}, batch_size=1)
+    writer.append(None, "test", 0, "C")
+    writer.append(None, "test", 1, "D")
+    writer.discard()
+
+    assert sorted(os.listdir(tmp_path)) == ["bench_result_model.parquet"]
+    assert read_run_metadata(path) is None
+    assert pq.read_table(path)['answer'].to_pylist() == ["A"]
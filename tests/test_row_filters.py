@@ -0,0 +1,37 @@
+import pyarrow.parquet as pq
+import pytest
+from datasets import Dataset
+
+from conftest import FakeDataset
+from results_store import get_results_store_path
+from row_filters import eligible_indices, row_matches
+
+FILTERS = (("q_lang", "==", "en"), ("img_name", "not_null"), ("kind", "in", {"open", "closed"}), ("missing", "!=", 1))
+
+def slake_like():
+    return Dataset.from_dict({
+        'q_lang': ["en", "zh", "en", None, "en", "en"],
+        'img_name': ["a.jpg", "b.jpg", None, "d.jpg", "e.jpg", "f.jpg"],
+        'kind': ["open", "open", "open", "open", "closed", "other"]
+    })
+
+def test_columnar_filters_agree_with_row_filters():
+    dataset = slake_like()
+    assert eligible_indices(dataset, FILTERS) == [0, 4]
+    assert [i for i, row in enumerate(dataset) if row_matches(row, FILTERS)] == [0, 4]
+    assert eligible_indices(dataset, ()) is None
+    with pytest.raises(ValueError, match="Unknown row filter operator"):
+        eligible_indices(dataset, (("q_lang", "~", "en"),))
+
+class EnglishOnly(FakeDataset):
+    ROW_FILTERS = (("lang", "==", "en"),)
+
+    def get_dataset(self, subject, split):
+        dataset = super().get_dataset(subject, split)
+        return dataset.add_column('lang', ["en" if i % 3 == 0 else "zh" for i in range(dataset.num_rows)])
+
+def test_only_eligible_rows_are_sampled(fake_backend):
+    EnglishOnly({'seed': 1}).run(nsamples=100)
+    qids = pq.read_table(get_results_store_path("local/fakemcq", "fake-model"))['qid'].to_pylist()
+    # 14 of algebra's 40 rows and 10 of geometry's 30 are English
+    assert len(qids) == 24 and all(qid % 3 == 0 for qid in qids)
@@ -0,0 +1,33 @@
+import pyarrow as pa
+
+from conftest import FakeDataset
+from results_store import get_results_store_path
+from scoring import gold_from_handler, load_results_table, score
+
+def test_results_are_scored_against_handler_gold(fake_backend):
+    FakeDataset({'seed': 11}).run(nsamples=12)
+    results = load_results_table(get_results_store_path("local/fakemcq", "fake-model"))
+
+    gold = gold_from_handler(FakeDataset(), results)
+    # Integer gold answers are option indices, scored as letters
+    assert gold.num_rows == results.num_rows == 24
+    assert all(row['gold'] == "ABCD"[row['qid'] % 4] for row in gold.to_pylist())
+
+    expected = {}
+    for row in results.to_pylist():
+        counts = expected.setdefault(row['subject'], [0, 0])
+        counts[0] += 1
+        counts[1] += row['answer'] == "ABCD"[row['qid'] % 4]
+    scores = {row['subject']: row for row in score(results, gold).to_pylist()}
+    assert {subject: [row['questions'], row['correct']] for subject, row in scores.items()} == expected
+    assert all(row['accuracy'] == row['correct'] / 12 and row['invalid_rate'] == 0 for row in scores.values())
+
+def test_unanswerable_and_invalid_answers():
+    results = pa.table({
+        'model': ["m"] * 3, 'subject': ["s"] * 3, 'split': ["test"] * 3, 'qid': [0, 1, 2],
+        'answer': [" b. ", "maybe", None], 'status': ["ok", "ok", "timeout"]
+    })
+    gold = pa.table({'subject': ["s"] * 3, 'split': ["test"] * 3, 'qid': [0, 1, 2], 'gold': ["B", "C", "A"]})
+    row = score(results, gold).to_pylist()[0]
+    assert (row['questions'], row['scored'], row['correct']) == (3, 3, 1)
+    assert row['invalid_rate'] == 1 / 3 and row['timeout_rate'] == 1 / 3
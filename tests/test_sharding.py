@@ -0,0 +1,55 @@
+import multiprocessing
+
+import pyarrow.parquet as pq
+import pytest
+
+from checkpoint import CheckpointLog
+from conftest import FakeDataset
+from results_store import get_results_store_path, read_run_metadata
+from sharding import merge_shards
+from utils import get_checkpoint_path
+
+NUM_SHARDS = 3
+NSAMPLES = 25
+SEED = 7
+
+def run_fake(shard=None):
+    FakeDataset({'seed': SEED, 'shard': shard, 'max_threads': 2}).run(nsamples=NSAMPLES)
+
+def test_merged_shards_match_unsharded_run(fake_backend):
+    # Each shard runs in its own process, as it would on its own machine
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=run_fake, args=((index, NUM_SHARDS),)) for index in range(NUM_SHARDS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * NUM_SHARDS
+
+    run_fake()
+    unsharded = get_results_store_path("local/fakemcq", "fake-model")
+    merged = merge_shards(unsharded, output=str(fake_backend / "merged.parquet"))
+
+    columns = ['subject', 'split', 'qid', 'answer', 'status']
+    order = [('subject', 'ascending'), ('split', 'ascending'), ('qid', 'ascending')]
+    expected = pq.read_table(unsharded).select(columns).sort_by(order)
+    actual = pq.read_table(merged).select(columns).sort_by(order)
+    assert expected.num_rows == NSAMPLES * len(FakeDataset.SUBJECTS)
+    assert actual.equals(expected)
+
+    expected_run = read_run_metadata(unsharded)
+    merged_run = read_run_metadata(merged)
+    for key in ('seed', 'nsamples', 'shard', 'planned'):
+        assert merged_run[key] == expected_run[key]
+
+def test_merge_rejects_missing_shard(fake_backend):
+    run_fake((0, 2))
+    with pytest.raises(ValueError, match="Missing shards"):
+        merge_shards(get_results_store_path("local/fakemcq", "fake-model"))
+
+def test_first_resumed_shard_records_default_seed(fake_backend):
+    shard = (1, NUM_SHARDS)
+    FakeDataset({'shard': shard, 'resume': True}).run(nsamples=NSAMPLES)
+    header, completed = CheckpointLog(get_checkpoint_path("local/fakemcq", "fake-model", shard)).load()
+    assert header['seed'] == 0
+    assert completed
@@ -0,0 +1,46 @@
+import random
+from collections import Counter
+
+from datasets import Dataset
+
+from stream_sampling import RESERVOIR, StreamSample, reservoir_sample
+
+ROWS = 200
+K = 5
+
+def stream():
+    return Dataset.from_dict({'n': list(range(ROWS))}).to_iterable_dataset(num_shards=4)
+
+def sample(seed, method, buffer_size=10):
+    sampled = StreamSample(stream(), K, seed, buffer_size=buffer_size, method=method)
+    return [sampled[i]['n'] for i in range(K)]
+
+def test_reservoir_sample_is_uniform():
+    counts = Counter()
+    trials = 4000
+    for seed in range(trials):
+        rows = reservoir_sample(range(ROWS), K, random.Random(seed))
+        assert len(set(rows)) == K
+        counts.update(rows)
+    expected = trials * K / ROWS
+    # Every row is about equally likely, the last ones included
+    assert all(0.6 * expected < counts[row] < 1.4 * expected for row in range(ROWS))
+    first, last = sum(counts[row] for row in range(ROWS // 2)), sum(counts[row] for row in range(ROWS // 2, ROWS))
+    assert abs(first - last) < 0.05 * trials * K
+
+def test_reservoir_stream_sample_reaches_the_whole_stream_and_is_seeded():
+    seen = set()
+    for seed in range(60):
+        seen.update(sample(seed, RESERVOIR))
+    assert max(seen) > ROWS - 20
+    assert sample(3, RESERVOIR) == sample(3, RESERVOIR)
+
+def test_shuffle_buffer_only_reaches_the_start_of_each_shard():
+    seen = set()
+    for seed in range(60):
+        seen.update(sample(seed, "shuffle_buffer"))
+    shard = ROWS // 4
+    assert all(row % shard < 10 + K for row in seen)
+
+def test_short_stream_returns_every_row():
+    assert sorted(reservoir_sample(range(3), K, random.Random(0))) == [0, 1, 2]
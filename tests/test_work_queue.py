@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+
+import pyarrow.parquet as pq
+
+from conftest import FakeDataset, fake_chat
+from model_query import ModelQuery
+from results_store import get_results_store_path
+from work_queue import WorkQueue
+
+NSAMPLES = 25
+SEED = 3
+ANSWERS_BEFORE_CRASH = 10
+
+def run_worker(queue_path, worker_id):
+    FakeDataset({
+        'seed': SEED,
+        'work_queue': queue_path,
+        'worker_id': worker_id,
+        'queue_batch_size': 8,
+        'lease_seconds': 1,
+        'max_threads': 1
+    }).run(nsamples=NSAMPLES)
+
+def run_crashing_worker(queue_path, worker_id):
+    """A worker that is killed, without any cleanup, after answering a few questions."""
+    calls = []
+    def chat(self, model, messages):
+        if len(calls) == ANSWERS_BEFORE_CRASH:
+            os._exit(9)
+        calls.append(model)
+        return fake_chat(self, model, messages)
+    ModelQuery.chat = chat
+    run_worker(queue_path, worker_id)
+
+def test_answers_of_a_killed_worker_are_exported(fake_backend):
+    queue_path = str(fake_backend / "queue.db")
+    context = multiprocessing.get_context('fork')
+    crashed = context.Process(target=run_crashing_worker, args=(queue_path, "crashed"))
+    crashed.start()
+    crashed.join()
+    assert crashed.exitcode == 9
+
+    # The survivor takes over the expired leases and exports the whole run
+    run_worker(queue_path, "survivor")
+
+    results = pq.read_table(get_results_store_path("local/fakemcq", "fake-model"))
+    keys = set(zip(results['subject'].to_pylist(), results['split'].to_pylist(), results['qid'].to_pylist()))
+    assert results.num_rows == len(keys) == NSAMPLES * len(FakeDataset.SUBJECTS)
+
+    workers = WorkQueue(queue_path)._connection().execute(
+        "SELECT worker, COUNT(*) FROM items WHERE state = 'done' GROUP BY worker").fetchall()
+    assert dict(workers).get("crashed", 0) > 0
+
+def test_one_pool_drains_the_queue_and_failed_questions_do_not_hold_leases(fake_backend, monkeypatch):
+    queue_path = str(fake_backend / "queue.db")
+    pools = []
+    run_work = FakeDataset.run_work
+    monkeypatch.setattr(FakeDataset, 'run_work', lambda self, *args, **kwargs: pools.append(1) or run_work(self, *args, **kwargs))
+    process_row = FakeDataset.process_dataset_row
+    failed = []
+    def process_dataset_row(self, row):
+        if not failed:
+            failed.append(row['question'])
+            raise ValueError("unparseable row")
+        return process_row(self, row)
+    monkeypatch.setattr(FakeDataset, 'process_dataset_row', process_dataset_row)
+
+    run_worker(queue_path, "only")
+
+    # Batches of 8 leases all ran on the same worker pool
+    assert len(pools) == 1
+    queue = WorkQueue(queue_path)
+    assert queue.outstanding("local/fakemcq", "fake-model") == 0
+    errors = [answer for _, _, _, answer, _ in queue.answers("local/fakemcq", "fake-model") if answer.startswith("Error")]
+    assert len(errors) == 1 and "could not be processed" in errors[0]
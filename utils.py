@@ -5,26 +5,41 @@ import json
 
 from datasets import load_dataset
 
+from dataset_manifest import get_manifest, load_dataset_dict
+from sharding import shard_tag
+
 logger = logging.getLogger(__name__)
 
 def load_data(dataset_name, subject, split):
+    try:
+        # The DatasetDict is memoized, so loading several splits of a subject loads it once
+        dataset = load_dataset_dict(dataset_name, subject)[split]
+        get_manifest().record_split(dataset_name, subject, split, dataset)
+        return dataset
+    except Exception as e:
+        return None
+
+def load_streaming_data(dataset_name, subject, split):
+    """Open a split as an iterable dataset that streams rows without downloading the split."""
     try:
         if subject:
-            ds = load_dataset(dataset_name, subject, trust_remote_code=True)
-        else:
-            ds = load_dataset(dataset_name, trust_remote_code=True)
-        return ds[split]
+            return load_dataset(dataset_name, subject, split=split, streaming=True, trust_remote_code=True)
+        return load_dataset(dataset_name, split=split, streaming=True, trust_remote_code=True)
     except Exception as e:
+        logger.error(f"Failed to stream {dataset_name} {subject}:{split}: {e}")
         return None
 
-def get_sample_indices(dataset, nsamples):
+def get_sample_indices(dataset, nsamples, seed=None, population=None):
     """
     Get sample indices from the dataset.
     If nsamples is provided and less than the dataset length, select random samples.
+    A seed makes the sample reproducible, e.g. when resuming a run.
+    A population restricts the sample to those indices, e.g. rows passing the row filters.
     """
-    indices = range(len(dataset))
-    if nsamples is not None and nsamples < len(dataset):
-        indices = random.sample(indices, nsamples)
+    indices = range(len(dataset)) if population is None else population
+    if nsamples is not None and nsamples < len(indices):
+        rng = random.Random(seed) if seed is not None else random
+        indices = rng.sample(indices, nsamples)
     return sorted(indices)  # Return the sorted indices
 
 def gen_question_id(subset: str, split: str, index: int) -> str:
@@ -50,6 +65,13 @@ def gen_question_id(subset: str, split: str, index: int) -> str:
 
     return result
 
+def get_checkpoint_path(bench_name: str, model_name: str, shard=None) -> str:
+    """
+    Return the path of the per-question checkpoint log for a benchmark run, or for one shard of it.
+    """
+    bench_name = bench_name.split('/')[-1].lower()
+    return os.path.join('results', f'{bench_name}_checkpoint_{model_name}{shard_tag(shard)}.jsonl')
+
 def save_results(data: dict, bench_name: str, model_name: str):
     """
     Save the benchmark results from a dictionary to a JSON file.
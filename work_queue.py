@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from tabulate import tabulate
+
+from results_store import ResultsWriter, get_results_store_path
+
+logger = logging.getLogger(__name__)
+
+STATE_PENDING = "pending"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class WorkQueue:
+    """Shared queue of questions backed by SQLite in WAL mode, drained by any number of worker processes.
+
+    Every sampled (dataset, subject, split, qid) of a run is one item. Workers
+    lease batches of pending items for `lease_seconds` and keep the leases
+    alive with heartbeats. Leases of a worker that stops heartbeating expire
+    and their items go back to pending. The answer and its request metrics are
+    committed with the item when it is completed, and the first completion of
+    an item wins. The queue is therefore the durable record of a run's answers,
+    and its results file is exported from it once every item is done.
+
+    Items are scoped by model, so one queue file can hold several runs.
+    """
+    def __init__(self, path, lease_seconds=300):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                dataset TEXT NOT NULL,
+                model TEXT NOT NULL,
+                seed INTEGER,
+                nsamples INTEGER,
+                created_at REAL NOT NULL,
+                exported_at REAL,
+                PRIMARY KEY (dataset, model)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                dataset TEXT NOT NULL,
+                model TEXT NOT NULL,
+                subject TEXT,
+                split TEXT NOT NULL,
+                qid INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                answer TEXT,
+                metrics TEXT,
+                finished_at REAL
+            )
+        """)
+        # Queues created before answers were exported from them lack these columns
+        self._add_missing_column(conn, 'jobs', 'exported_at', 'REAL')
+        self._add_missing_column(conn, 'items', 'metrics', 'TEXT')
+        conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_items_key
+            ON items(dataset, model, IFNULL(subject, ''), split, qid)
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_items_state ON items(dataset, model, state)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, so leases can take the write lock up front with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # A completed answer is only stored here, so every commit is synced
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _add_missing_column(conn, table, column, declaration):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def register_job(self, dataset, model, seed, nsamples):
+        """Record how a run draws its sample; every worker joining the run must draw it the same way."""
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs (dataset, model, seed, nsamples, created_at) VALUES (?, ?, ?, ?, ?)",
+            (dataset, model, seed, nsamples, time.time())
+        )
+        row = conn.execute("SELECT seed, nsamples FROM jobs WHERE dataset = ? AND model = ?", (dataset, model)).fetchone()
+        if tuple(row) != (seed, nsamples):
+            raise ValueError(f"Work queue {self.path} holds {dataset} for {model} with seed={row[0]}, "
+                             f"nsamples={row[1]}; this worker has seed={seed}, nsamples={nsamples}")
+
+    def enqueue(self, dataset, model, items):
+        """Add (subject, split, qid) items. Items already in the queue, in any state, are left as they are.
+
+        Returns:
+            int: number of items added
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = conn.executemany(
+                "INSERT OR IGNORE INTO items (dataset, model, subject, split, qid, state) VALUES (?, ?, ?, ?, ?, ?)",
+                [(dataset, model, subject, split, qid, STATE_PENDING) for subject, split, qid in items]
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def lease(self, dataset, model, worker, batch_size):
+        """Lease up to `batch_size` pending items, first putting expired leases back to pending.
+
+        Returns:
+            list: (subject, split, qid) tuples now leased to `worker`
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = conn.execute(
+                "UPDATE items SET state = ?, worker = NULL, lease_expires = NULL "
+                "WHERE dataset = ? AND model = ? AND state = ? AND lease_expires < ?",
+                (STATE_PENDING, dataset, model, STATE_LEASED, now)
+            ).rowcount
+            rows = conn.execute(
+                "SELECT id, subject, split, qid FROM items WHERE dataset = ? AND model = ? AND state = ? "
+                "ORDER BY id LIMIT ?",
+                (dataset, model, STATE_PENDING, batch_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE items SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(STATE_LEASED, worker, now + self.lease_seconds, row[0]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if expired:
+            logger.warning(f"Re-queued {expired} questions whose lease expired")
+        return [(subject, split, qid) for _, subject, split, qid in rows]
+
+    def heartbeat(self, worker):
+        """Extend every lease held by `worker`."""
+        return self._connection().execute(
+            "UPDATE items SET lease_expires = ? WHERE worker = ? AND state = ?",
+            (time.time() + self.lease_seconds, worker, STATE_LEASED)
+        ).rowcount
+
+    def complete(self, dataset, model, subject, split, qid, worker, answer, metrics=None):
+        """Store the answer of an item and the metrics of its request.
+
+        Returns:
+            bool: False if the item was already completed, e.g. by a worker that
+            took it over after this worker's lease expired
+        """
+        return self._connection().execute(
+            "UPDATE items SET state = ?, worker = ?, lease_expires = NULL, answer = ?, metrics = ?, finished_at = ? "
+            "WHERE dataset = ? AND model = ? AND subject IS ? AND split = ? AND qid = ? AND state != ?",
+            (STATE_DONE, worker, json.dumps(answer, default=str),
+             None if metrics is None else json.dumps(metrics, default=str), time.time(),
+             dataset, model, subject, split, qid, STATE_DONE)
+        ).rowcount == 1
+
+    def release(self, worker):
+        """Put the unfinished leases of a worker back to pending, e.g. when it shuts down."""
+        return self._connection().execute(
+            "UPDATE items SET state = ?, worker = NULL, lease_expires = NULL WHERE worker = ? AND state = ?",
+            (STATE_PENDING, worker, STATE_LEASED)
+        ).rowcount
+
+    def leased(self, dataset, model, worker):
+        """Number of items of a run currently leased to `worker`."""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM items WHERE dataset = ? AND model = ? AND worker = ? AND state = ?",
+            (dataset, model, worker, STATE_LEASED)
+        ).fetchone()[0]
+
+    def outstanding(self, dataset, model):
+        """Number of items of a run that are not done yet, leased or not."""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM items WHERE dataset = ? AND model = ? AND state != ?",
+            (dataset, model, STATE_DONE)
+        ).fetchone()[0]
+
+    def answers(self, dataset, model):
+        """Completed items of a run in queue order.
+
+        Returns:
+            list: (subject, split, qid, answer, metrics) tuples
+        """
+        rows = self._connection().execute(
+            "SELECT subject, split, qid, answer, metrics FROM items WHERE dataset = ? AND model = ? AND state = ? ORDER BY id",
+            (dataset, model, STATE_DONE)
+        ).fetchall()
+        return [(subject, split, qid, json.loads(answer), None if metrics is None else json.loads(metrics))
+                for subject, split, qid, answer, metrics in rows]
+
+    def claim_export(self, dataset, model):
+        """Claim the export of a finished run's results, so that only one of the workers finishing it writes them."""
+        return self._connection().execute(
+            "UPDATE jobs SET exported_at = ? WHERE dataset = ? AND model = ? AND exported_at IS NULL",
+            (time.time(), dataset, model)
+        ).rowcount == 1
+
+    def jobs(self):
+        return self._connection().execute("SELECT dataset, model, seed, nsamples FROM jobs ORDER BY dataset, model").fetchall()
+
+    def status(self):
+        """Item counts per run and state, plus the number of workers holding leases."""
+        rows = self._connection().execute("""
+            SELECT dataset, model,
+                   SUM(state = 'pending'), SUM(state = 'leased'), SUM(state = 'done'),
+                   COUNT(DISTINCT CASE WHEN state = 'leased' THEN worker END)
+            FROM items GROUP BY dataset, model ORDER BY dataset, model
+        """).fetchall()
+        names = ('dataset', 'model', STATE_PENDING, STATE_LEASED, STATE_DONE, 'workers')
+        return [dict(zip(names, row)) for row in rows]
+
+class LeaseHeartbeat:
+    """Background thread that keeps a worker's leases alive while it processes them."""
+    def __init__(self, queue, worker, interval=None):
+        self.queue = queue
+        self.worker = worker
+        self.interval = interval or max(1.0, queue.lease_seconds / 3)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-heartbeat-{worker}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.queue.heartbeat(self.worker)
+            except sqlite3.Error as e:
+                logger.warning(f"Lease heartbeat failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def export_results(queue, dataset, model, seed=None, nsamples=None, path=None):
+    """Write the answers stored in a work queue to the results file of the run.
+
+    Every sampled question of the run is an item of the queue, so the planned
+    counts of each subset are read from the queue as well.
+
+    Returns:
+        tuple: (path of the results file, list of (subject, split, qid, answer) of the run)
+    """
+    answers = queue.answers(dataset, model)
+    planned = {}
+    for subject, split, _, _, _ in answers:
+        plan = planned.setdefault(f"{subject}/{split}", {'sampled': 0, 'assigned': 0})
+        plan['sampled'] += 1
+        plan['assigned'] += 1
+    name = dataset.split('/')[-1]
+    writer = ResultsWriter(path or get_results_store_path(dataset, model), dataset=name, model=model, metadata={
+        'dataset': name,
+        'model': model,
+        'nsamples': nsamples,
+        'seed': seed,
+        'shard': None,
+        'work_queue': queue.path,
+        'planned': planned
+    })
+    try:
+        for subject, split, qid, answer, metrics in answers:
+            writer.append(subject, split, qid, answer, metrics)
+    except BaseException:
+        writer.discard()
+        raise
+    writer.close()
+    return writer.path, [(subject, split, qid, answer) for subject, split, qid, answer, _ in answers]
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the progress of the runs in a work queue')
+    parser.add_argument('queue', help='Work queue SQLite file')
+    parser.add_argument('--export', action='store_true',
+                        help='Write the results file of every finished run from the answers stored in the queue')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    if args.export:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+        for dataset, model, seed, nsamples in queue.jobs():
+            if queue.outstanding(dataset, model):
+                logger.warning(f"Skipping {dataset} for {model}: {queue.outstanding(dataset, model)} questions are not done")
+                continue
+            export_results(queue, dataset, model, seed=seed, nsamples=nsamples)
+    print(tabulate(queue.status(), headers='keys'))
+
+if __name__ == "__main__":
+    main()